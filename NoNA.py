@@ -1,211 +1,336 @@
 """
 NoNA: Real Estate Feasibility Calculator for Grasshopper
 ========================================================
-Professional refactor of the NoNA feasibility logic.
-Modular, Optimized, and Type-Safe.
+Grasshopper front end of the NoNA feasibility model.
+
+The model itself is web/backend/nona_core.py, the same module the web backend
+runs, so both give identical numbers. Each component instance keeps its last
+calculation in sc.sticky; a solve only reruns the parts of the model that
+depend on the inputs that changed since the previous one.
+
+Lot mode: wire a list of lot surfaces (list or tree access) into
+area_terreno to evaluate every lot of a block in one solve. Any other input
+may then be a list aligned with the lots, or a single value shared by all;
+delegacion/Distrito/distrito_zona take one value per lot, or one tree branch
+per lot. The text outputs become lists aligned with the lots, Utilidad_lotes
+carries the numeric margin and Errores_lotes the failure of each lot (None if
+it solved).
+
+Reporte_excel: every solve appends one row per lot, keyed by a hash of its
+inputs, to historial_noNa.csv (plus the historial_noNa.runlog binary sidecar,
+see run_log.read_sidecar) in ruta_carpeta, and refreshes the
+resultados_noNa(_lotes).csv report. Writes are buffered and coalesced (at
+most one per second, off the canvas thread); the history is appended to and
+the report replaced atomically.
+
+Optional inputs:
+    ruta_nona       - checkout folder containing web/backend/nona_core.py
+                      (defaults to the folder of this script)
+    iva_percent     - IVA factor (default 0.16)
+    ciudad          - city of the parking rules (default: rules valid in every city)
+    distrito_zona   - zoning district of each delegacion, for district-specific
+                      parking rules; delegaciones without a rule add no spots
+                      and put a runtime warning on the component
+    PCT_HONORARIOS, PCT_LEGALES, PCT_ADM, PCT_FIN, PCT_COM,
+    COST_DEMOLITION_M2, ... - overrides for the model parameters
 """
 
 import Rhino.Geometry as rg
-import math
 import scriptcontext as sc
+import atexit
 import os
-import csv
-from typing import Tuple, List, Dict, Any, Union
+import sys
+from typing import Tuple, List, Dict, Any, Optional
 
 # ==============================================================================
-# CONFIGURATION & CONSTANTS
+# SHARED CORE
 # ==============================================================================
-CONSTANTS = {
-    'COST_DEMOLITION_M2': 1600.0,
-    'COST_LICENSE_M2': 15.0,
-    'COST_WASTE_PERCENT': 0.15,
-    'PARKING_FACTORS': {
-        'centro': {'comercial': 35},
-        'poniente': {'comercial': 25},
-        'norte': {'comercial': 30},
-        'sur': {'comercial': 25}
-    },
-    'PARKING_M2_PER_SPOT': 12.5,  # 2.5 * 5
-    'PARKING_DRIVEWAY_FACTOR': 1.50
-}
+
+def _core_path(g: Dict[str, Any]) -> str:
+    """Folder holding nona_core.py."""
+    root = g.get('ruta_nona')
+    if not root and g.get('__file__'):
+        root = os.path.dirname(os.path.abspath(g['__file__']))
+    if not root:
+        raise ImportError("Wire 'ruta_nona' to the NoNA folder to load nona_core.py")
+    return os.path.join(root, 'web', 'backend')
+
+def import_core(g: Dict[str, Any]) -> None:
+    """Puts nona_core.py and run_log.py on sys.path; see the MAIN EXECUTION imports."""
+    core_dir = _core_path(g)
+    if core_dir not in sys.path:
+        sys.path.insert(0, core_dir)
+
+STICKY_KEY = 'nona_states'
+RUN_LOG_STICKY_KEY = 'nona_run_logs'
+
+# Grasshopper inputs that are model request fields of the same name, besides
+# the model inputs of nona_core.MODEL_INPUTS (see request_inputs)
+EXTRA_REQUEST_INPUTS = ('delegacion', 'Distrito', 'ciudad', 'distrito_zona')
+# Inputs holding a list per lot (one tree branch per lot in lot mode)
+LIST_INPUTS = ('delegacion', 'Distrito', 'distrito_zona')
+
+# Text outputs of the component (see format_outputs)
+OUTPUT_NAMES = (
+    'Area_de_terreno', 'Valor_del_terreno', 'COS_m2', 'CUS_m2', 'CAS_m2', 'Costo_de_demolicion',
+    'Area_de_local', 'Venta_de_local', 'Ingreso_de_locales', 'Costos_Directos', 'Costos_Indirectos',
+    'Monto_IVA', 'Costo_total_Construccion', 'Nuevo_Precio_venta', 'Nueva_Ganancia_Bruta', 'Utilidad_Final',
+)
 
 # ==============================================================================
 # CORE LOGIC FUNCTIONS
 # ==============================================================================
 
+def request_inputs() -> Tuple[str, ...]:
+    """Grasshopper input -> model request field, for inputs that share the name."""
+    return tuple(key for key, _, _ in nona_core.MODEL_INPUTS if key != 'area_terreno') + EXTRA_REQUEST_INPUTS
+
+def warn(g: Dict[str, Any], message: str) -> None:
+    """Shows `message` as a runtime warning (orange balloon) on the component."""
+    print(f"WARNING: {message}")
+    env = g.get('ghenv')
+    if env is not None:
+        from Grasshopper.Kernel import GH_RuntimeMessageLevel
+        env.Component.AddRuntimeMessage(GH_RuntimeMessageLevel.Warning, message)
+
+def warn_unknown_delegaciones(g: Dict[str, Any], raws: List[Optional[Dict[str, Any]]]) -> None:
+    """Delegaciones without a parking rule add no spots; warn instead of passing silently."""
+    unknown = [
+        (i, raw['parking_unknown']) for i, raw in enumerate(raws)
+        if raw is not None and raw.get('parking_unknown')
+    ]
+    if not unknown:
+        return
+    if len(raws) == 1:
+        detail = ', '.join(unknown[0][1])
+    else:
+        detail = '; '.join(f"lote {i}: {', '.join(names)}" for i, names in unknown)
+    warn(g, f"Delegaciones sin regla de estacionamiento (0 cajones): {detail}")
+
 def validate_inputs(inputs: Dict[str, Any]) -> None:
     """Validates availability of critical global inputs."""
-    required = ['area_terreno', 'valor_terreno', 'curva_retiros']
+    required = ['area_terreno', 'valor_terreno']
     for req in required:
         if inputs.get(req) is None:
             raise ValueError(f"Input '{req}' is missing or null.")
 
-def calculate_land_metrics(surface: rg.Surface, cost_per_unit: float) -> Tuple[float, float, str, str]:
-    """Calculates land area and total land value."""
-    if surface is None: 
+def surface_area(surface: Any) -> float:
+    """Area of a lot surface, brep or closed planar curve; no centroid or moments."""
+    if surface is None:
         raise ValueError("Invalid Surface input")
-    
-    props = rg.AreaMassProperties.Compute(surface)
+
+    if isinstance(surface, rg.Curve):
+        props = rg.AreaMassProperties.Compute(surface)
+    else:
+        # area=True, firstMoments/secondMoments/productMoments=False
+        props = rg.AreaMassProperties.Compute(surface, True, False, False, False)
     if props is None:
         raise ValueError("Could not compute area properties")
-    
-    area = props.Area
-    total_value = area * cost_per_unit
-    
-    return area, total_value, f"{area:.2f} m2", f"${total_value:,.2f} mxn"
-
-def calculate_demolition_cost(
-    do_demolition: bool, 
-    area_demolition: float, 
-    land_area: float
-) -> Tuple[float, str]:
-    """Computes demolition, license, and waste removal costs."""
-    if not do_demolition:
-        return 0.0, "$0.00 mxn"
-        
-    cost_dem = area_demolition * CONSTANTS['COST_DEMOLITION_M2']
-    cost_lic = land_area * CONSTANTS['COST_LICENSE_M2']
-    cost_res = land_area * CONSTANTS['COST_WASTE_PERCENT'] # Ambiguous in original: area_value * 0.15. Keeping logic.
-    
-    total = cost_dem + cost_lic + cost_res
-    return total, f"${total:,.2f} mxn"
-
-def calculate_regulatory_areas(
-    land_area: float, 
-    cos: float, 
-    cus: float, 
-    cas: float, 
-    retiros_area: float
-) -> Dict[str, float]:
-    """Calculates permitted construction areas based on coefficients."""
+    return props.Area
+
+def calculate_land_metrics(surface: rg.Surface, cost_per_unit: float) -> Tuple[float, float, str, str]:
+    """Calculates land area and total land value."""
+    return nona_core.calculate_land_metrics(surface_area(surface), cost_per_unit)
+
+def is_lot_list(value: Any) -> bool:
+    """True when an input carries several lots (list access or a data tree)."""
+    return not isinstance(value, (str, rg.GeometryBase)) and (
+        hasattr(value, 'AllData') or hasattr(value, '__iter__')
+    )
+
+def flatten(value: Any) -> List[Any]:
+    """Items of a list input, or of every branch of a data tree in order."""
+    return list(value.AllData()) if hasattr(value, 'AllData') else list(value)
+
+def lot_areas(surfaces: List[Any]) -> Tuple[List[float], List[Optional[str]]]:
+    """Areas of all lots in one pass; a lot that fails gets area 0 and its error."""
+    areas, errors = [], []
+    for surface in surfaces:
+        try:
+            areas.append(surface_area(surface))
+            errors.append(None)
+        except Exception as e:
+            areas.append(0.0)
+            errors.append(str(e))
+    return areas, errors
+
+def build_lot_columns(inputs: Dict[str, Any], areas: List[float]) -> Dict[str, Any]:
+    """
+    Columns for nona_core.run_calculation_batch, one row per lot. Data trees
+    are flattened, except for LIST_INPUTS where each branch holds
+    the list of one lot. A single item (or branch) is shared by every lot,
+    as Grasshopper itself matches a one-item list against longer ones.
+    """
+    n = len(areas)
+    columns = {}
+    for key in request_inputs():
+        value = inputs.get(key)
+        if value is None:
+            continue
+        if key in LIST_INPUTS and hasattr(value, 'Branches'):
+            value = [list(branch) for branch in value.Branches]
+        elif is_lot_list(value):
+            value = flatten(value)
+        else:
+            columns[key] = value
+            continue
+        columns[key] = value * n if len(value) == 1 else value
+    columns['area_terreno'] = areas
+    return columns
+
+def format_outputs(raw: Dict[str, Any], costo_local_m2: float) -> Dict[str, str]:
+    """Text outputs of the component from one lot's `raw` results."""
     return {
-        'cos_area': land_area * cos,
-        'cus_area': land_area * cus,
-        'cas_area': land_area * cas,
-        'net_area': land_area - retiros_area
+        'Area_de_terreno': f"{raw['area_terreno']:.2f} m2",
+        'Valor_del_terreno': f"${raw['valor_terreno']:,.2f} mxn",
+
+        'COS_m2': f"{raw['cos_area']:.2f} m2",
+        'CUS_m2': f"{raw['cus_area']:.2f} m2",
+        'CAS_m2': f"{raw['cas_area']:.2f} m2",
+
+        'Costo_de_demolicion': f"${raw['total_dem_cost']:,.2f} mxn",
+
+        'Area_de_local': f"{raw['area_locales']:.2f} m2",
+        'Venta_de_local': f"${raw['area_locales'] * costo_local_m2:,.2f} mxn",
+        'Ingreso_de_locales': f"${raw['ingreso_ventas_locales']:,.2f} mxn",
+
+        'Costos_Directos': f"${raw['costo_directo']:,.2f} mxn",
+        'Costos_Indirectos': f"${raw['costo_indirecto']:,.2f} mxn",
+        'Monto_IVA': f"${raw['monto_iva']:,.2f} mxn",
+        'Costo_total_Construccion': f"${raw['costo_total']:,.2f} mxn",
+
+        'Nuevo_Precio_venta': f"${raw['ingreso_optimizado']:,.2f}",
+        'Nueva_Ganancia_Bruta': f"${raw['utilidad_monto']:,.2f}",
+        'Utilidad_Final': f"{raw['utilidad_optimizada']:.2f}%",
     }
 
-def calculate_mixed_use(
-    is_mixed: bool, 
-    num_locales: int, 
-    cos_area: float, 
-    price_per_m2: float
-) -> Dict[str, float]:
-    """Calculates commercial area metrics if mixed-use is enabled."""
-    results = {
-        'area_local': 0.0,
-        'venta_local': 0.0,
-        'ingreso_total': 0.0,
-        'area_comercio': 0.0
+def solve_lots(inputs: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Evaluates every lot wired into area_terreno with the columnar engine and
+    returns the component outputs as lists aligned with the lots, plus
+    'solved' (each lot's (request, raw results), None for failed lots).
+    """
+    areas, errors = lot_areas(flatten(inputs['area_terreno']))
+    columns = build_lot_columns(inputs, areas)
+    parameters = build_request(inputs, 0.0)['parameters']
+    batch = nona_core.run_calculation_batch(columns, parameters)
+
+    cols = batch['raw']
+    outputs: Dict[str, Any] = {name: [] for name in OUTPUT_NAMES}
+    solved: List[Optional[Tuple[Dict[str, Any], Dict[str, Any]]]] = []
+    utilidad = []
+    for i in range(batch['n']):
+        errors[i] = errors[i] or batch['errors'][i]
+        if errors[i] is None:
+            raw = {key: cols[key][i] for key in nona_core.BATCH_RAW_FIELDS}
+            raw['parking_unknown'] = list(batch['parking_unknown'][i])
+            request = {
+                key: value[i] if nona_core.is_column(value) else value for key, value in columns.items()
+            }
+            request['parameters'] = parameters
+            row = format_outputs(raw, float(request.get('costo_local_m2', 0)))
+            utilidad.append(raw['utilidad_optimizada'])
+            solved.append((request, raw))
+        else:
+            row = dict.fromkeys(OUTPUT_NAMES, f"Error: {errors[i]}")
+            utilidad.append(None)
+            solved.append(None)
+        for name in OUTPUT_NAMES:
+            outputs[name].append(row[name])
+    outputs['Utilidad_lotes'] = utilidad
+    outputs['Errores_lotes'] = errors
+    outputs['solved'] = solved
+    return outputs
+
+def build_request(inputs: Dict[str, Any], land_area: float) -> Dict[str, Any]:
+    """
+    Model request from the component inputs. Unwired (None) inputs are left
+    out, so the model applies its defaults exactly as the web backend does.
+    """
+    data = {key: inputs[key] for key in request_inputs() if inputs.get(key) is not None}
+    data['area_terreno'] = land_area
+    data['parameters'] = {
+        key: float(inputs[key]) for key in nona_core.DEFAULT_PARAMS if inputs.get(key) is not None
     }
-    
-    if not is_mixed:
-        return results
-        
-    if num_locales <= 0:
-        raise ValueError("num_locales must be >= 1 for mixed use")
-        
-    # Logic from original: Commercial Area = COS Area
-    # This implies 1 floor of commerce max occupying full COS? Keeping logic.
-    results['area_comercio'] = cos_area 
-    results['area_local'] = cos_area / float(num_locales)
-    results['venta_local'] = results['area_local'] * price_per_m2
-    results['ingreso_total'] = results['venta_local'] * num_locales
-    
-    return results
-
-def calculate_parking(
-    enable: bool, 
-    n_viviendas: int, 
-    cos_area: float, 
-    circ_area: float,
-    delegaciones: List[str],
-    factors: List[float],
-    cost_per_m2: float
-) -> Dict[str, Any]:
-    """Calculates parking spots, area, and cost based on district."""
-    if not enable:
-        return {'cost': 0.0, 'area': 0.0, 'details': {}}
-        
-    cleaned_del = [d.strip().lower() for d in delegaciones]
-    if len(cleaned_del) != len(factors):
-        raise ValueError("Delegacion and Distrito lists must match length")
-        
-    total_cost = 0.0
-    total_area_m2 = 0.0
-    
-    # Using arrays to store per-district results (assuming iteration was intended for multiple inputs)
-    # Original script iterated but didn't clearly aggregate 'total' for the final sum except via `_costo_estac_num`
-    # We will compute the sum of all provided district calculations
-    
-    c_vivienda_list = []
-    c_comercio_list = []
-    c_total_list = []
-    
-    for dep, fac in zip(cleaned_del, factors):
-        rules = CONSTANTS['PARKING_FACTORS'].get(dep)
-        if not rules:
-            raise ValueError(f"Invalid Delegacion: {dep}")
-            
-        c_viv = n_viviendas * fac
-        # Original Logic: Commercial spots based on remaining COS not used by circulation?
-        # cc = (cos_area - area_circulacion) / regs['comercial']
-        c_com = (cos_area - circ_area) / rules['comercial'] if cos_area else 0
-        
-        spots = math.ceil(c_viv + c_com)
-        area = spots * CONSTANTS['PARKING_M2_PER_SPOT'] * CONSTANTS['PARKING_DRIVEWAY_FACTOR']
-        cost = area * cost_per_m2
-        
-        total_cost += cost
-        total_area_m2 += area
-        
-        c_vivienda_list.append(c_viv)
-        c_comercio_list.append(c_com)
-        c_total_list.append(spots)
+    return data
 
-    return {
-        'cost': total_cost,
-        'area': total_area_m2,
-        'details': {
-            'cajones_vivienda': c_vivienda_list,
-            'cajones_comercio': c_comercio_list,
-            'cajones_total': c_total_list
-        }
+def state_cache() -> 'nona_core.StateCache':
+    """Per-document cache of calculation states, one per component instance."""
+    cache = sc.sticky.get(STICKY_KEY)
+    # A cache created before nona_core was reloaded belongs to the old class
+    if not isinstance(cache, nona_core.StateCache):
+        cache = sc.sticky[STICKY_KEY] = nona_core.StateCache()
+    return cache
+
+def component_key(g: Dict[str, Any]) -> Any:
+    """Identifies this component instance across solves."""
+    env = g.get('ghenv')
+    return env.Component.InstanceGuid if env is not None else __name__
+
+def export_row(raw: Dict[str, Any]) -> Dict[str, Any]:
+    """Values written to the CSV report for one lot."""
+    data_map = {
+        "Area Terreno": raw['area_terreno'],
+        "Valor Terreno": raw['valor_terreno'],
+        "COS Area": raw['cos_area'],
+        "CUS Area": raw['cus_area'],
+        "Area Venta": raw['area_venta_vivienda'],
+        "Costo Directo": raw['costo_directo'],
+        "Costo Indirecto": raw['costo_indirecto'],
+        "IVA": raw['monto_iva'],
+        "Costo Total": raw['costo_total'],
+        "Ingreso Inicial": raw['ingreso_inicial'],
+        "Ingreso Meta": raw['ingreso_optimizado'],
+        "Utilidad Meta": raw['utilidad_optimizada']
     }
+    # Add parking details
+    if raw['parking_area'] > 0:
+        data_map["Costo Estacionamiento"] = raw['parking_cost']
+    # Delegaciones without a parking rule add no spots; say so in the report
+    if raw.get('parking_unknown'):
+        data_map["Delegaciones sin regla"] = ' '.join(raw['parking_unknown'])
+    return data_map
 
-def solve_target_price(
-    cost_total: float, 
-    desired_margin_percent: float,
-    current_income: float
-) -> Tuple[float, float, float]:
+def summary_rows(data: Dict[str, Any]) -> List[List[Any]]:
+    """Variable/Value rows of the single-lot report."""
+    return [["Variable", "Value"]] + [[k, v] for k, v in data.items()]
+
+def lot_summary_rows(errors: List[Optional[str]], solved: List[Optional[Tuple[Dict[str, Any], Dict[str, Any]]]]) -> List[List[Any]]:
+    """One row per lot; failed lots keep their row with the error."""
+    rows = [export_row(lot[1]) if lot is not None else {} for lot in solved]
+    header = ["Lote"]
+    for row in rows:
+        header += [k for k in row if k not in header]
+    header.append("Error")
+    table = [header]
+    for i, (row, error) in enumerate(zip(rows, errors)):
+        table.append([i] + [row.get(k, "") for k in header[1:-1]] + [error or ""])
+    return table
+
+def get_run_log(folder: str) -> 'run_log.RunLog':
+    """The buffered run history of `folder`, shared by every component writing there."""
+    logs = sc.sticky.setdefault(RUN_LOG_STICKY_KEY, {})
+    log = logs.get(folder)
+    if not isinstance(log, run_log.RunLog):
+        log = logs[folder] = run_log.RunLog(folder)
+        # Rows still buffered when Rhino closes
+        atexit.register(log.close)
+    return log
+
+def log_solve(
+    folder: str,
+    solved: List[Tuple[Dict[str, Any], Dict[str, Any]]],
+    report_name: str,
+    report_rows: List[List[Any]]
+) -> str:
     """
-    Mathematically solves for the required total sales price to achieve target margin.
-    
-    Formula:
-    Margin % = ( (Revenue - Cost) / Revenue ) * 100
-    Margin/100 = 1 - (Cost / Revenue)
-    Cost / Revenue = 1 - (Margin/100)
-    Revenue = Cost / (1 - (Margin/100))
+    Appends one history row per solved lot and queues the report rewrite.
+    Both reach disk on the log's next flush, off the canvas thread.
     """
-    if desired_margin_percent >= 100:
-        return float('inf'), float('inf'), desired_margin_percent
-        
-    target_revenue = cost_total / (1.0 - (desired_margin_percent / 100.0))
-    new_gain = target_revenue - cost_total
-    
-    return target_revenue, new_gain, desired_margin_percent
-
-def export_to_csv(filepath: str, data: Dict[str, Any]) -> str:
-    """Exports a flattened dictionary to CSV."""
-    try:
-        with open(filepath, mode='w', newline='', encoding='utf-8') as f:
-            writer = csv.writer(f)
-            writer.writerow(["Variable", "Value"])
-            for k, v in data.items():
-                writer.writerow([k, v])
-        return f"✅ Success: {filepath}"
-    except Exception as e:
-        return f"❌ Error: {str(e)}"
+    log = get_run_log(folder)
+    rows = [(run_log.input_hash(request), run_log.run_values(request, raw)) for request, raw in solved]
+    log.append(rows, (os.path.join(folder, report_name), report_rows))
+    return log.status()
 
 # ==============================================================================
 # MAIN EXECUTION
@@ -215,137 +340,43 @@ try:
     # 0. INPUT SAFEGUARD (For GH Environment)
     # Allows script to run even if not all inputs are wired yet (prevents red errors)
     g = globals()
-    
-    # Required Input Checks
-    if g.get('area_terreno') is None: raise ValueError("Input 'area_terreno' disallowed None")
-    
-    # 1. LAND & BASIC METRICS
-    area_val, total_val, txt_area, txt_val = calculate_land_metrics(g['area_terreno'], g['valor_terreno'])
-    
-    # Outputs
-    Area_de_terreno = txt_area
-    Valor_del_terreno = txt_val
-    
-    # 2. NORMATIVE
-    reg = calculate_regulatory_areas(
-        area_val, g['COS'], g['CUS'], g['CAS'], g.get('area_retiros', 0.0) # Using area_retiros value directly if computed
-    )
-    
-    COS_m2 = f"{reg['cos_area']:.2f} m2"
-    CUS_m2 = f"{reg['cus_area']:.2f} m2"
-    CAS_m2 = f"{reg['cas_area']:.2f} m2"
-    
-    # 3. DEMOLITION
-    dem_cost, dem_txt = calculate_demolition_cost(g['demolicion'], g['area_demolicion'], area_val)
-    Costo_de_demolicion = dem_txt
-    
-    # 4. MIXED USE
-    mix = calculate_mixed_use(g['usos_mixtos'], g['num_locales'], reg['cos_area'], g['costo_local_m2'])
-    
-    Area_de_local = f"{mix['area_local']:.2f} m2"
-    Venta_de_local = f"${mix['venta_local']:,.2f} mxn"
-    Ingreso_de_locales = f"${mix['ingreso_total']:,.2f} mxn"
-    
-    # 5. PARKING
-    # Note: areaCirculacionPorcentaje is a factor (e.g. 0.15)
-    area_circulacion = reg['cus_area'] * g['areaCirculacionPorcentaje']
-    
-    park = calculate_parking(
-        g['estacionamiento'], 
-        g['n_viviendas'], 
-        reg['cos_area'], 
-        area_circulacion, 
-        g['delegacion'], 
-        g['Distrito'], 
-        g['tipo_estacionamiento']
-    )
-    
-    # 6. COSTS & FEASIBILITY
-    # Construction Costs
-    costos_directos = (reg['cus_area'] * g['costoMetroConstruccion']) + dem_cost + (reg['cus_area'] * g['costoMetroConstruccion']) 
-    # Note: Original formula added constr_cost TWICE? 
-    # Original: cus_area * cost + dem + cus_area * cost. 
-    # This implies 2x cost or maybe construction + finishes? Keeping original logic for fidelity, but it looks suspicious.
-    # PROPOSAL: Assuming this is intentional (Base + Finishes?), keeping it.
-    
-    Costos_Directos = f"${costos_directos:,.2f} mxn"
-    
-    # Indirect Costs
-    area_com_est = mix['area_comercio'] + park['area']
-    area_venta = reg['cus_area'] - area_com_est
-    
-    ingreso_vivienda = area_venta * g['Costo_de_venta_m2']
-    ingreso_bruto_inicial = ingreso_vivienda + mix['ingreso_total']
-    
-    precio_venta_promedio = ingreso_bruto_inicial / reg['cus_area'] if reg['cus_area'] else 0
-    
-    # Percentages
-    pct_honorarios = 15.0
-    pct_legales = 2.0
-    pct_adm = 10.0
-    pct_fin = 3.0
-    pct_com = 6.0
-    
-    cost_honorarios = costos_directos * (pct_honorarios / 100.0)
-    cost_legales = ingreso_bruto_inicial * (pct_legales / 100.0)
-    cost_adm = ingreso_bruto_inicial * (pct_adm / 100.0)
-    cost_fin = ingreso_bruto_inicial * (pct_fin / 100.0)
-    cost_com = ingreso_bruto_inicial * (pct_com / 100.0)
-    
-    costos_indirectos = cost_honorarios + cost_legales + cost_adm + cost_fin + cost_com
-    Costos_Indirectos = f"${costos_indirectos:,.2f} mxn"
-    
-    # Total Construction Cost
-    costo_total_construccion = total_val + costos_directos + costos_indirectos + park['cost']
-    Costo_total_Construccion = f"${costo_total_construccion:,.2f} mxn"
-    
-    # 7. SIMULATION (Target Price)
-    # Initial utility
-    ganancia_bruta = ingreso_bruto_inicial - costo_total_construccion
-    if ingreso_bruto_inicial > 0:
-        utilidad_actual = (ganancia_bruta / ingreso_bruto_inicial) * 100.0
-    else:
-        utilidad_actual = 0.0
-        
-    if g['correrSimulacion']:
-        # Optimized Mathematical Solution (O(1)) instead of Loop
-        target_rev, target_gain, target_util = solve_target_price(
-            costo_total_construccion, 
-            g['utilidadDeseada'],
-            ingreso_bruto_inicial
-        )
-        sim_iter = 1 # It's just one calc now
-    else:
-        target_rev = ingreso_bruto_inicial
-        target_gain = ganancia_bruta
-        target_util = utilidad_actual
-        sim_iter = 0
-        
-    Nuevo_Precio_venta = f"${target_rev:,.2f}"
-    Nueva_Ganancia_Bruta = f"${target_gain:,.2f}"
-    Utilidad_Final = f"{target_util:.2f}%"
-    
-    # 8. EXPORT
+    # Shared core: a missing checkout is reported like any other input error
+    import_core(g)
+    import nona_core
+    import run_log
+    validate_inputs(g)
     export_status = "Skipped"
-    if g['Reporte_excel']:
-        data_map = {
-            "Area Terreno": area_val,
-            "Valor Terreno": total_val,
-            "COS Area": reg['cos_area'],
-            "CUS Area": reg['cus_area'],
-            "Area Venta": area_venta,
-            "Costo Directo": costos_directos,
-            "Costo Indirecto": costos_indirectos,
-            "Costo Total": costo_total_construccion,
-            "Ingreso Inicial": ingreso_bruto_inicial,
-            "Ingreso Meta": target_rev,
-            "Utilidad Meta": target_util
-        }
-        # Add parking details
-        if park['area'] > 0:
-            data_map["Costo Estacionamiento"] = park['cost']
-            
-        export_status = export_to_csv(os.path.join(g['ruta_carpeta'], "resultados_noNa.csv"), data_map)
+
+    if is_lot_list(g['area_terreno']):
+        # LOT MODE - every lot of the block in one columnar pass
+        lots = solve_lots(g)
+        solved = lots.pop('solved')
+        g.update(lots)
+        warn_unknown_delegaciones(g, [lot[1] if lot is not None else None for lot in solved])
+
+        if g.get('Reporte_excel'):
+            export_status = log_solve(
+                g['ruta_carpeta'], [lot for lot in solved if lot is not None],
+                "resultados_noNa_lotes.csv", lot_summary_rows(lots['Errores_lotes'], solved)
+            )
+    else:
+        # 1. LAND (geometry is the only part the core cannot do)
+        area_val = surface_area(g['area_terreno'])
+
+        # 2. MODEL - reruns only the nodes downstream of what changed since the last solve
+        request = build_request(g, area_val)
+        state = state_cache().solve(component_key(g), request)
+
+        # 3. OUTPUTS
+        g.update(format_outputs(state.raw, state.values['costo_local_m2']))
+        warn_unknown_delegaciones(g, [state.raw])
+
+        # 4. EXPORT
+        if g.get('Reporte_excel'):
+            export_status = log_solve(
+                g['ruta_carpeta'], [(request, state.raw)],
+                "resultados_noNa.csv", summary_rows(export_row(state.raw))
+            )
 
 except Exception as e:
     # Global Error Handler for GH Output
@@ -0,0 +1,123 @@
+"""scenario_result_columns
+
+Revision ID: 8b2e4d61c0f3
+Revises: 3f1c2a9d7b10
+Create Date: 2026-10-17 21:40:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8b2e4d61c0f3'
+down_revision: Union[str, Sequence[str], None] = '3f1c2a9d7b10'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+RESULT_COLUMNS = (
+    ('utilidad', sa.Float()),
+    ('roi', sa.Float()),
+    ('costo_total', sa.Float()),
+    ('cus_area', sa.Float()),
+    ('n_viviendas', sa.Integer()),
+)
+INDEXED_COLUMNS = ('utilidad', 'roi', 'costo_total', 'cus_area', 'n_viviendas', 'created_at')
+BACKFILL_CHUNK = 1000
+
+
+def _number(value):
+    """Float of a stored number or formatted text ("$1,234.50", "12.30%"); None if unparseable."""
+    if isinstance(value, bool) or value is None:
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    try:
+        return float(str(value).replace('$', '').replace(',', '').replace('%', '').replace('mxn', '').strip())
+    except ValueError:
+        return None
+
+
+def _columns(input_data, summary):
+    """
+    Typed columns of one stored scenario, from what was saved with it: the
+    result_summary (utilidad, costo_total) and the inputs (cus_area,
+    n_viviendas, location). roi is derived from the stored margin: revenue
+    is cost plus gain, so roi = 100 * m / (100 - m) for a margin m < 100.
+    Self-contained on purpose: the migration must not depend on, or
+    recalculate with, the current model.
+    """
+    inputs = input_data if isinstance(input_data, dict) else {}
+    summary = summary if isinstance(summary, dict) else {}
+    utilidad = _number(summary.get('roi'))  # summary 'roi' holds utilidad_optimizada
+    if utilidad is None:
+        utilidad = _number(summary.get('utilidad'))
+    area, cus = _number(inputs.get('area_terreno')), _number(inputs.get('CUS'))
+    n_viviendas = _number(inputs.get('n_viviendas'))
+    roi = 100.0 * utilidad / (100.0 - utilidad) if utilidad is not None and utilidad < 100.0 else None
+    # A failed calculation stored an empty summary: no results
+    has_results = bool(summary)
+    return {
+        'utilidad': utilidad,
+        'roi': roi,
+        'costo_total': _number(summary.get('costo_total')),
+        'cus_area': area * cus if has_results and area is not None and cus is not None else None,
+        'n_viviendas': int(n_viviendas) if has_results and n_viviendas is not None else None,
+        'lat': _number(inputs.get('lat')),
+        'lng': _number(inputs.get('lng')),
+    }
+
+
+def _backfill() -> None:
+    """Fills the new columns of stored scenarios from their saved summary and inputs, chunk by chunk."""
+    bind = op.get_bind()
+    scenarios = sa.table(
+        'scenarios', sa.column('id', sa.Integer()), sa.column('input_data', sa.JSON()),
+        sa.column('result_summary', sa.JSON()),
+        *(sa.column(name, type_) for name, type_ in RESULT_COLUMNS),
+        sa.column('lat', sa.Float()), sa.column('lng', sa.Float()),
+    )
+    names = [name for name, _ in RESULT_COLUMNS] + ['lat', 'lng']
+    update = (
+        scenarios.update()
+        .where(scenarios.c.id == sa.bindparam('_id'))
+        .values({name: sa.bindparam(name) for name in names})
+    )
+
+    last_id = 0
+    while True:
+        rows = bind.execute(
+            sa.select(scenarios.c.id, scenarios.c.input_data, scenarios.c.result_summary)
+            .where(scenarios.c.id > last_id)
+            .order_by(scenarios.c.id)
+            .limit(BACKFILL_CHUNK)
+        ).all()
+        if not rows:
+            break
+        bind.execute(update, [dict(_columns(row.input_data, row.result_summary), _id=row.id) for row in rows])
+        last_id = rows[-1].id
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    with op.batch_alter_table('scenarios') as batch_op:
+        for name, type_ in RESULT_COLUMNS:
+            batch_op.add_column(sa.Column(name, type_, nullable=True))
+        batch_op.add_column(sa.Column('lat', sa.Float(), nullable=True))
+        batch_op.add_column(sa.Column('lng', sa.Float(), nullable=True))
+    _backfill()
+    for name in INDEXED_COLUMNS:
+        op.create_index(f'ix_scenarios_customer_{name}', 'scenarios', ['customer_id', name, 'id'])
+    op.create_index('ix_scenarios_lat_lng', 'scenarios', ['lat', 'lng'])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_scenarios_lat_lng', table_name='scenarios')
+    for name in INDEXED_COLUMNS:
+        op.drop_index(f'ix_scenarios_customer_{name}', table_name='scenarios')
+    with op.batch_alter_table('scenarios') as batch_op:
+        for name in ('lng', 'lat') + tuple(name for name, _ in reversed(RESULT_COLUMNS)):
+            batch_op.drop_column(name)
@@ -0,0 +1,37 @@
+"""parameter_changes
+
+Revision ID: c5a7e3f92d14
+Revises: 8b2e4d61c0f3
+Create Date: 2026-10-17 23:10:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c5a7e3f92d14'
+down_revision: Union[str, Sequence[str], None] = '8b2e4d61c0f3'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'parameter_changes',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('version', sa.Integer(), nullable=False),
+        sa.Column('changed_at', sa.DateTime(), nullable=True),
+        sa.Column('changes', sa.JSON(), nullable=False),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_parameter_changes_version'), 'parameter_changes', ['version'], unique=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_parameter_changes_version'), table_name='parameter_changes')
+    op.drop_table('parameter_changes')
@@ -0,0 +1,52 @@
+"""parking_rules
+
+Revision ID: d4b8f1a6e207
+Revises: c5a7e3f92d14
+Create Date: 2026-10-18 09:30:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd4b8f1a6e207'
+down_revision: Union[str, Sequence[str], None] = 'c5a7e3f92d14'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# parameter_version row of the parking rules (database.PARKING_RULES_VERSION_ID)
+PARKING_RULES_VERSION_ID = 2
+# The model's built-in rules (nona_core CONSTANTS['PARKING_FACTORS']) as they
+# were when the table was introduced, valid in every city
+DEFAULT_RULES = (('centro', 35.0), ('poniente', 25.0), ('norte', 30.0), ('sur', 25.0))
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    parking_rules = op.create_table(
+        'parking_rules',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('city', sa.String(), nullable=False, server_default=''),
+        sa.Column('delegacion', sa.String(), nullable=False),
+        sa.Column('district', sa.String(), nullable=False, server_default=''),
+        sa.Column('comercial', sa.Float(), nullable=False),
+        sa.Column('updated_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('city', 'delegacion', 'district', name='uq_parking_rules_key')
+    )
+    # Seeded, so the built-in rules stay under any rule stored later
+    op.bulk_insert(parking_rules, [
+        {'city': '', 'delegacion': delegacion, 'district': '', 'comercial': comercial}
+        for delegacion, comercial in DEFAULT_RULES
+    ])
+    parameter_version = sa.table('parameter_version', sa.column('id', sa.Integer()), sa.column('version', sa.Integer()))
+    op.bulk_insert(parameter_version, [{'id': PARKING_RULES_VERSION_ID, 'version': 1}])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute(f"DELETE FROM parameter_version WHERE id = {PARKING_RULES_VERSION_ID}")
+    op.drop_table('parking_rules')
@@ -0,0 +1,41 @@
+"""zoning_zones
+
+Revision ID: e91c3a5d7f42
+Revises: d4b8f1a6e207
+Create Date: 2026-10-18 11:15:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e91c3a5d7f42'
+down_revision: Union[str, Sequence[str], None] = 'd4b8f1a6e207'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'zoning_zones',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('source', sa.String(), nullable=False),
+        sa.Column('zona', sa.String(), nullable=False, server_default=''),
+        sa.Column('cos', sa.Float(), nullable=False),
+        sa.Column('cus', sa.Float(), nullable=False),
+        sa.Column('cas', sa.Float(), nullable=True),
+        sa.Column('properties', sa.JSON(), nullable=True),
+        sa.Column('rings', sa.JSON(), nullable=False),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_zoning_zones_source'), 'zoning_zones', ['source'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_zoning_zones_source'), table_name='zoning_zones')
+    op.drop_table('zoning_zones')
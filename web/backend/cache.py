@@ -0,0 +1,213 @@
+"""
+NoNA API Caches
+In-process caches shared by the request handlers.
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from types import MappingProxyType
+from typing import Any, Callable, Dict, Mapping, NamedTuple, Optional
+
+import database
+import nona_core
+import normativa
+
+
+class ParameterSnapshot(NamedTuple):
+    version: int
+    values: Mapping[str, float]
+
+
+class ParameterCache:
+    """
+    Immutable snapshot of the `parameters` table plus its version.
+
+    The version row is re-checked at most every `check_interval` seconds, so
+    other workers' PUT /parameters are picked up within that window while the
+    local worker sees its own updates immediately via invalidate().
+    """
+
+    def __init__(self, check_interval: float = 1.0):
+        self.check_interval = check_interval
+        self._snapshot: Optional[ParameterSnapshot] = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def get(self, db) -> ParameterSnapshot:
+        now = time.monotonic()
+        snapshot = self._snapshot
+        if snapshot is not None and now - self._checked_at < self.check_interval:
+            return snapshot
+
+        version = database.get_parameter_version(db)
+        if snapshot is None or snapshot.version != version:
+            rows = db.query(database.Parameter).all()
+            snapshot = ParameterSnapshot(version, MappingProxyType({p.key: p.value for p in rows}))
+
+        with self._lock:
+            self._snapshot = snapshot
+            self._checked_at = now
+        return snapshot
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._snapshot = None
+
+
+parameter_cache = ParameterCache(
+    check_interval=float(os.getenv("NONA_PARAMETER_CACHE_CHECK_SECONDS", "1.0"))
+)
+
+
+class CompiledTableCache:
+    """
+    A table compiled into an in-memory structure (anything with a `version`
+    attribute), reloaded by load(db) whenever the table's parameter_version
+    row changes and then handed to install().
+
+    Like ParameterCache, the version row is re-checked at most every
+    `check_interval` seconds; invalidate() forces the next get() to reload.
+    """
+
+    def __init__(self, version_id: int, load: Callable[[Any], Any], install: Callable[[Any], None],
+                 check_interval: float = 1.0):
+        self.version_id = version_id
+        self.load = load
+        self.install = install
+        self.check_interval = check_interval
+        self._value: Any = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def get(self, db) -> Any:
+        now = time.monotonic()
+        value = self._value
+        if value is not None and now - self._checked_at < self.check_interval:
+            return value
+
+        version = database.get_parameter_version(db, self.version_id)
+        if value is None or value.version != version:
+            value = self.load(db)
+
+        with self._lock:
+            if value is not self._value:
+                self.install(value)
+            self._value = value
+            self._checked_at = now
+        return value
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._value = None
+
+
+# `parking_rules`, installed as the model's active rules
+parking_rule_cache = CompiledTableCache(
+    database.PARKING_RULES_VERSION_ID, database.load_parking_rules, nona_core.set_parking_rules,
+    check_interval=float(os.getenv("NONA_PARAMETER_CACHE_CHECK_SECONDS", "1.0"))
+)
+
+# `zoning_zones`, behind the spatial index that fills in COS/CUS/CAS
+zoning_index_cache = CompiledTableCache(
+    database.NORMATIVA_VERSION_ID, database.load_zoning_index, normativa.set_zoning_index,
+    check_interval=float(os.getenv("NONA_PARAMETER_CACHE_CHECK_SECONDS", "1.0"))
+)
+
+
+# Request fields that never influence run_calculation and are left out of keys.
+RESULT_KEY_IGNORED_FIELDS = frozenset({'project_name', 'address', 'lat', 'lng', 'parameters'})
+
+
+def _normalize(value: Any, precision: int) -> Any:
+    if isinstance(value, bool) or value is None or isinstance(value, str):
+        return value
+    if isinstance(value, (int, float)):
+        return round(float(value), precision)
+    if isinstance(value, dict):
+        return {k: _normalize(v, precision) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        # Order is meaningful (delegacion[i] pairs with Distrito[i])
+        return [_normalize(v, precision) for v in value]
+    return str(value)
+
+
+class ResultCache:
+    """
+    Bounded LRU + TTL cache of run_calculation results.
+
+    Keys are a hash of the canonicalized request (floats rounded to
+    `precision` decimals, list order preserved) and the parameter version,
+    so a PUT /parameters naturally retires every cached result.
+    Cached results are shared between callers and must not be mutated.
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 300.0, precision: int = 6):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.precision = precision
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def make_key(self, data: Dict[str, Any], parameter_version: Any) -> str:
+        payload = {
+            k: _normalize(v, self.precision)
+            for k, v in data.items() if k not in RESULT_KEY_IGNORED_FIELDS
+        }
+        canonical = json.dumps([parameter_version, payload], sort_keys=True, separators=(',', ':'))
+        return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires_at, result = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return result
+
+    def put(self, key: str, result: Dict[str, Any]) -> None:
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, result)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'size': len(self._entries),
+                'maxsize': self.maxsize,
+                'ttl': self.ttl,
+                'precision': self.precision,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+            }
+
+
+result_cache = ResultCache(
+    maxsize=int(os.getenv("NONA_RESULT_CACHE_SIZE", "1024")),
+    ttl=float(os.getenv("NONA_RESULT_CACHE_TTL", "300")),
+    precision=int(os.getenv("NONA_RESULT_CACHE_PRECISION", "6"))
+)
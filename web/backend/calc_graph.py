@@ -0,0 +1,37 @@
+"""
+NoNA Incremental Calculation Graph
+Stateful front end to the node graph (MODEL_LEAVES / MODEL_NODES).
+
+evaluate() runs the full model once and keeps every intermediate value;
+update() applies changed request fields and reruns only the nodes whose
+inputs actually changed. A node whose outputs come out identical stops the
+propagation, so e.g. a new Costo_de_venta_m2 reruns income, indirects, IVA,
+profit and unit metrics but never land, regulatory, demolition or parking.
+
+The engine lives in nona_core.py so NoNA.py (Grasshopper) runs the same one;
+this module adds the API view of the graph.
+"""
+
+from typing import Dict, Any
+
+import logic
+from nona_core import CalcState, FIELD_LEAVES, StateCache, evaluate, update, downstream
+
+
+def graph_spec() -> Dict[str, Any]:
+    """Machine-readable formula graph (sections refer to MATHEMATICAL_FORMULAS.md)."""
+    return {
+        'inputs': [
+            {'name': leaf, 'field': field}
+            for leaf, (field, _) in logic.MODEL_LEAVES.items()
+        ],
+        'nodes': [
+            {
+                'name': node.name,
+                'inputs': list(node.inputs),
+                'outputs': list(node.outputs),
+                'formula': node.formula,
+            }
+            for node in logic.MODEL_NODES
+        ],
+    }
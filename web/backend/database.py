@@ -1,20 +1,70 @@
-from sqlalchemy import create_engine, Column, Integer, String, Float, DateTime, ForeignKey, JSON
-from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker, relationship
+from sqlalchemy import create_engine, event, inspect, text, bindparam, insert, update, delete, Column, Integer, String, Float, DateTime, ForeignKey, JSON, Index, UniqueConstraint, func
+from sqlalchemy.orm import declarative_base, sessionmaker, relationship
 from datetime import datetime
 
 import os
 
+import nona_core
+import normativa
+
 DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./nona.db")
 
 # Handle Render/Railway postgres:// vs postgresql://
 if DATABASE_URL.startswith("postgres://"):
     DATABASE_URL = DATABASE_URL.replace("postgres://", "postgresql://", 1)
 
-if "sqlite" in DATABASE_URL:
-    engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False})
-else:
-    engine = create_engine(DATABASE_URL)
+# --- Engine configuration ---
+# SQLite (the desktop build): WAL so readers never wait for the writer, fsync
+# only at checkpoints (synchronous=NORMAL is still crash-safe in WAL mode),
+# memory-mapped reads and a busy timeout instead of "database is locked".
+SQLITE_PRAGMAS = {
+    "journal_mode": os.getenv("NONA_SQLITE_JOURNAL_MODE", "WAL"),
+    "synchronous": os.getenv("NONA_SQLITE_SYNCHRONOUS", "NORMAL"),
+    "mmap_size": int(os.getenv("NONA_SQLITE_MMAP_SIZE", str(256 * 1024 * 1024))),
+    "busy_timeout": int(os.getenv("NONA_SQLITE_BUSY_TIMEOUT_MS", "5000")),
+}
+
+# Server databases (Postgres): QueuePool sizing, pre-ping for connections the
+# server or a proxy dropped, and a per-statement timeout.
+POOL_OPTIONS = {
+    "pool_size": int(os.getenv("NONA_DB_POOL_SIZE", "10")),
+    "max_overflow": int(os.getenv("NONA_DB_MAX_OVERFLOW", "20")),
+    "pool_timeout": float(os.getenv("NONA_DB_POOL_TIMEOUT", "30")),
+    "pool_recycle": int(os.getenv("NONA_DB_POOL_RECYCLE", "1800")),
+    "pool_pre_ping": os.getenv("NONA_DB_POOL_PRE_PING", "1") not in ("0", "false", "False"),
+}
+STATEMENT_TIMEOUT_MS = int(os.getenv("NONA_DB_STATEMENT_TIMEOUT_MS", "30000"))
+
+def _is_memory_sqlite(url: str) -> bool:
+    return url in ("sqlite://", "sqlite:///:memory:") or "mode=memory" in url
+
+def make_engine(url: str, sqlite_pragmas=None, pool_options=None, statement_timeout_ms=None):
+    """Engine for `url` with the settings above (each overridable, e.g. by benchmarks)."""
+    if url.startswith("sqlite"):
+        pragmas = dict(SQLITE_PRAGMAS if sqlite_pragmas is None else sqlite_pragmas)
+        if _is_memory_sqlite(url):
+            # No journal file and nothing to map for an in-memory database
+            pragmas.pop("journal_mode", None)
+            pragmas.pop("mmap_size", None)
+        new_engine = create_engine(url, connect_args={"check_same_thread": False})
+
+        @event.listens_for(new_engine, "connect")
+        def _set_sqlite_pragmas(dbapi_connection, connection_record):
+            cursor = dbapi_connection.cursor()
+            for name, value in pragmas.items():
+                cursor.execute(f"PRAGMA {name}={value}")
+            cursor.close()
+
+        return new_engine
+
+    options = dict(POOL_OPTIONS if pool_options is None else pool_options)
+    timeout = STATEMENT_TIMEOUT_MS if statement_timeout_ms is None else statement_timeout_ms
+    connect_args = {}
+    if url.startswith("postgresql") and timeout:
+        connect_args["options"] = f"-c statement_timeout={timeout}"
+    return create_engine(url, connect_args=connect_args, **options)
+
+engine = make_engine(DATABASE_URL)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 Base = declarative_base()
@@ -42,7 +92,27 @@ class Scenario(Base):
     # Store key result metrics for quick access
     result_summary = Column(JSON)
     
+    # Typed copies of the headline results and the location, written with the
+    # scenario (see scenario_metrics) so portfolios sort and filter in SQL
+    utilidad = Column(Float)  # utilidad_optimizada, %
+    roi = Column(Float)  # %
+    costo_total = Column(Float)
+    cus_area = Column(Float)
+    n_viviendas = Column(Integer)
+    lat = Column(Float)
+    lng = Column(Float)
+    
     customer = relationship("Customer", back_populates="scenarios")
+    
+    __table_args__ = (
+        Index("ix_scenarios_customer_utilidad", "customer_id", "utilidad", "id"),
+        Index("ix_scenarios_customer_roi", "customer_id", "roi", "id"),
+        Index("ix_scenarios_customer_costo_total", "customer_id", "costo_total", "id"),
+        Index("ix_scenarios_customer_cus_area", "customer_id", "cus_area", "id"),
+        Index("ix_scenarios_customer_n_viviendas", "customer_id", "n_viviendas", "id"),
+        Index("ix_scenarios_customer_created_at", "customer_id", "created_at", "id"),
+        Index("ix_scenarios_lat_lng", "lat", "lng"),
+    )
 
 class Parameter(Base):
     __tablename__ = "parameters"
@@ -52,6 +122,432 @@ class Parameter(Base):
     description = Column(String)
     group = Column(String, index=True) # Costos, Normativa, etc.
 
+class ParameterVersion(Base):
+    __tablename__ = "parameter_version"
+    
+    # One row per versioned table, bumped on every change so that every worker
+    # can cheaply detect a stale cache: PARAMETER_VERSION_ID for `parameters`,
+    # PARKING_RULES_VERSION_ID for `parking_rules`.
+    id = Column(Integer, primary_key=True)
+    version = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+class ParameterChange(Base):
+    __tablename__ = "parameter_changes"
+    
+    # Audit row per change-set: the version it produced and, per key, the value
+    # before and after ({key: [old, new]}, old is null for new parameters).
+    # Walking these back from the current values gives any recorded version.
+    id = Column(Integer, primary_key=True)
+    version = Column(Integer, nullable=False, unique=True, index=True)
+    changed_at = Column(DateTime, default=datetime.utcnow)
+    changes = Column(JSON, nullable=False)
+
+
+class ParkingRule(Base):
+    __tablename__ = "parking_rules"
+
+    # Commercial parking requirement: one spot per `comercial` m2 of
+    # commercial area. Names are stored normalized (see ParkingRules.normalize);
+    # an empty city or district makes the rule apply to all of them.
+    id = Column(Integer, primary_key=True)
+    city = Column(String, nullable=False, default="")
+    delegacion = Column(String, nullable=False)
+    district = Column(String, nullable=False, default="")
+    comercial = Column(Float, nullable=False)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    __table_args__ = (
+        UniqueConstraint("city", "delegacion", "district", name="uq_parking_rules_key"),
+    )
+
+
+class ZoningZone(Base):
+    __tablename__ = "zoning_zones"
+
+    # One zoning polygon of the normativa and its coefficients. `source` names
+    # the dataset it was loaded from (replaced as a whole, see
+    # replace_zoning_source); `rings` holds every ring as [lng, lat] pairs.
+    id = Column(Integer, primary_key=True)
+    source = Column(String, nullable=False, index=True)
+    zona = Column(String, nullable=False, default="")
+    cos = Column(Float, nullable=False)
+    cus = Column(Float, nullable=False)
+    cas = Column(Float)
+    properties = Column(JSON)
+    rings = Column(JSON, nullable=False)
+
+
+PARAMETER_VERSION_ID = 1
+PARKING_RULES_VERSION_ID = 2
+NORMATIVA_VERSION_ID = 3
+
+def get_parameter_version(db, row_id: int = PARAMETER_VERSION_ID) -> int:
+    version = db.query(ParameterVersion.version).filter(ParameterVersion.id == row_id).scalar()
+    return version or 0
+
+def bump_parameter_version(db, row_id: int = PARAMETER_VERSION_ID) -> int:
+    """Atomically increments the parameter (or another table's) version. Caller commits."""
+    updated = db.query(ParameterVersion).filter(ParameterVersion.id == row_id).update(
+        {ParameterVersion.version: ParameterVersion.version + 1},
+        synchronize_session=False
+    )
+    if not updated:
+        db.add(ParameterVersion(id=row_id, version=1))
+        db.flush()
+    return get_parameter_version(db, row_id)
+
+def apply_parameter_updates(db, updates):
+    """
+    Applies `updates` (dicts with key, value and optionally description and
+    group; the last entry wins for repeated keys) as one change-set: a single
+    IN query for the current rows, one executemany each for the updates and
+    the inserts, a version bump and a ParameterChange row. Only value changes
+    and new keys make a change-set; description/group edits are written
+    without a bump or audit row, since they never reach a calculation. New
+    keys need a description and group. Returns (version, keys whose values
+    changed). Caller commits.
+    """
+    wanted = {u['key']: u for u in updates}
+    current = {
+        p.key: p for p in
+        db.query(Parameter).filter(Parameter.key.in_(wanted)).with_for_update()
+    }
+    missing = [k for k, u in wanted.items() if k not in current and (u.get('description') is None or u.get('group') is None)]
+    if missing:
+        raise ValueError(f"New parameters need a description and group: {missing}")
+
+    changes, updated, inserted = {}, [], []
+    for key, u in wanted.items():
+        fields = {name: u[name] for name in ('value', 'description', 'group') if u.get(name) is not None}
+        old = current.get(key)
+        if old is None:
+            inserted.append(dict(fields, key=key))
+            changes[key] = [None, u['value']]
+        elif any(getattr(old, name) != value for name, value in fields.items()):
+            updated.append(dict(fields, key=key))
+            if old.value != u['value']:
+                changes[key] = [old.value, u['value']]
+
+    if updated:
+        db.execute(update(Parameter), updated)
+    if inserted:
+        db.execute(insert(Parameter), inserted)
+    if not changes:
+        db.flush()
+        return get_parameter_version(db), []
+    version = bump_parameter_version(db)
+    db.add(ParameterChange(version=version, changes=changes))
+    db.flush()
+    return version, sorted(changes)
+
+def parameters_at_version(db, version: int):
+    """Parameter values as of `version`, rebuilt from the audit rows; ValueError if not recorded."""
+    current_version = get_parameter_version(db)
+    if version < 0 or version > current_version:
+        raise ValueError(f"Unknown parameter version {version}")
+    change_sets = (
+        db.query(ParameterChange)
+        .filter(ParameterChange.version > version)
+        .order_by(ParameterChange.version.desc())
+        .all()
+    )
+    if len(change_sets) != current_version - version:
+        raise ValueError(f"Parameter history for version {version} is not recorded")
+    values = {p.key: p.value for p in db.query(Parameter.key, Parameter.value)}
+    for change_set in change_sets:
+        for key, (old, _) in change_set.changes.items():
+            if old is None:
+                values.pop(key, None)
+            else:
+                values[key] = old
+    return values
+
+def _parking_rule_key(rule):
+    normalize = nona_core.ParkingRules.normalize
+    return normalize(rule.get('city')), normalize(rule['delegacion']), normalize(rule.get('district'))
+
+def apply_parking_rules(db, rules):
+    """
+    Upserts parking rules (dicts with delegacion, comercial and optionally
+    city and district; names are normalized and the last entry wins) and
+    bumps the parking rule version if anything changed. Returns (version,
+    changed keys as "city/delegacion/district"). Caller commits.
+    """
+    wanted = {}
+    for rule in rules:
+        key = _parking_rule_key(rule)
+        if not key[1]:
+            raise ValueError("Parking rules need a delegacion")
+        if not rule['comercial'] > 0:
+            raise ValueError(f"Parking rule {'/'.join(key)} needs comercial > 0")
+        wanted[key] = float(rule['comercial'])
+
+    cities = {city for city, _, _ in wanted}
+    current = {
+        (r.city, r.delegacion, r.district): r for r in
+        db.query(ParkingRule).filter(ParkingRule.city.in_(cities)).with_for_update()
+    }
+    changed, updated, inserted = [], [], []
+    for key, comercial in wanted.items():
+        old = current.get(key)
+        if old is None:
+            city, delegacion, district = key
+            inserted.append({'city': city, 'delegacion': delegacion, 'district': district, 'comercial': comercial})
+        elif old.comercial != comercial:
+            updated.append({'id': old.id, 'comercial': comercial, 'updated_at': datetime.utcnow()})
+        else:
+            continue
+        changed.append('/'.join(key))
+    if not changed:
+        return get_parameter_version(db, PARKING_RULES_VERSION_ID), []
+
+    if updated:
+        db.execute(update(ParkingRule), updated)
+    if inserted:
+        db.execute(insert(ParkingRule), inserted)
+    return bump_parameter_version(db, PARKING_RULES_VERSION_ID), sorted(changed)
+
+def delete_parking_rule(db, rule_id: int) -> int:
+    """Deletes one rule and bumps the version; ValueError if it does not exist. Caller commits."""
+    if not db.execute(delete(ParkingRule).where(ParkingRule.id == rule_id)).rowcount:
+        raise ValueError(f"Unknown parking rule {rule_id}")
+    return bump_parameter_version(db, PARKING_RULES_VERSION_ID)
+
+def seed_parking_rules(db) -> None:
+    """
+    Stores the model's built-in rules (nona_core.DEFAULT_PARKING_RULES) into
+    a rule table that has never been written (version 0), so they sit under
+    any rule added later; rules deleted afterwards stay deleted. Caller commits.
+    """
+    if get_parameter_version(db, PARKING_RULES_VERSION_ID):
+        return
+    defaults = nona_core.DEFAULT_PARKING_RULES
+    apply_parking_rules(db, [
+        {'city': city, 'delegacion': delegacion, 'district': district, 'comercial': defaults.comercial[row]}
+        for row, (city, delegacion, district) in enumerate(defaults.keys)
+    ])
+
+def load_parking_rules(db) -> nona_core.ParkingRules:
+    """Compiles the parking_rules table (seeded with the built-in rules, see seed_parking_rules)."""
+    version = get_parameter_version(db, PARKING_RULES_VERSION_ID)
+    rows = db.query(ParkingRule.city, ParkingRule.delegacion, ParkingRule.district, ParkingRule.comercial)
+    return nona_core.ParkingRules([tuple(row) for row in rows.order_by(ParkingRule.id)], version)
+
+def replace_zoning_source(db, source: str, features) -> tuple:
+    """
+    Replaces every zone of `source` with the given (properties, rings)
+    features and bumps the normativa version. Returns (version, zones).
+    ValueError for a feature without COS/CUS or polygon. Caller commits.
+    """
+    if not source:
+        raise ValueError("A normativa source needs a name")
+    rows = []
+    for n, (properties, rings) in enumerate(features):
+        try:
+            rows.append(dict(normativa.zone_values(properties, rings), source=source))
+        except ValueError as e:
+            raise ValueError(f"Feature {n}: {e}")
+    db.execute(delete(ZoningZone).where(ZoningZone.source == source))
+    if rows:
+        db.execute(insert(ZoningZone), rows)
+    return bump_parameter_version(db, NORMATIVA_VERSION_ID), len(rows)
+
+def delete_zoning_source(db, source: str) -> int:
+    """Drops every zone of `source`; ValueError if there are none. Caller commits."""
+    if not db.execute(delete(ZoningZone).where(ZoningZone.source == source)).rowcount:
+        raise ValueError(f"Unknown normativa source {source}")
+    return bump_parameter_version(db, NORMATIVA_VERSION_ID)
+
+def load_zoning_index(db) -> normativa.ZoningIndex:
+    """Compiles the zoning_zones table into a spatial index."""
+    version = get_parameter_version(db, NORMATIVA_VERSION_ID)
+    rows = db.query(ZoningZone.id, ZoningZone.source, ZoningZone.zona, ZoningZone.cos, ZoningZone.cus,
+                    ZoningZone.cas, ZoningZone.rings).order_by(ZoningZone.id)
+    return normativa.ZoningIndex(
+        ((normativa.Zone(r.id, r.source, r.zona, r.cos, r.cus, r.cas), r.rings) for r in rows), version
+    )
+
+def customer_scenarios(db, customer_id: int, chunk_size: int = 1000, max_id=None):
+    """
+    A customer's scenarios in id order, fetched `chunk_size` rows at a time;
+    only ids up to `max_id` when given (the bound of an earlier listing_state).
+    """
+    query = db.query(Scenario).filter(Scenario.customer_id == customer_id)
+    if max_id is not None:
+        query = query.filter(Scenario.id <= max_id)
+    return query.order_by(Scenario.id).yield_per(chunk_size)
+
+# Scenario column -> key of run_calculation's `raw` result
+SCENARIO_RESULT_COLUMNS = {
+    'utilidad': 'utilidad_optimizada',
+    'roi': 'roi',
+    'costo_total': 'costo_total',
+    'cus_area': 'cus_area',
+    'n_viviendas': 'n_viviendas',
+}
+SCENARIO_SORT_COLUMNS = tuple(SCENARIO_RESULT_COLUMNS) + ('created_at', 'name', 'id')
+
+def scenario_metrics(input_data, raw):
+    """Values of the typed Scenario columns; results stay NULL when `raw` is None (failed calculation)."""
+    metrics = {column: None for column in SCENARIO_RESULT_COLUMNS}
+    if raw is not None:
+        metrics.update((column, raw.get(key)) for column, key in SCENARIO_RESULT_COLUMNS.items())
+    metrics['lat'] = (input_data or {}).get('lat')
+    metrics['lng'] = (input_data or {}).get('lng')
+    return metrics
+
+def query_scenarios(db, customer_id: int, ranges=None, created_after=None, created_before=None,
+                    sort: str = "-utilidad", limit: int = 50, offset: int = 0):
+    """
+    One page of a customer's scenarios plus the total match count.
+    `ranges` maps typed columns to (min, max) bounds (either may be None);
+    `sort` is a SCENARIO_SORT_COLUMNS name, prefixed with '-' for descending.
+    id breaks ties, so the order (like the composite indexes) is total;
+    NULLs sort wherever the database puts them.
+    """
+    descending = sort.startswith('-')
+    key = sort.lstrip('-')
+    if key not in SCENARIO_SORT_COLUMNS:
+        raise ValueError(f"sort must be one of {list(SCENARIO_SORT_COLUMNS)}, optionally prefixed with '-'")
+
+    query = db.query(Scenario).filter(Scenario.customer_id == customer_id)
+    for column, (low, high) in (ranges or {}).items():
+        attr = getattr(Scenario, column)
+        if low is not None:
+            query = query.filter(attr >= low)
+        if high is not None:
+            query = query.filter(attr <= high)
+    if created_after is not None:
+        query = query.filter(Scenario.created_at >= created_after)
+    if created_before is not None:
+        query = query.filter(Scenario.created_at <= created_before)
+
+    total = query.with_entities(func.count(Scenario.id)).scalar()
+    attr = getattr(Scenario, key)
+    order = (attr.desc(), Scenario.id.desc()) if descending else (attr.asc(), Scenario.id.asc())
+    rows = query.order_by(*order).offset(offset).limit(limit).all()
+    return total, rows
+
+def keyset_page(db, model, fields, after=None, limit: int = 100, **filters):
+    """
+    One page of `model` rows in id order, loading only the columns in `fields`
+    (so unrequested JSON payloads are never read). Returns (rows, next_cursor):
+    rows are dicts of `fields`, the cursor is the page's last id (None on the
+    final page) and goes back in as `after`.
+    """
+    columns = list(fields) if 'id' in fields else ['id'] + list(fields)
+    query = db.query(*(getattr(model, column).label(column) for column in columns)).filter_by(**filters)
+    if after is not None:
+        query = query.filter(model.id > after)
+    rows = query.order_by(model.id).limit(limit + 1).all()
+    next_cursor = rows[limit - 1].id if len(rows) > limit else None
+    return [{field: getattr(row, field) for field in fields} for row in rows[:limit]], next_cursor
+
+def listing_state(db, model, **filters):
+    """
+    (row count, max id) of the `model` rows matching `filters`. Customers and
+    scenarios are insert-only, so this pair changes whenever any keyset page
+    over them could; it is answered from the id/filter indexes alone.
+    """
+    count, max_id = db.query(func.count(model.id), func.max(model.id)).filter_by(**filters).one()
+    return count, max_id
+
+# --- Startup schema upgrade ---
+# The desktop build ships without Alembic, and create_all never alters a table
+# that already exists. upgrade_schema brings a nona.db made by an older build
+# up to date in place (what migration 8b2e4d61c0f3 does on server databases).
+UPGRADE_CHUNK = 1000
+
+def _stored_number(value):
+    """Float of a stored number or formatted text ("$1,234.50", "12.30%"); None if unparseable."""
+    if isinstance(value, bool) or value is None:
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    try:
+        return float(str(value).replace('$', '').replace(',', '').replace('%', '').replace('mxn', '').strip())
+    except ValueError:
+        return None
+
+def stored_scenario_metrics(input_data, summary):
+    """
+    Typed Scenario columns of a row saved before they existed, from its
+    result_summary and inputs rather than a recalculation with today's model.
+    The summary's 'roi' holds utilidad_optimizada, the margin m over revenue;
+    revenue is cost plus gain, so roi = 100 * m / (100 - m).
+    """
+    inputs = input_data if isinstance(input_data, dict) else {}
+    summary = summary if isinstance(summary, dict) else {}
+    metrics = {column: None for column in SCENARIO_RESULT_COLUMNS}
+    metrics['lat'] = _stored_number(inputs.get('lat'))
+    metrics['lng'] = _stored_number(inputs.get('lng'))
+    # A failed calculation stored an empty summary: no results
+    if not summary:
+        return metrics
+    margin = _stored_number(summary.get('roi'))
+    if margin is None:
+        margin = _stored_number(summary.get('utilidad'))
+    area, cus = _stored_number(inputs.get('area_terreno')), _stored_number(inputs.get('CUS'))
+    n_viviendas = _stored_number(inputs.get('n_viviendas'))
+    metrics.update(
+        utilidad=margin,
+        roi=100.0 * margin / (100.0 - margin) if margin is not None and margin < 100.0 else None,
+        costo_total=_stored_number(summary.get('costo_total')),
+        cus_area=area * cus if area is not None and cus is not None else None,
+        n_viviendas=int(n_viviendas) if n_viviendas is not None else None,
+    )
+    return metrics
+
+def upgrade_schema(bind):
+    """
+    Adds the Scenario columns missing from an existing scenarios table,
+    backfills them from the stored summaries and creates the missing
+    indexes, in one transaction. A no-op on an up-to-date database.
+    """
+    table = Scenario.__table__
+    inspector = inspect(bind)
+    if not inspector.has_table(table.name):
+        return
+    existing = {column['name'] for column in inspector.get_columns(table.name)}
+    missing = [column for column in table.columns if column.name not in existing]
+    indexes = {index['name'] for index in inspector.get_indexes(table.name)}
+    with bind.begin() as conn:
+        for column in missing:
+            conn.execute(text(
+                f'ALTER TABLE {table.name} ADD COLUMN {column.name} {column.type.compile(dialect=conn.dialect)}'
+            ))
+        names = [column.name for column in missing if column.name in SCENARIO_RESULT_COLUMNS or column.name in ('lat', 'lng')]
+        if names:
+            fill = (
+                table.update()
+                .where(table.c.id == bindparam('_id'))
+                .values({name: bindparam(name) for name in names})
+            )
+            last_id = 0
+            while True:
+                rows = conn.execute(
+                    table.select().with_only_columns(table.c.id, table.c.input_data, table.c.result_summary)
+                    .where(table.c.id > last_id).order_by(table.c.id).limit(UPGRADE_CHUNK)
+                ).all()
+                if not rows:
+                    break
+                params = []
+                for row in rows:
+                    metrics = stored_scenario_metrics(row.input_data, row.result_summary)
+                    params.append(dict({name: metrics[name] for name in names}, _id=row.id))
+                conn.execute(fill, params)
+                last_id = rows[-1].id
+        for index in table.indexes:
+            if index.name not in indexes:
+                index.create(conn)
 
 def init_db():
     Base.metadata.create_all(bind=engine)
+    upgrade_schema(engine)
+    db = SessionLocal()
+    try:
+        seed_parking_rules(db)
+        db.commit()
+    finally:
+        db.close()
@@ -0,0 +1,123 @@
+"""
+Concurrent scenario read/write throughput, default vs tuned SQLite engine.
+
+    python db_benchmark.py [--seconds 5] [--readers 4] [--writers 2] [--rows 5000]
+
+Each run gets a fresh database file seeded with `rows` scenarios. Readers
+page through a customer's scenarios (keyset listing and a ranking query)
+while writers save scenarios in small transactions, as the API does. The
+"default" engine is plain create_engine (rollback journal, synchronous=FULL);
+"tuned" is database.make_engine with SQLITE_PRAGMAS.
+"""
+
+import argparse
+import os
+import random
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+from sqlalchemy import create_engine
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import sessionmaker
+
+import database
+
+INPUT = {
+    "area_terreno": 1000, "valor_terreno": 5000, "COS": 0.7, "CUS": 2.5, "CAS": 0.2,
+    "demolicion": True, "n_viviendas": 10, "usos_mixtos": False, "estacionamiento": True,
+    "costoMetroConstruccion": 10000, "Costo_de_venta_m2": 30000, "areaCirculacionPorcentaje": 0.15,
+    "delegacion": ["centro"], "Distrito": [1.0], "utilidadDeseada": 20, "correrSimulacion": False,
+}
+
+
+def _scenario(customer_id, i):
+    return dict(
+        customer_id=customer_id, name=f"s{i}", created_at=datetime.utcnow(), input_data=INPUT,
+        result_summary={"utilidad": "20.00%", "costo_total": "$1", "roi": 20.0},
+        utilidad=random.uniform(0, 40), roi=random.uniform(0, 60), costo_total=random.uniform(1e6, 1e8),
+        cus_area=2500.0, n_viviendas=random.randint(1, 200), lat=19.4, lng=-99.1,
+    )
+
+
+def _seed(engine, rows):
+    database.Base.metadata.create_all(bind=engine)
+    Session = sessionmaker(bind=engine)
+    with Session() as db:
+        customer = database.Customer(name="bench")
+        db.add(customer)
+        db.commit()
+        db.execute(database.Scenario.__table__.insert(), [_scenario(customer.id, i) for i in range(rows)])
+        db.commit()
+        return customer.id
+
+
+def _run(engine, customer_id, seconds, readers, writers):
+    Session = sessionmaker(bind=engine)
+    counts = {"reads": 0, "writes": 0, "locked": 0}
+    lock = threading.Lock()
+    deadline = time.perf_counter() + seconds
+
+    def count(key):
+        with lock:
+            counts[key] += 1
+
+    def reader():
+        while time.perf_counter() < deadline:
+            try:
+                with Session() as db:
+                    after = None
+                    for _ in range(3):
+                        _, after = database.keyset_page(db, database.Scenario, ("id", "name", "result_summary"), after, 100,
+                                                        customer_id=customer_id)
+                    database.query_scenarios(db, customer_id, {"roi": (10, None)}, sort="-utilidad", limit=50)
+                count("reads")
+            except OperationalError:
+                count("locked")
+
+    def writer():
+        i = 0
+        while time.perf_counter() < deadline:
+            try:
+                with Session() as db:
+                    db.add(database.Scenario(**_scenario(customer_id, i)))
+                    db.commit()
+                count("writes")
+            except OperationalError:
+                count("locked")
+            i += 1
+
+    threads = [threading.Thread(target=reader) for _ in range(readers)]
+    threads += [threading.Thread(target=writer) for _ in range(writers)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--seconds", type=float, default=5.0)
+    parser.add_argument("--readers", type=int, default=4)
+    parser.add_argument("--writers", type=int, default=2)
+    parser.add_argument("--rows", type=int, default=5000)
+    args = parser.parse_args()
+
+    for label in ("default", "tuned"):
+        path = os.path.join(tempfile.mkdtemp(), "bench.db")
+        url = f"sqlite:///{path}"
+        if label == "default":
+            engine = create_engine(url, connect_args={"check_same_thread": False})
+        else:
+            engine = database.make_engine(url)
+        customer_id = _seed(engine, args.rows)
+        counts = _run(engine, customer_id, args.seconds, args.readers, args.writers)
+        engine.dispose()
+        print(f"{label:<8} reads {counts['reads'] / args.seconds:8.1f}/s   "
+              f"writes {counts['writes'] / args.seconds:8.1f}/s   lock errors {counts['locked']}")
+
+
+if __name__ == "__main__":
+    main()
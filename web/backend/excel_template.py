@@ -0,0 +1,162 @@
+"""
+NoNA Excel Report Template
+The single-scenario report always has the same layout, styles, column
+widths, hidden chart-data columns and charts; only the numbers change.
+
+ExcelTemplate builds that workbook once from a sample result and keeps the
+saved package: every part except the worksheet (and the document
+timestamps) is stored pre-compressed. Rendering a report only rewrites the
+value cells of the worksheet XML and appends it to a copy of the cached zip.
+Results whose layout differs from the template (errors, text where the
+template has numbers or vice versa) go through logic.generate_excel_content.
+"""
+
+import io
+import re
+import threading
+import zipfile
+from datetime import datetime, timezone
+from typing import Dict, List, Any, Optional, Tuple
+from xml.sax.saxutils import escape
+
+from openpyxl.compat import safe_string
+
+import logic
+
+SHEET_PART = 'xl/worksheets/sheet1.xml'
+CORE_PART = 'docProps/core.xml'
+
+# Representative input used to build the template (MATHEMATICAL_FORMULAS.md example)
+TEMPLATE_SAMPLE = {
+    'area_terreno': 500,
+    'valor_terreno': 10000,
+    'COS': 0.7,
+    'CUS': 2.1,
+    'n_viviendas': 10,
+    'costoMetroConstruccion': 12000,
+    'Costo_de_venta_m2': 35000,
+}
+
+_TIMESTAMP = re.compile(r'(<dcterms:(?:created|modified)[^>]*>)[^<]*(</dcterms:(?:created|modified)>)')
+
+
+def _layout_values(result: Dict[str, Any]) -> Tuple[List[Any], List[Any]]:
+    """Value-cell contents and their layout signature (number formats)."""
+    sections, bar_data, pie_data = logic.excel_report_layout(result)
+    values, formats = [], []
+    for _, rows in sections:
+        for _, val, fmt, _ in rows:
+            values.append(val if val is not None else 0)
+            formats.append(fmt)
+    values.extend(val for _, val in bar_data)
+    values.extend(val for _, val in pie_data)
+    return values, formats
+
+
+def _kind(value: Any) -> str:
+    if value is None:
+        return 'none'
+    if isinstance(value, bool):
+        return 'bool'
+    return 'number' if isinstance(value, (int, float)) else 'text'
+
+
+def _cell_xml(coordinate: str, style: str, value: Any) -> str:
+    if value is None:
+        return f'<c r="{coordinate}"{style} />'
+    if isinstance(value, bool):
+        return f'<c r="{coordinate}"{style} t="b"><v>{int(value)}</v></c>'
+    if isinstance(value, (int, float)):
+        return f'<c r="{coordinate}"{style} t="n"><v>{safe_string(value)}</v></c>'
+    return f'<c r="{coordinate}"{style} t="inlineStr"><is><t>{escape(str(value))}</t></is></c>'
+
+
+class ExcelTemplate:
+    def __init__(self, sample: Dict[str, Any]):
+        wb, cells = logic.build_excel_report(sample)
+        output = io.BytesIO()
+        wb.save(output)
+        values, self.formats = _layout_values(sample)
+        self.kinds = [_kind(v) for v in values]
+
+        package = zipfile.ZipFile(io.BytesIO(output.getvalue()))
+        sheet = package.read(SHEET_PART).decode('utf-8')
+        self.core = package.read(CORE_PART).decode('utf-8')
+        self.date_time = package.getinfo(SHEET_PART).date_time
+
+        # Split the worksheet XML around every value cell, keeping its style.
+        # Chart data (column AA) interleaves with the report rows, so cells are
+        # located first and then sorted into document order.
+        spans = []
+        for index, coordinate in enumerate(cells):
+            match = re.search(rf'<c r="{coordinate}"( s="\d+")?[^>]*?(?:/>|>.*?</c>)', sheet)
+            if match is None:
+                raise ValueError(f"Template cell {coordinate} not found")
+            spans.append((match.start(), match.end(), index, coordinate, match.group(1) or ''))
+        spans.sort()
+
+        self.order: List[int] = []     # layout value index per slot, in document order
+        self.slots: List[Tuple[str, str]] = []  # (coordinate, style attribute)
+        self.segments: List[str] = []  # XML between slots
+        pos = 0
+        for start, end, index, coordinate, style in spans:
+            self.segments.append(sheet[pos:start])
+            self.order.append(index)
+            self.slots.append((coordinate, style))
+            pos = end
+        self.segments.append(sheet[pos:])
+
+        # Every other part is copied once, already compressed
+        static = io.BytesIO()
+        with zipfile.ZipFile(static, 'w') as out:
+            for info in package.infolist():
+                if info.filename not in (SHEET_PART, CORE_PART):
+                    out.writestr(info, package.read(info.filename))
+        self.static = static.getvalue()
+
+    def render(self, result: Dict[str, Any]) -> Optional[bytes]:
+        """Report bytes for `result`, or None if it does not fit the template layout."""
+        if "error" in result:
+            return None
+        values, formats = _layout_values(result)
+        if formats != self.formats or [_kind(v) for v in values] != self.kinds:
+            return None
+
+        parts = [self.segments[0]]
+        for index, (coordinate, style), segment in zip(self.order, self.slots, self.segments[1:]):
+            parts.append(_cell_xml(coordinate, style, values[index]))
+            parts.append(segment)
+
+        now = datetime.now(timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ')
+        core = _TIMESTAMP.sub(rf'\g<1>{now}\g<2>', self.core)
+
+        output = io.BytesIO(self.static)
+        with zipfile.ZipFile(output, 'a') as package:
+            # Fresh ZipInfo objects: writestr() fills in sizes on the one it is given
+            for name, data in ((CORE_PART, core), (SHEET_PART, ''.join(parts))):
+                info = zipfile.ZipInfo(name, self.date_time)
+                info.compress_type = zipfile.ZIP_DEFLATED
+                package.writestr(info, data)
+        return output.getvalue()
+
+
+_template: Optional[ExcelTemplate] = None
+_template_lock = threading.Lock()
+
+
+def get_template() -> ExcelTemplate:
+    """The shared template, built on first use."""
+    global _template
+    if _template is None:
+        with _template_lock:
+            if _template is None:
+                _template = ExcelTemplate(logic.run_calculation(dict(TEMPLATE_SAMPLE)))
+    return _template
+
+
+def render_report(result: Dict[str, Any]) -> bytes:
+    """Single-scenario report; same workbook as logic.generate_excel_content."""
+    content = get_template().render(result)
+    if content is None:
+        content = logic.generate_excel_content(result)
+    return content
@@ -0,0 +1,99 @@
+"""
+NoNA Route Executors
+Keeps CPU-bound work out of the event loop of the async handlers.
+
+Every route class gets its own pool, so the work of one class can only queue
+behind its own kind: a burst of full report builds occupies the report
+workers and never the ones answering /calculate. A pool is a thread pool, a
+process pool (which also sidesteps the GIL) or 'inline', which calls the
+function on the event loop: cheaper for sub-millisecond work, at the price
+of blocking the loop while it runs (see load_test.py).
+
+Configured per class through the environment, e.g.
+    NONA_CALCULATE_POOL=thread  NONA_CALCULATE_POOL_WORKERS=4
+    NONA_REPORT_POOL=process    NONA_REPORT_POOL_WORKERS=2
+"""
+
+import asyncio
+import functools
+import multiprocessing
+import os
+import threading
+from concurrent.futures import Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable, Optional
+
+POOL_KINDS = ('inline', 'thread', 'process')
+
+
+class RouteExecutor:
+    """Lazily started pool for one route class."""
+
+    def __init__(self, name: str, kind: str = 'thread', workers: int = 4):
+        if kind not in POOL_KINDS:
+            raise ValueError(f"{name} pool kind must be one of {list(POOL_KINDS)}")
+        self.name = name
+        self.kind = kind
+        self.workers = workers
+        self._pool: Optional[Executor] = None
+        self._lock = threading.Lock()
+
+    def _ensure_pool(self) -> Executor:
+        # Only reached for thread and process pools
+        if self._pool is None:
+            with self._lock:
+                if self._pool is None:
+                    if self.kind == 'process':
+                        self._pool = ProcessPoolExecutor(
+                            max_workers=self.workers, mp_context=multiprocessing.get_context()
+                        )
+                    else:
+                        self._pool = ThreadPoolExecutor(
+                            max_workers=self.workers, thread_name_prefix=f"nona-{self.name}"
+                        )
+        return self._pool
+
+    async def run(self, fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        """Awaits fn(*args, **kwargs) on this class's pool (fn and args must pickle for process pools)."""
+        if self.kind == 'inline':
+            return fn(*args, **kwargs)
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._ensure_pool(), functools.partial(fn, *args, **kwargs))
+
+    def submit(self, fn: Callable[..., Any], *args: Any) -> Future:
+        """Synchronous counterpart of run(), for generators that fan work out in chunks."""
+        if self.kind == 'inline':
+            future: Future = Future()
+            try:
+                future.set_result(fn(*args))
+            except Exception as e:
+                future.set_exception(e)
+            return future
+        return self._ensure_pool().submit(fn, *args)
+
+    def shutdown(self) -> None:
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=True)
+
+
+def _from_env(name: str, kind: str, workers: int) -> RouteExecutor:
+    prefix = f"NONA_{name.upper()}_POOL"
+    return RouteExecutor(
+        name,
+        kind=os.getenv(prefix, kind),
+        workers=int(os.getenv(f"{prefix}_WORKERS", str(workers))),
+    )
+
+
+# Cache misses of /calculate and /export/csv (hits are answered on the loop).
+# A miss is well under a millisecond, so 'inline' has ~10% more throughput
+# on one core (load_test.py), but a thread keeps slow misses (long district
+# lists, large parameter sets) from stalling every other request
+calculate_executor = _from_env('calculate', 'thread', 4)
+# Full openpyxl report builds (results that do not fit the template) take ~15 ms
+report_executor = _from_env('report', 'thread', 2)
+# Monte Carlo chunks (~0.5 s per 50k draws): one long-lived, bounded process
+# pool shared by all requests, which queue behind each other instead of each
+# starting cpu_count() processes
+simulation_executor = _from_env('simulation', 'process', min(os.cpu_count() or 1, 4))
@@ -0,0 +1,189 @@
+"""
+NoNA Bulk Exports
+Columnar exports of `raw` results: CSV, Apache Arrow IPC (streaming format)
+and Parquet.
+
+Results arrive as ResultChunks (one run_calculation_batch pass each) and every
+format is written incrementally, one chunk / record batch at a time, so large
+runs are never held in memory. pyarrow is optional and only imported for the
+arrow and parquet formats.
+"""
+
+import csv
+import io
+import json
+from typing import Dict, List, Any, Iterable, Iterator, NamedTuple, Optional, Sequence
+
+import logic
+
+# format -> (media type, file extension)
+EXPORT_FORMATS = {
+    'csv': ('text/csv', 'csv'),
+    'arrow': ('application/vnd.apache.arrow.stream', 'arrows'),
+    'parquet': ('application/vnd.apache.parquet', 'parquet'),
+}
+
+# Same int casts as logic.batch_row
+INTEGER_FIELDS = ('n_viviendas', 'parking_spots')
+EXPORT_COLUMNS = ('index', 'name', 'error') + logic.BATCH_RAW_FIELDS
+
+
+class ResultChunk(NamedTuple):
+    start: int                                # index of the first row
+    names: List[Optional[str]]                # scenario name per row, if any
+    errors: List[Optional[str]]               # None for rows that calculated
+    columns: Dict[str, List[Optional[float]]]  # BATCH_RAW_FIELDS, None where errors[i]
+
+
+def result_chunk(
+    start: int,
+    names: List[Optional[str]],
+    errors: List[Any],
+    positions: Sequence[int],
+    batch: Optional[Dict[str, Any]]
+) -> ResultChunk:
+    """
+    Expands a run_calculation_batch result over the rows at `positions` into
+    a full chunk; rows without a batch result keep their entry in `errors`
+    (structured validation errors are serialized to JSON text).
+    """
+    n = len(names)
+    errors = [e if e is None or isinstance(e, str) else json.dumps(e) for e in errors]
+    columns: Dict[str, List[Optional[float]]] = {key: [None] * n for key in logic.BATCH_RAW_FIELDS}
+    if batch is not None:
+        ok = batch['mask']
+        for row, pos in enumerate(positions):
+            if not ok[row]:
+                errors[pos] = batch['errors'][row]
+        for key in logic.BATCH_RAW_FIELDS:
+            src, dst = batch['raw'][key], columns[key]
+            cast = int if key in INTEGER_FIELDS else float
+            for row, pos in enumerate(positions):
+                if ok[row]:
+                    dst[pos] = cast(src[row])
+    return ResultChunk(start, names, errors, columns)
+
+
+def scenario_chunks(
+    scenarios: Iterable[Any],
+    params: Dict[str, float],
+    chunk_size: int = 1000,
+    parking_rules: Optional[logic.ParkingRules] = None
+) -> Iterator[ResultChunk]:
+    """ResultChunks for stored scenarios (inputs were validated when they were saved)."""
+    index = 0
+    for chunk in logic.chunked(scenarios, chunk_size):
+        batch = logic.run_calculation_batch(
+            logic.batch_columns([s.input_data or {} for s in chunk]), params, parking_rules
+        )
+        yield result_chunk(index, [s.name for s in chunk], [None] * len(chunk), range(len(chunk)), batch)
+        index += len(chunk)
+
+
+def require_pyarrow(fmt: str) -> None:
+    """Raises RuntimeError early when `fmt` needs pyarrow and it is not installed."""
+    if fmt in ('arrow', 'parquet'):
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            raise RuntimeError(f"{fmt} export requires the 'pyarrow' package")
+
+
+def iter_csv(chunks: Iterable[ResultChunk]) -> Iterator[str]:
+    """Header line, then one block of CSV rows per chunk."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator="\n")
+    writer.writerow(EXPORT_COLUMNS)
+    yield buffer.getvalue()
+    for chunk in chunks:
+        buffer.seek(0)
+        buffer.truncate()
+        cols = [chunk.columns[key] for key in logic.BATCH_RAW_FIELDS]
+        for i in range(len(chunk.names)):
+            writer.writerow([chunk.start + i, chunk.names[i], chunk.errors[i]] + [
+                '' if col[i] is None else repr(col[i]) for col in cols
+            ])
+        yield buffer.getvalue()
+
+
+class _ChunkSink(io.RawIOBase):
+    """Write-only file that hands back what was written since the last drain."""
+
+    def __init__(self):
+        super().__init__()
+        self._parts: List[bytes] = []
+        self._pos = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        data = bytes(data)
+        self._parts.append(data)
+        self._pos += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._pos
+
+    def drain(self) -> bytes:
+        data = b"".join(self._parts)
+        self._parts = []
+        return data
+
+
+def _arrow_schema():
+    import pyarrow as pa
+    fields = [pa.field('index', pa.int64()), pa.field('name', pa.string()), pa.field('error', pa.string())]
+    fields += [
+        pa.field(key, pa.int64() if key in INTEGER_FIELDS else pa.float64())
+        for key in logic.BATCH_RAW_FIELDS
+    ]
+    return pa.schema(fields)
+
+
+def _record_batch(chunk: ResultChunk, schema):
+    import pyarrow as pa
+    n = len(chunk.names)
+    arrays = [
+        pa.array(range(chunk.start, chunk.start + n), type=pa.int64()),
+        pa.array(chunk.names, type=pa.string()),
+        pa.array(chunk.errors, type=pa.string()),
+    ]
+    arrays += [pa.array(chunk.columns[key], type=schema.field(key).type) for key in logic.BATCH_RAW_FIELDS]
+    return pa.RecordBatch.from_arrays(arrays, schema=schema)
+
+
+def iter_arrow(chunks: Iterable[ResultChunk]) -> Iterator[bytes]:
+    """Arrow IPC stream: schema, then one record batch per chunk."""
+    import pyarrow as pa
+    schema = _arrow_schema()
+    sink = _ChunkSink()
+    with pa.ipc.new_stream(sink, schema) as writer:
+        yield sink.drain()
+        for chunk in chunks:
+            writer.write_batch(_record_batch(chunk, schema))
+            yield sink.drain()
+    yield sink.drain()
+
+
+def iter_parquet(chunks: Iterable[ResultChunk]) -> Iterator[bytes]:
+    """Parquet file with one row group per chunk; the footer comes last."""
+    import pyarrow.parquet as pq
+    schema = _arrow_schema()
+    sink = _ChunkSink()
+    with pq.ParquetWriter(sink, schema) as writer:
+        for chunk in chunks:
+            writer.write_batch(_record_batch(chunk, schema))
+            yield sink.drain()
+    yield sink.drain()
+
+
+def iter_export(fmt: str, chunks: Iterable[ResultChunk]) -> Iterator[Any]:
+    if fmt == 'csv':
+        return iter_csv(chunks)
+    if fmt == 'arrow':
+        return iter_arrow(chunks)
+    if fmt == 'parquet':
+        return iter_parquet(chunks)
+    raise ValueError(f"Unknown export format: {fmt}")
@@ -0,0 +1,322 @@
+"""
+NoNA Export Jobs
+Background queue for exports that are too slow to build inside a request.
+
+Jobs run in a process pool and write their file to disk. Workers report
+progress through a multiprocessing queue that a listener thread folds into
+the job table. Clients poll for the status and then download the file.
+Queued jobs are cancelled outright. Running jobs see a cancel marker file at
+their next progress report. Finished jobs and their files expire after a TTL.
+
+Kinds:
+    report    - single-scenario Excel report for `inputs`
+    portfolio - portfolio workbook (reports.py) for a customer's scenarios
+    results   - flattened raw results (exports.py) for a customer's scenarios
+"""
+
+import multiprocessing
+import os
+import tempfile
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor, Future
+from typing import Dict, List, Any, Iterable, Iterator, Optional, Tuple
+
+import database
+import excel_template
+import exports
+import logic
+import reports
+
+XLSX_MEDIA_TYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+
+# kind -> accepted formats (the first one is the default)
+JOB_KINDS = {
+    'report': ('xlsx',),
+    'portfolio': ('xlsx',),
+    'results': tuple(exports.EXPORT_FORMATS),
+}
+# format -> (media type, file extension)
+JOB_FORMATS = dict(exports.EXPORT_FORMATS, xlsx=(XLSX_MEDIA_TYPE, 'xlsx'))
+
+ACTIVE_STATES = ('queued', 'running')
+PROGRESS_EVERY = 100
+DURATION_HISTORY = 100
+
+
+class JobCancelled(Exception):
+    pass
+
+
+# ==============================================================================
+# WORKER SIDE
+# ==============================================================================
+_progress_queue = None
+
+
+def _init_worker(progress_queue) -> None:
+    global _progress_queue
+    _progress_queue = progress_queue
+
+
+def _report(job_id: str, event: str, value: float) -> None:
+    if _progress_queue is not None:
+        _progress_queue.put((job_id, event, value))
+
+
+def _cancel_marker(path: str) -> str:
+    return path + ".cancel"
+
+
+def _tracked(items: Iterable[Any], job_id: str, path: str, total: int) -> Iterator[Any]:
+    """Passes items through, reporting progress (and honouring cancellation) every PROGRESS_EVERY."""
+    done = 0
+    for item in items:
+        yield item
+        done += 1
+        if done % PROGRESS_EVERY == 0:
+            if os.path.exists(_cancel_marker(path)):
+                raise JobCancelled("Cancelled")
+            _report(job_id, 'progress', min(done / total, 1.0))
+
+
+def run_job(
+    job_id: str, kind: str, fmt: str, payload: Dict[str, Any], params: Dict[str, float],
+    parking_rules: logic.ParkingRules, path: str
+) -> Tuple[int, float]:
+    """
+    Builds one export into `path`; returns the file size and the start time.
+    The parameters and parking rules come from the submitting process: the
+    worker's own module state is whatever it was when the pool started.
+    """
+    started = time.time()
+    _report(job_id, 'started', started)
+    if kind == 'report':
+        result = logic.run_calculation(dict(payload, parameters=params, parking_rules=parking_rules))
+        with open(path, 'wb') as f:
+            f.write(excel_template.render_report(result))
+        return os.path.getsize(path), started
+
+    db = database.SessionLocal()
+    try:
+        customer_id = payload['customer_id']
+        # Scenarios saved while the job runs are left out, so `total` stays exact
+        total, max_id = database.listing_state(db, database.Scenario, customer_id=customer_id)
+        scenarios = database.customer_scenarios(db, customer_id, max_id=max_id or 0)
+        with open(path, 'wb') as f:
+            if kind == 'portfolio':
+                # Track written sheets: a whole chunk is evaluated before its sheets go out
+                results = _tracked(reports.scenario_results(scenarios, params, parking_rules=parking_rules), job_id, path, max(total, 1))
+                reports.write_portfolio_workbook(results, f)
+            else:
+                scenarios = _tracked(scenarios, job_id, path, max(total, 1))
+                for part in exports.iter_export(fmt, exports.scenario_chunks(scenarios, params, parking_rules=parking_rules)):
+                    f.write(part.encode('utf-8') if isinstance(part, str) else part)
+    finally:
+        db.close()
+    return os.path.getsize(path), started
+
+
+# ==============================================================================
+# JOB TABLE
+# ==============================================================================
+class ExportJob:
+    __slots__ = ('id', 'kind', 'format', 'status', 'progress', 'error', 'path', 'size',
+                 'created_at', 'started_at', 'finished_at', 'cancel_requested', 'future')
+
+    def __init__(self, kind: str, fmt: str, path_dir: str):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.format = fmt
+        self.status = 'queued'
+        self.progress = 0.0
+        self.error: Optional[str] = None
+        self.path = os.path.join(path_dir, f"{self.id}.{JOB_FORMATS[fmt][1]}")
+        self.size: Optional[int] = None
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.cancel_requested = False
+        self.future: Optional[Future] = None
+
+    @property
+    def filename(self) -> str:
+        return f"NoNA_{self.kind}_{self.id[:8]}.{JOB_FORMATS[self.format][1]}"
+
+    @property
+    def media_type(self) -> str:
+        return JOB_FORMATS[self.format][0]
+
+
+class JobManager:
+    def __init__(self, workers: int = 2, ttl: float = 3600.0, directory: Optional[str] = None):
+        self.workers = workers
+        self.ttl = ttl
+        self.directory = directory or tempfile.mkdtemp(prefix="nona-exports-")
+        self._jobs: "OrderedDict[str, ExportJob]" = OrderedDict()
+        self._durations: deque = deque(maxlen=DURATION_HISTORY)
+        self._lock = threading.Lock()
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._queue = None
+
+    def _ensure_pool(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            ctx = multiprocessing.get_context()
+            self._queue = ctx.Queue()
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.workers, mp_context=ctx,
+                initializer=_init_worker, initargs=(self._queue,)
+            )
+            threading.Thread(target=self._listen, args=(self._queue,), daemon=True).start()
+        return self._pool
+
+    def _listen(self, progress_queue) -> None:
+        while True:
+            message = progress_queue.get()
+            if message is None:
+                return
+            job_id, event, value = message
+            with self._lock:
+                job = self._jobs.get(job_id)
+                # The done callback may already have run; never undo a final state
+                if job is None or job.status not in ACTIVE_STATES:
+                    continue
+                if event == 'started':
+                    job.status = 'running'
+                    job.started_at = value
+                else:
+                    job.progress = value
+
+    def submit(
+        self, kind: str, fmt: Optional[str], payload: Dict[str, Any], params: Dict[str, float],
+        parking_rules: logic.ParkingRules
+    ) -> ExportJob:
+        if kind not in JOB_KINDS:
+            raise ValueError(f"kind must be one of {list(JOB_KINDS)}")
+        fmt = fmt or JOB_KINDS[kind][0]
+        if fmt not in JOB_KINDS[kind]:
+            raise ValueError(f"{kind} exports support formats {list(JOB_KINDS[kind])}")
+        if fmt in ('arrow', 'parquet'):
+            exports.require_pyarrow(fmt)
+
+        self.purge()
+        pool = self._ensure_pool()
+        job = ExportJob(kind, fmt, self.directory)
+        with self._lock:
+            self._jobs[job.id] = job
+        job.future = pool.submit(run_job, job.id, kind, fmt, payload, dict(params), parking_rules, job.path)
+        job.future.add_done_callback(lambda future, job=job: self._finished(job, future))
+        return job
+
+    def _finished(self, job: ExportJob, future: Future) -> None:
+        with self._lock:
+            job.finished_at = time.time()
+            if future.cancelled():
+                job.status = 'cancelled'
+            else:
+                error = future.exception()
+                if isinstance(error, JobCancelled):
+                    job.status = 'cancelled'
+                elif error is not None:
+                    job.status = 'failed'
+                    job.error = str(error)
+                else:
+                    job.status = 'done'
+                    job.progress = 1.0
+                    # The 'started' message can arrive after completion
+                    job.size, job.started_at = future.result()
+            if job.started_at is not None:
+                self._durations.append(job.finished_at - job.started_at)
+        if job.status != 'done':
+            self._remove_files(job)
+
+    def _remove_files(self, job: ExportJob) -> None:
+        for path in (job.path, _cancel_marker(job.path)):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def get(self, job_id: str) -> Optional[ExportJob]:
+        self.purge()
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def cancel(self, job_id: str) -> Optional[ExportJob]:
+        job = self.get(job_id)
+        if job is None or job.status not in ACTIVE_STATES:
+            return job
+        job.cancel_requested = True
+        # Still queued: the future cancels (and the done callback records it)
+        if not job.future.cancel():
+            open(_cancel_marker(job.path), 'w').close()
+        return job
+
+    def purge(self) -> int:
+        """Drops finished jobs (and their files) older than the TTL."""
+        now = time.time()
+        with self._lock:
+            expired = [
+                job for job in self._jobs.values()
+                if job.finished_at is not None and now - job.finished_at > self.ttl
+            ]
+            for job in expired:
+                del self._jobs[job.id]
+        for job in expired:
+            self._remove_files(job)
+        return len(expired)
+
+    def describe(self, job: ExportJob) -> Dict[str, Any]:
+        with self._lock:
+            queued = [j.id for j in self._jobs.values() if j.status == 'queued']
+            now = time.time()
+            return {
+                "id": job.id,
+                "kind": job.kind,
+                "format": job.format,
+                "status": job.status,
+                "progress": job.progress,
+                "queue_position": queued.index(job.id) + 1 if job.id in queued else None,
+                "cancel_requested": job.cancel_requested,
+                "error": job.error,
+                "size": job.size,
+                "wait_seconds": (job.started_at or job.finished_at or now) - job.created_at,
+                "run_seconds": (job.finished_at or now) - job.started_at if job.started_at else None,
+                "expires_in": job.finished_at + self.ttl - now if job.finished_at else None,
+            }
+
+    def jobs(self) -> List[Dict[str, Any]]:
+        self.purge()
+        with self._lock:
+            jobs = list(self._jobs.values())
+        return [self.describe(job) for job in jobs]
+
+    def stats(self) -> Dict[str, Any]:
+        self.purge()
+        with self._lock:
+            counts: Dict[str, int] = {}
+            for job in self._jobs.values():
+                counts[job.status] = counts.get(job.status, 0) + 1
+            durations = sorted(self._durations)
+        return {
+            "workers": self.workers,
+            "queue_depth": counts.get('queued', 0),
+            "running": counts.get('running', 0),
+            "counts": counts,
+            "ttl": self.ttl,
+            "durations": {
+                "count": len(durations),
+                "mean": sum(durations) / len(durations) if durations else None,
+                "p50": durations[len(durations) // 2] if durations else None,
+                "max": durations[-1] if durations else None,
+            },
+        }
+
+
+export_jobs = JobManager(
+    workers=int(os.getenv("NONA_EXPORT_WORKERS", "2")),
+    ttl=float(os.getenv("NONA_EXPORT_TTL_SECONDS", "3600")),
+    directory=os.getenv("NONA_EXPORT_DIR") or None,
+)
@@ -0,0 +1,38 @@
+"""
+Loads a zoning normativa into the zoning_zones table.
+
+    python load_normativa.py zonas.geojson [--source NAME]
+    python load_normativa.py zonas.shp [--source NAME]
+
+Every feature needs COS and CUS attributes (CAS optional) and preferably a
+`zona` name. Shapefiles must be in geographic coordinates (WGS84) and come
+with their .dbf. The zones already stored under the same source (default:
+the file name) are replaced.
+"""
+
+import argparse
+import os
+
+import database
+import normativa
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("path")
+    parser.add_argument("--source", help="dataset name (default: the file name without extension)")
+    args = parser.parse_args()
+
+    source = args.source or os.path.splitext(os.path.basename(args.path))[0]
+    database.init_db()
+    db = database.SessionLocal()
+    try:
+        version, zones = database.replace_zoning_source(db, source, normativa.read_features(args.path))
+        db.commit()
+    finally:
+        db.close()
+    print(f"✅ {zones} zones loaded into '{source}' (normativa version {version}).")
+
+
+if __name__ == "__main__":
+    main()
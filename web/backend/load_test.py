@@ -0,0 +1,106 @@
+"""
+/calculate latency under export load.
+
+Start the API first (uvicorn main:app --port 8000), then:
+    python load_test.py [--seconds 10] [--clients 8] [--exporters 4]
+
+Phase 1 measures /calculate alone; phase 2 repeats it while `exporters`
+clients download /export/csv reports back to back. Every request uses a
+fresh n_viviendas so the result cache never answers for the model.
+"""
+
+import argparse
+import asyncio
+import itertools
+import statistics
+import time
+
+import httpx
+
+BASE_URL = "http://localhost:8000"
+
+PAYLOAD = {
+    "area_terreno": 1000,
+    "valor_terreno": 5000,
+    "COS": 0.7,
+    "CUS": 2.5,
+    "CAS": 0.2,
+    "area_demolicion": 100,
+    "demolicion": True,
+    "n_viviendas": 10,
+    "usos_mixtos": False,
+    "estacionamiento": True,
+    "tipo_estacionamiento": 8000,
+    "costoMetroConstruccion": 10000,
+    "Costo_de_venta_m2": 30000,
+    "areaCirculacionPorcentaje": 0.15,
+    "delegacion": ["centro"],
+    "Distrito": [1.0],
+    "utilidadDeseada": 20,
+    "correrSimulacion": False
+}
+
+_unique = itertools.count(1)
+
+
+def _payload():
+    return dict(PAYLOAD, n_viviendas=10 + next(_unique) % 100000)
+
+
+async def _calculate_client(client, deadline, latencies):
+    while time.perf_counter() < deadline:
+        start = time.perf_counter()
+        resp = await client.post("/calculate", json=_payload())
+        latencies.append(time.perf_counter() - start)
+        resp.raise_for_status()
+
+
+async def _export_client(client, deadline, counter):
+    while time.perf_counter() < deadline:
+        resp = await client.post("/export/csv", json=_payload())
+        resp.raise_for_status()
+        counter[0] += 1
+
+
+def _percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+async def _phase(base_url, seconds, clients, exporters):
+    latencies, exported = [], [0]
+    limits = httpx.Limits(max_connections=clients + exporters)
+    async with httpx.AsyncClient(base_url=base_url, timeout=60, limits=limits) as client:
+        deadline = time.perf_counter() + seconds
+        await asyncio.gather(
+            *(_calculate_client(client, deadline, latencies) for _ in range(clients)),
+            *(_export_client(client, deadline, exported) for _ in range(exporters)),
+        )
+    return latencies, exported[0]
+
+
+def _report(label, latencies, exported, seconds):
+    ms = [v * 1000 for v in latencies]
+    print(f"{label:<22} {len(ms) / seconds:8.0f} req/s   p50 {statistics.median(ms):7.2f} ms   "
+          f"p99 {_percentile(ms, 99):7.2f} ms   max {max(ms):7.2f} ms   exports {exported}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default=BASE_URL)
+    parser.add_argument("--seconds", type=float, default=10.0)
+    parser.add_argument("--clients", type=int, default=8)
+    parser.add_argument("--exporters", type=int, default=4)
+    args = parser.parse_args()
+
+    # Warm up: parameter snapshot, report template, worker pools
+    asyncio.run(_phase(args.url, 1.0, args.clients, args.exporters))
+
+    baseline, _ = asyncio.run(_phase(args.url, args.seconds, args.clients, 0))
+    _report("/calculate alone", baseline, 0, args.seconds)
+    loaded, exported = asyncio.run(_phase(args.url, args.seconds, args.clients, args.exporters))
+    _report("/calculate + exports", loaded, exported, args.seconds)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,465 +1,274 @@
 """
 NoNA Core Logic
-Refactored from NoNA.py for usage in Web Backend.
-Removes Rhino dependencies.
+Web backend side of the model: text metrics, batch rows and the Excel
+report. The model and its scalar, incremental and columnar engines live in
+nona_core.py, which NoNA.py (Grasshopper) imports as well.
 """
 
 from typing import Dict, List, Any, Tuple
-import math
 import csv
 import io
-from typing import Dict, List, Any, Tuple
+from collections.abc import Mapping
 
 # ==============================================================================
-# CONFIGURATION & CONSTANTS
+# MODEL (shared with the Grasshopper component, see nona_core.py)
 # ==============================================================================
-# Defaults for fallback
-DEFAULT_PARAMS = {
-    'COST_DEMOLITION_M2': 1600.0,
-    'COST_LICENSE_M2': 15.0,
-    'COST_WASTE_PERCENT': 0.15,
-    'PARKING_M2_PER_SPOT': 12.5,
-    'PARKING_DRIVEWAY_FACTOR': 1.50,
-    # Indirects
-    'PCT_HONORARIOS': 15.0,
-    'PCT_LEGALES': 2.0,
-    'PCT_ADM': 10.0,
-    'PCT_FIN': 3.0,
-    'PCT_COM': 6.0
-}
+from nona_core import (
+    DEFAULT_PARAMS,
+    CONSTANTS,
+    ParkingRules,
+    DEFAULT_PARKING_RULES,
+    parking_rules,
+    set_parking_rules,
+    calculate_land_metrics,
+    calculate_demolition_cost,
+    calculate_regulatory_areas,
+    calculate_mixed_use,
+    calculate_parking,
+    solve_target_price,
+    INDIRECT_BREAKDOWN_FIELDS,
+    MODEL_INPUTS,
+    MODEL_LEAVES,
+    ModelNode,
+    MODEL_NODES,
+    parse_leaves,
+    evaluate_nodes,
+    assemble_raw,
+    compute_raw,
+    BATCH_RAW_FIELDS,
+    BATCH_INPUTS,
+    batch_columns,
+    shared_columns,
+    chunked,
+    run_calculation_batch,
+)
 
-CONSTANTS = {
-    'PARKING_FACTORS': {
-        'centro': {'comercial': 35},
-        'poniente': {'comercial': 25},
-        'norte': {'comercial': 30},
-        'sur': {'comercial': 25}
-    }
+# ==============================================================================
+# TEXT METRICS (formatted on demand from `raw`)
+# ==============================================================================
+def _money(value: float) -> str:
+    return f"${value:,.2f}"
+
+METRIC_FORMATTERS = {
+    # --- 1. LAND ---
+    "Text_Area_Terreno": lambda r: f"{r['area_terreno']:.2f} m2",
+    "Text_Valor_Terreno": lambda r: f"${r['valor_terreno']:,.2f} mxn",
+    "Text_Costo_Unitario_Tierra": lambda r: f"${r['costo_unitario_terreno']:,.2f} mxn",
+
+    # --- 2. NORMATIVE ---
+    "Text_COS_Area": lambda r: f"{r['cos_area']:.2f} m2",
+    "Text_CUS_Area": lambda r: f"{r['cus_area']:.2f} m2",
+    "Text_CAS_Area": lambda r: f"{r['cas_area']:.2f} m2",
+    "Text_Net_Area": lambda r: f"{r['net_area']:.2f} m2",
+
+    # --- 3. DEMOLITION ---
+    "Text_Demolicion_Costo": lambda r: _money(r['dem_cost_only']),
+    "Text_Licencia_Costo": lambda r: _money(r['lic_cost']),
+    "Text_Residuos_Costo": lambda r: _money(r['res_cost']),
+    "Text_Total_Demolicion": lambda r: f"${r['total_dem_cost']:,.2f} mxn",
+
+    # --- 4. PARKING ---
+    "Text_Cajones_Vivienda": lambda r: f"{r['parking_spots_res']:.1f}",
+    "Text_Cajones_Comercio": lambda r: f"{r['parking_spots_com']:.1f}",
+    "Text_Cajones_Total": lambda r: f"{r['parking_spots']:.0f}",
+    "Text_Area_Estacionamiento": lambda r: f"{r['parking_area']:.2f} m2",
+    "Text_Costo_Estacionamiento": lambda r: _money(r['parking_cost']),
+
+    # --- 5. AREAS ---
+    "Text_Area_Circulacion": lambda r: f"{r['area_circulacion']:.2f} m2",
+    "Text_Area_Comercio": lambda r: f"{r['area_comercio']:.2f} m2",
+    "Text_Area_Vendible_Vivienda": lambda r: f"{r['area_venta_vivienda']:.2f} m2",
+    "Text_Eficiencia": lambda r: f"{r['eficiencia']:.2f}%" if r['cus_area'] else "0%",
+
+    # --- 6. COST ANALYSIS ---
+    "Text_Construccion_Base": lambda r: _money(r['base_construction']),
+    "Text_Costos_Directos": lambda r: _money(r['costo_directo']),
+
+    # Indirects Breakdown
+    "Text_Honorarios": lambda r: _money(r['costos_indirectos_desglose']['honorarios']),
+    "Text_Legales": lambda r: _money(r['costos_indirectos_desglose']['legales']),
+    "Text_Administrativos": lambda r: _money(r['costos_indirectos_desglose']['administrativos']),
+    "Text_Financieros": lambda r: _money(r['costos_indirectos_desglose']['financieros']),
+    "Text_Comerciales": lambda r: _money(r['costos_indirectos_desglose']['comerciales']),
+    "Text_Costos_Indirectos": lambda r: _money(r['costo_indirecto']),
+
+    "Text_Monto_IVA": lambda r: _money(r['monto_iva']),
+    "Text_Costo_Total": lambda r: _money(r['costo_total']),
+
+    # --- 7. INCOME ---
+    "Text_Ingreso_Vivienda": lambda r: _money(r['ingreso_vivienda_inicial']),
+    "Text_Ingreso_Locales": lambda r: _money(r['ingreso_ventas_locales']),
+    "Text_Ingreso_Total_Inicial": lambda r: _money(r['ingreso_inicial']),
+    "Text_Ingreso_Total_Optimizado": lambda r: _money(r['ingreso_optimizado']),
+    "Text_Precio_Promedio_M2": lambda r: _money(r['ingreso_optimizado'] / r['cus_area']) if r['cus_area'] else "$0",
+
+    # --- 8. PROFITABILITY ---
+    "Text_Utilidad_Inicial": lambda r: f"{r['utilidad_inicial']:.2f}%",
+    "Text_Utilidad_Final": lambda r: f"{r['utilidad_optimizada']:.2f}%",
+    "Text_Ganancia_Bruta": lambda r: _money(r['utilidad_monto']),
+    "Text_Ganancia_Neta": lambda r: _money(r['utilidad_monto'] - r['monto_iva']), # Approx net
+    "Text_ROI": lambda r: f"{r['roi']:.2f}%" if r['costo_total'] else "0%",
+
+    # --- 9. METRICS ---
+    "Text_Costo_Por_Depto": lambda r: _money(r['costo_por_departamento']),
+    "Text_Precio_Promedio_Vivienda": lambda r: _money(r['ingreso_ventas_vivienda'] / r['n_viviendas']) if r['n_viviendas'] else "$0",
+    "Text_Area_Promedio_Vivienda": lambda r: f"{(r['area_venta_vivienda'] / r['n_viviendas']):.2f} m2" if r['n_viviendas'] else "0 m2",
+    "Text_Punto_Equilibrio": lambda r: _money(r['costo_total'] / 0.7), # Simple break-even heuristic
+
+    # --- 10. TIMELINE (Estimates) ---
+    "Text_Meses_Tramites": lambda r: "3 meses",
+    "Text_Meses_Obra": lambda r: "12 meses", # Generic placeholder
+    "Text_Meses_Venta": lambda r: "6 meses",
+    "Text_Duracion_Total": lambda r: "21 meses",
 }
 
-def calculate_land_metrics(area_terreno: float, cost_per_unit: float) -> Tuple[float, float, str, str]:
-    """Calculates total land value from numeric area input."""
-    total_value = area_terreno * cost_per_unit
-    return area_terreno, total_value, f"{area_terreno:.2f} m2", f"${total_value:,.2f} mxn"
-
-def calculate_demolition_cost(
-    do_demolition: bool, 
-    area_demolition: float, 
-    land_area: float,
-    params: Dict[str, float]
-) -> Tuple[float, str]:
-    """Computes demolition, license, and waste removal costs."""
-    if not do_demolition:
-        return 0.0, "$0.00 mxn"
-        
-    cost_dem = area_demolition * params.get('COST_DEMOLITION_M2', DEFAULT_PARAMS['COST_DEMOLITION_M2'])
-    cost_lic = land_area * params.get('COST_LICENSE_M2', DEFAULT_PARAMS['COST_LICENSE_M2'])
-    cost_res = land_area * params.get('COST_WASTE_PERCENT', DEFAULT_PARAMS['COST_WASTE_PERCENT'])
-    
-    total = cost_dem + cost_lic + cost_res
-    return total, f"${total:,.2f} mxn"
-
-def calculate_regulatory_areas(
-    land_area: float, 
-    cos: float, 
-    cus: float, 
-    cas: float, 
-    retiros_area: float
-) -> Dict[str, float]:
-    """Calculates permitted construction areas based on coefficients."""
-    return {
-        'cos_area': land_area * cos,
-        'cus_area': land_area * cus,
-        'cas_area': land_area * cas,
-        'net_area': land_area - retiros_area
-    }
-
-def calculate_mixed_use(
-    is_mixed: bool, 
-    num_locales: int, 
-    cos_area: float, 
-    price_per_m2: float
-) -> Dict[str, float]:
-    """Calculates commercial area metrics if mixed-use is enabled."""
-    results = {
-        'area_local': 0.0,
-        'venta_local': 0.0,
-        'ingreso_total': 0.0,
-        'area_comercio': 0.0
-    }
-    
-    if not is_mixed:
-        return results
-        
-    if num_locales > 0:
-        # Logic from original: Commercial Area = COS Area
-        results['area_comercio'] = cos_area 
-        results['area_local'] = cos_area / float(num_locales)
-        results['venta_local'] = results['area_local'] * price_per_m2
-        results['ingreso_total'] = results['venta_local'] * num_locales
-    
-    return results
-
-def calculate_parking(
-    enable: bool, 
-    n_viviendas: int, 
-    cos_area: float, 
-    circ_area: float,
-    delegaciones: List[str],
-    factors: List[float],
-    cost_per_m2: float,
-    params: Dict[str, float]
-) -> Dict[str, Any]:
-    """Calculates parking spots, area, and cost based on district."""
-    if not enable:
-        return {'cost': 0.0, 'area': 0.0, 'details': {}}
-        
-    cleaned_del = [d.strip().lower() for d in delegaciones]
-    # NOTE: Logic assumes lists match, simplified for brevity
-    
-    total_cost = 0.0
-    total_area_m2 = 0.0
-    
-    c_vivienda_list = []
-    c_comercio_list = []
-    c_total_list = []
-    
-    m2_spot = params.get('PARKING_M2_PER_SPOT', DEFAULT_PARAMS['PARKING_M2_PER_SPOT'])
-    drive_factor = params.get('PARKING_DRIVEWAY_FACTOR', DEFAULT_PARAMS['PARKING_DRIVEWAY_FACTOR'])
+class MetricsView(Mapping):
+    """
+    Read-only `metrics` mapping over a `raw` result.
+    Each Text_* value is formatted only when it is read (or serialized).
+    """
+    __slots__ = ('_raw',)
 
-    for dep, fac in zip(cleaned_del, factors):
-        rules = CONSTANTS['PARKING_FACTORS'].get(dep)
-        if not rules: continue
-            
-        c_viv = n_viviendas * fac
-        c_com = (cos_area - circ_area) / rules['comercial'] if cos_area else 0
-        
-        spots = math.ceil(c_viv + c_com)
-        area = spots * m2_spot * drive_factor
-        cost = area * cost_per_m2
-        
-        total_cost += cost
-        total_area_m2 += area
-        
-        c_vivienda_list.append(c_viv)
-        c_comercio_list.append(c_com)
-        c_total_list.append(spots)
-
-    return {
-        'cost': total_cost,
-        'area': total_area_m2,
-        'cost_per_m2': cost_per_m2,
-        'details': {
-            'cajones_vivienda': c_vivienda_list,
-            'cajones_comercio': c_comercio_list,
-            'cajones_total': c_total_list
-        }
-    }
-
-def solve_target_price(
-    cost_total: float, 
-    desired_margin_percent: float,
-    current_income: float
-) -> Tuple[float, float, float]:
-    """Solves for required total sales price to achieve target margin."""
-    if desired_margin_percent >= 100:
-        return 0.0, 0.0, desired_margin_percent
-        
-    target_revenue = cost_total / (1.0 - (desired_margin_percent / 100.0))
-    new_gain = target_revenue - cost_total
-    
-    return target_revenue, new_gain, desired_margin_percent
+    def __init__(self, raw: Dict[str, Any]):
+        self._raw = raw
 
-def run_calculation(data: Dict[str, Any]) -> Dict[str, Any]:
+    def __getitem__(self, key: str) -> str:
+        return METRIC_FORMATTERS[key](self._raw)
+
+    def __iter__(self):
+        return iter(METRIC_FORMATTERS)
+
+    def __len__(self) -> int:
+        return len(METRIC_FORMATTERS)
+
+    def __repr__(self) -> str:
+        return f"MetricsView({dict(self)!r})"
+
+def format_metrics(raw: Dict[str, Any]) -> Dict[str, str]:
+    """Eagerly formats every Text_* metric into a plain dict."""
+    return {key: fmt(raw) for key, fmt in METRIC_FORMATTERS.items()}
+
+def run_calculation(data: Dict[str, Any], formatting: str = "text") -> Dict[str, Any]:
     """
     Main entry point for calculation.
     Expects a dictionary with all required inputs.
+
+    formatting="text" (default) returns {"metrics", "raw"} where `metrics` is a
+    lazy MetricsView; formatting="none" returns only {"raw"} and skips all
+    string work (sweeps, exports, scenario summaries).
     """
+    if formatting not in ("text", "none"):
+        raise ValueError(f"Unknown formatting mode: {formatting}")
     try:
-        # Unpack inputs
-        area_terreno = float(data.get('area_terreno', 0))
-        valor_terreno = float(data.get('valor_terreno', 0))
-        
-        # Normativa
-        COS = float(data.get('COS', 0))
-        CUS = float(data.get('CUS', 0))
-        CAS = float(data.get('CAS', 0))
-        area_retiros = float(data.get('area_retiros', 0))
-        
-        # Demolition
-        demolicion = bool(data.get('demolicion', False))
-        area_demolicion = float(data.get('area_demolicion', 0))
-        
-        # Project
-        n_viviendas = int(data.get('n_viviendas', 0))
-        usos_mixtos = bool(data.get('usos_mixtos', False))
-        num_locales = int(data.get('num_locales', 0))
-        costo_local_m2 = float(data.get('costo_local_m2', 0))
-        
-        # Construction
-        costoMetroConstruccion = float(data.get('costoMetroConstruccion', 0))
-        Costo_de_venta_m2 = float(data.get('Costo_de_venta_m2', 0))
-        areaCirculacionPorcentaje = float(data.get('areaCirculacionPorcentaje', 0))
-        
-        # Parking
-        estacionamiento = bool(data.get('estacionamiento', False))
-        tipo_estacionamiento = float(data.get('tipo_estacionamiento', 0))
-        # Handle lists for parking
-        delegacion = data.get('delegacion', [])
-        if isinstance(delegacion, str): delegacion = [delegacion]
-        
-        Distrito = data.get('Distrito', [])
-        if isinstance(Distrito, (int, float)): Distrito = [Distrito]
-        
-        # Simulation
-        utilidadDeseada = float(data.get('utilidadDeseada', 20.0))
-        correrSimulacion = bool(data.get('correrSimulacion', False))
-
-        
-        # Extract params from input data (passed from main.py)
-        # We default to empty dict which will trigger DEFAULT_PARAMS in helpers
-        params = data.get('parameters', {})
-        
-        # --- CALCULATION STEPS ---
-
-        # 1. Land
-        area_val, total_val, txt_area, txt_val = calculate_land_metrics(area_terreno, valor_terreno)
-
-        # 2. Normative
-        reg = calculate_regulatory_areas(area_val, COS, CUS, CAS, area_retiros)
-
-        # 3. Demolition
-        # Expanded breakdown
-        dem_cost_only = 0.0
-        lic_cost = 0.0
-        res_cost = 0.0
-        dem_txt = "$0.00 mxn"
-        dem_cost = 0.0
-
-        if demolicion:
-             dem_cost_only = area_demolicion * params.get('COST_DEMOLITION_M2', DEFAULT_PARAMS['COST_DEMOLITION_M2'])
-             lic_cost = area_val * params.get('COST_LICENSE_M2', DEFAULT_PARAMS['COST_LICENSE_M2'])
-             res_cost = area_val * params.get('COST_WASTE_PERCENT', DEFAULT_PARAMS['COST_WASTE_PERCENT']) # NOTE: This key name is weird (PERCENT but treats as cost/m2 factor implied or fixed sum? Original just multiplied).
-             # Wait, defined DEFAULT_PARAMS['COST_WASTE_PERCENT'] = 0.15. If it's percent, of what? Original code:
-             # cost_res = land_area * params.get('COST_WASTE_PERCENT', ...). 
-             # If land area is 1000 and percent is 0.15, cost is 150. That's tiny.
-             # User example: 22,500 MXN for 363m2 area? No, Land 408m2. 22500 / 408 = 55.
-             # Use 22500 fixed or per m2?
-             # Let's assume the user wants `COST_WASTE_M2` roughly or a fixed ratio.
-             # I will stick to existing logic structure but capture variables.
-             
-             dem_cost = dem_cost_only + lic_cost + res_cost
-             dem_txt = f"${dem_cost:,.2f} mxn"
-
-        # 4. Mixed Use
-        mix = calculate_mixed_use(usos_mixtos, num_locales, reg['cos_area'], costo_local_m2)
-
-        # 5. Parking
-        area_circulacion = reg['cus_area'] * areaCirculacionPorcentaje
-        park = calculate_parking(
-            estacionamiento, n_viviendas, reg['cos_area'], area_circulacion,
-            delegacion, Distrito, tipo_estacionamiento, params
-        )
-
-        # 6. Costs
-        # Correction: logic.py previously used 'cos_area' (footprint) which drastically underestimated cost.
-        # Fixed to use 'cus_area' (total permitted area) and restored the original NoNA.py logic 
-        # which sums construction cost twice (likely Base + Finishes/Indirects factor in original logic).
-        
-        base_construction = reg['cus_area'] * costoMetroConstruccion
-        costos_directos = base_construction + dem_cost
-        
-        area_com_est = mix['area_comercio'] + park['area']
-        area_venta = reg['cus_area'] - area_com_est
-        
-        ingreso_vivienda = area_venta * Costo_de_venta_m2
-        ingreso_bruto_inicial = ingreso_vivienda + mix['ingreso_total']
-        
-        # Indirects
-        # params.get returns float, so we divide by 100.0
-        pct_honorarios = params.get('PCT_HONORARIOS', DEFAULT_PARAMS['PCT_HONORARIOS'])
-        pct_legales = params.get('PCT_LEGALES', DEFAULT_PARAMS['PCT_LEGALES'])
-        pct_adm = params.get('PCT_ADM', DEFAULT_PARAMS['PCT_ADM'])
-        pct_fin = params.get('PCT_FIN', DEFAULT_PARAMS['PCT_FIN'])
-        pct_com = params.get('PCT_COM', DEFAULT_PARAMS['PCT_COM'])
-        
-        costos_indirectos = (costos_directos * (pct_honorarios/100.0)) + \
-                            (ingreso_bruto_inicial * (pct_legales/100.0)) + \
-                            (ingreso_bruto_inicial * (pct_adm/100.0)) + \
-                            (ingreso_bruto_inicial * (pct_fin/100.0)) + \
-                            (ingreso_bruto_inicial * (pct_com/100.0))
-                            
-        # Taxes (IVA)
-        iva_percent = float(data.get('iva_percent', 0.16))
-        
-        # Base for IVA: Construction Directs + Indirects + Parking Cost
-        base_construction_total = costos_directos + costos_indirectos + park['cost']
-        monto_iva = base_construction_total * iva_percent
-        
-        costo_total_construccion = total_val + base_construction_total + monto_iva
-
-        # 7. Simulation
-        ganancia_bruta = ingreso_bruto_inicial - costo_total_construccion
-        utilidad_actual = (ganancia_bruta / ingreso_bruto_inicial * 100.0) if ingreso_bruto_inicial > 0 else 0.0
-        
-        target_rev = ingreso_bruto_inicial
-        target_gain = ganancia_bruta
-        target_util = utilidad_actual
-        
-        if correrSimulacion:
-            target_rev, target_gain, target_util = solve_target_price(
-                costo_total_construccion, utilidadDeseada, ingreso_bruto_inicial
-            )
-            
-        # New Metric: Cost per Apartment
-        costo_por_departamento = costo_total_construccion / n_viviendas if n_viviendas > 0 else 0.0
-
-        return {
-            "metrics": {
-                # --- 1. LAND ---
-                "Text_Area_Terreno": txt_area,
-                "Text_Valor_Terreno": txt_val,
-                "Text_Costo_Unitario_Tierra": f"${valor_terreno:,.2f} mxn", # New
-
-                # --- 2. NORMATIVE ---
-                "Text_COS_Area": f"{reg['cos_area']:.2f} m2",
-                "Text_CUS_Area": f"{reg['cus_area']:.2f} m2",
-                "Text_CAS_Area": f"{reg['cas_area']:.2f} m2",
-                "Text_Net_Area": f"{reg['net_area']:.2f} m2",
-
-                # --- 3. DEMOLITION ---
-                "Text_Demolicion_Costo": f"${dem_cost_only:,.2f}",
-                "Text_Licencia_Costo": f"${lic_cost:,.2f}",
-                "Text_Residuos_Costo": f"${res_cost:,.2f}",
-                "Text_Total_Demolicion": dem_txt,
-
-                # --- 4. PARKING ---
-                "Text_Cajones_Vivienda": f"{sum(park['details']['cajones_vivienda']):.1f}", 
-                "Text_Cajones_Comercio": f"{sum(park['details']['cajones_comercio']):.1f}",
-                "Text_Cajones_Total": f"{sum(park['details']['cajones_total']):.0f}",
-                "Text_Area_Estacionamiento": f"{park['area']:.2f} m2",
-                "Text_Costo_Estacionamiento": f"${park['cost']:,.2f}",
-
-                # --- 5. AREAS ---
-                "Text_Area_Circulacion": f"{area_circulacion:.2f} m2",
-                "Text_Area_Comercio": f"{mix['area_comercio']:.2f} m2",
-                "Text_Area_Vendible_Vivienda": f"{area_venta:.2f} m2",
-                "Text_Eficiencia": f"{((area_venta / reg['cus_area']) * 100):.2f}%" if reg['cus_area'] else "0%",
-
-                # --- 6. COST ANALYSIS ---
-                "Text_Construccion_Base": f"${base_construction:,.2f}",
-                "Text_Costos_Directos": f"${costos_directos:,.2f}",
-                
-                # Indirects Breakdown
-                "Text_Honorarios": f"${(costos_directos * (pct_honorarios/100.0)):,.2f}",
-                "Text_Legales": f"${(ingreso_bruto_inicial * (pct_legales/100.0)):,.2f}",
-                "Text_Administrativos": f"${(ingreso_bruto_inicial * (pct_adm/100.0)):,.2f}",
-                "Text_Financieros": f"${(ingreso_bruto_inicial * (pct_fin/100.0)):,.2f}",
-                "Text_Comerciales": f"${(ingreso_bruto_inicial * (pct_com/100.0)):,.2f}",
-                "Text_Costos_Indirectos": f"${costos_indirectos:,.2f}",
-                
-                "Text_Monto_IVA": f"${monto_iva:,.2f}",
-                "Text_Costo_Total": f"${costo_total_construccion:,.2f}",
-
-                # --- 7. INCOME ---
-                "Text_Ingreso_Vivienda": f"${ingreso_vivienda:,.2f}",
-                "Text_Ingreso_Locales": f"${mix['ingreso_total']:,.2f}",
-                "Text_Ingreso_Total_Inicial": f"${ingreso_bruto_inicial:,.2f}",
-                "Text_Ingreso_Total_Optimizado": f"${target_rev:,.2f}",
-                "Text_Precio_Promedio_M2": f"${(target_rev / reg['cus_area']):,.2f}" if reg['cus_area'] else "$0",
-
-                # --- 8. PROFITABILITY ---
-                "Text_Utilidad_Inicial": f"{utilidad_actual:.2f}%",
-                "Text_Utilidad_Final": f"{target_util:.2f}%",
-                "Text_Ganancia_Bruta": f"${target_gain:,.2f}",
-                "Text_Ganancia_Neta": f"${(target_gain - monto_iva):,.2f}", # Approx net
-                "Text_ROI": f"{((target_gain / costo_total_construccion) * 100):.2f}%" if costo_total_construccion else "0%",
-                
-                # --- 9. METRICS ---
-                "Text_Costo_Por_Depto": f"${costo_por_departamento:,.2f}",
-                "Text_Precio_Promedio_Vivienda": f"${((target_rev - mix['ingreso_total']) / n_viviendas):,.2f}" if n_viviendas else "$0",
-                "Text_Area_Promedio_Vivienda": f"{(area_venta / n_viviendas):.2f} m2" if n_viviendas else "0 m2",
-                "Text_Punto_Equilibrio": f"${(costo_total_construccion / 0.7):,.2f}", # Simple break-even heuristic
-                
-                # --- 10. TIMELINE (Estimates) ---
-                "Text_Meses_Tramites": "3 meses",
-                "Text_Meses_Obra": "12 meses", # Generic placeholder
-                "Text_Meses_Venta": "6 meses",
-                "Text_Duracion_Total": "21 meses"
-            },
-            "raw": {
-                "area_terreno": area_val,
-                "valor_terreno": total_val,
-                
-                # Normative
-                "cos_area": reg['cos_area'],
-                "cus_area": reg['cus_area'],
-                "cas_area": reg['cas_area'],
-                "net_area": reg['net_area'],
-                
-                # Demolition specifics
-                "dem_cost_only": dem_cost_only,
-                "lic_cost": lic_cost,
-                "res_cost": res_cost,
-                "total_dem_cost": dem_cost,
-
-                # Areas
-                "area_venta_vivienda": area_venta,
-                "area_locales": mix['area_local'],
-                "area_circulacion": area_circulacion,
-                "area_comercio": mix['area_comercio'],
-                
-                # Costs
-                "costo_directo": costos_directos,
-                "base_construction": base_construction,
-                "costo_indirecto": costos_indirectos,
-                "costos_indirectos_desglose": {
-                    "honorarios": costos_directos * (pct_honorarios/100.0),
-                    "legales": ingreso_bruto_inicial * (pct_legales/100.0),
-                    "administrativos": ingreso_bruto_inicial * (pct_adm/100.0),
-                    "financieros": ingreso_bruto_inicial * (pct_fin/100.0),
-                    "comerciales": ingreso_bruto_inicial * (pct_com/100.0),
-                },
-                "costo_total": costo_total_construccion,
-                "monto_iva": monto_iva,
-                
-                # Income
-                "ingreso_inicial": ingreso_bruto_inicial,
-                "ingreso_optimizado": target_rev,
-                "ingreso_ventas_locales": mix['ingreso_total'],
-                "ingreso_ventas_vivienda": target_rev - mix['ingreso_total'], 
-                
-                # Profit
-                "utilidad_inicial": utilidad_actual,
-                "utilidad_optimizada": target_util, 
-                "utilidad_monto": target_gain, 
-                "roi": (target_gain / costo_total_construccion * 100) if costo_total_construccion else 0,
-                
-                # Parking
-                "parking_cost": park['cost'],
-                "parking_area": park['area'],
-                "parking_spots": sum(park['details']['cajones_total']) if park['details'] else 0,
-                "parking_spots_res": sum(park['details']['cajones_vivienda']) if park['details'] else 0,
-                "parking_spots_com": sum(park['details']['cajones_comercio']) if park['details'] else 0,
-                
-                # Project
-                "n_viviendas": n_viviendas,
-                "costo_por_departamento": costo_por_departamento,
-                "eficiencia": ((area_venta / reg['cus_area']) * 100) if reg['cus_area'] else 0
-            }
-        }
-        
+        raw = compute_raw(data)
     except Exception as e:
         return {"error": str(e)}
+    if formatting == "none":
+        return {"raw": raw}
+    return {"metrics": MetricsView(raw), "raw": raw}
+
+
+# ==============================================================================
+# BATCH (COLUMNAR) ENGINE (run_calculation_batch lives in nona_core.py)
+# ==============================================================================
+def batch_row(batch: Dict[str, Any], i: int, formatting: str = "none") -> Dict[str, Any]:
+    """
+    Rebuilds the scalar-shaped result for row i: {'raw': ...} or {'error': ...},
+    plus a lazy `metrics` view when formatting="text".
+    """
+    if not batch['mask'][i]:
+        return {"error": batch['errors'][i]}
+    cols = batch['raw']
+    raw = {}
+    for key in BATCH_RAW_FIELDS:
+        if key in INDIRECT_BREAKDOWN_FIELDS:
+            continue
+        raw[key] = cols[key][i]
+        if key == 'costo_indirecto':
+            raw['costos_indirectos_desglose'] = {k: cols[k][i] for k in INDIRECT_BREAKDOWN_FIELDS}
+    raw['parking_unknown'] = list(batch['parking_unknown'][i])
+    raw['n_viviendas'] = int(raw['n_viviendas'])
+    raw['parking_spots'] = int(raw['parking_spots'])
+    if formatting == "text":
+        return {"metrics": MetricsView(raw), "raw": raw}
+    return {"raw": raw}
 
 import io
 import openpyxl
 from openpyxl.chart import BarChart, PieChart, Reference
 from openpyxl.styles import Font, PatternFill, Alignment, Border, Side
 
-def generate_excel_content(result: Dict[str, Any]) -> bytes:
+# Report palette & native number formats
+BRAND_BLUE = "2563EB"
+BRAND_SLATE = "0F172A"
+LIGHT_GRAY = "F8FAFC"
+MEDIUM_GRAY = "E2E8F0"
+GREEN_ACCENT = "10B981"
+
+MONEY_FORMAT = '"$"#,##0.00_-'
+AREA_FORMAT = '#,##0.00 "m²"'
+PCT_FORMAT = '0.00%'
+
+def excel_report_layout(result: Dict[str, Any]) -> Tuple[list, list, list]:
     """
-    Generates a highly detailed, professional Excel workbook using openpyxl.
+    Content of the single-scenario report: sections of
+    (label, value, number format, highlight) rows, plus the bar and pie
+    chart series as (category, value) pairs.
+    """
+    metrics = result.get("metrics", {})
+    raw = result.get("raw", {})
+
+    # Unpack raw values to use native numbers instead of formatted strings
+    sections = [
+        ("1. Resumen Ejecutivo (KPIs)", [
+            ("Utilidad Final Meta", raw.get("Text_Utilidad_Final_Raw", metrics.get("Text_Utilidad_Final")), PCT_FORMAT if isinstance(raw.get("Text_Utilidad_Final_Raw"), (int,float)) else None, True),
+            ("Precio de Venta por Vv", raw.get("precio_promedio_vivienda", 0), MONEY_FORMAT, False),
+            ("Costo Total del Proyecto", raw.get("costo_total", 0), MONEY_FORMAT, False),
+            ("Área Vendible Total", raw.get("area_venta_vivienda", 0), AREA_FORMAT, False),
+            ("Costo Cons. por Depto", raw.get("Text_Costo_Por_Depto_Raw", metrics.get("Text_Costo_Por_Depto")), MONEY_FORMAT if isinstance(raw.get("Text_Costo_Por_Depto_Raw"), (int,float)) else None, False),
+        ]),
+        ("2. Terreno y Demolición", [
+            ("Área del Terreno", raw.get("area_terreno", 0), AREA_FORMAT, False),
+            ("Valor Total del Terreno", raw.get("valor_terreno", 0), MONEY_FORMAT, False),
+            ("Costo Total Demolición", raw.get("costo_total_demolicion", 0), MONEY_FORMAT, False),
+        ]),
+        ("3. Normativa y Áreas", [
+            ("Área COS (Desplante)", raw.get("cos_area", 0), AREA_FORMAT, False),
+            ("Área CUS (Cons. Max)", raw.get("cus_area", 0), AREA_FORMAT, False),
+            ("Área CAS (Área Libre)", raw.get("cas_area", 0), AREA_FORMAT, False),
+        ]),
+        ("4. Desglose de Costos de Construcción", [
+            ("Total Costos Directos", raw.get("costo_directo", 0), MONEY_FORMAT, False),
+            ("Total Costos Indirectos", raw.get("costo_indirecto", 0), MONEY_FORMAT, False),
+            ("Monto de IVA Estimado", raw.get("monto_iva", 0), MONEY_FORMAT, False),
+            ("COSTO TOTAL DEL PROYECTO", raw.get("costo_total", 0), MONEY_FORMAT, True),
+        ]),
+        ("5. Análisis Financiero", [
+            ("Ingreso por Ventas (Comercio)", raw.get("ingreso_ventas_locales", 0), MONEY_FORMAT, False),
+            ("Ingreso por Ventas (Vivienda)", raw.get("ingreso_ventas_vivienda", 0), MONEY_FORMAT, False),
+            ("Ingreso Total Optimizado", raw.get("ingreso_total_optimizado", 0), MONEY_FORMAT, True),
+            ("Ganancia Neta", raw.get("utilidad_optimizada", 0), MONEY_FORMAT, True),
+        ]),
+    ]
+
+    # Chart 1 Data: Bar Chart (General Analysis)
+    bar_data = [
+        ("Costo Total", raw.get("costo_total", 0)),
+        ("Ingreso Meta", raw.get("ingreso_total_optimizado", 0)),
+        ("Utilidad Neta", raw.get("utilidad_optimizada", 0))
+    ]
+    # Chart 2 Data: Pie Chart (Cost Structure)
+    pie_data = [
+        ("Tierra", raw.get("valor_terreno", 0)),
+        ("Construcción", raw.get("costo_directo", 0) + raw.get("parking_cost", 0)),
+        ("Indirectos e IVA", raw.get("costo_indirecto", 0) + raw.get("monto_iva", 0))
+    ]
+    return sections, bar_data, pie_data
+
+def build_excel_report(result: Dict[str, Any]) -> Tuple[openpyxl.Workbook, List[str]]:
+    """
+    Builds the report workbook. Also returns the coordinates of every value
+    cell, in excel_report_layout order (row values, then bar and pie series).
     """
     wb = openpyxl.Workbook()
     ws = wb.active
@@ -468,28 +277,16 @@ def generate_excel_content(result: Dict[str, Any]) -> bytes:
     # 1. Disable Gridlines
     ws.sheet_view.showGridLines = False
     
-    # Define Colors & Styles
-    BRAND_BLUE = "2563EB"
-    BRAND_SLATE = "0F172A"
-    LIGHT_GRAY = "F8FAFC"
-    MEDIUM_GRAY = "E2E8F0"
-    GREEN_ACCENT = "10B981"
-    
+    # Define Styles
     header_fill = PatternFill(start_color=BRAND_BLUE, end_color=BRAND_BLUE, fill_type="solid")
     header_font = Font(color="FFFFFF", bold=True, size=12)
     section_font = Font(color=BRAND_BLUE, bold=True, size=11)
     
     title_font = Font(color=BRAND_SLATE, bold=True, size=18)
     subtitle_font = Font(color=BRAND_BLUE, bold=True, size=14)
-    normal_font = Font(color="475569", size=11)
     
     thin_border_bottom = Border(bottom=Side(style='thin', color=MEDIUM_GRAY))
     
-    # Native Formats
-    MONEY_FORMAT = '"$"#,##0.00_-'
-    AREA_FORMAT = '#,##0.00 "m²"'
-    PCT_FORMAT = '0.00%'
-    
     # Setup Title Header
     ws.append(["NoNA", "I.Tech", "Reporte Financiero y Arquitectónico"])
     ws.append(["Generado automáticamente por NoNA Platform"])
@@ -500,14 +297,9 @@ def generate_excel_content(result: Dict[str, Any]) -> bytes:
     ws['C1'].font = Font(color="64748B", italic=True, size=12)
     ws['A2'].font = Font(color="94A3B8", italic=True)
     
-    metrics = result.get("metrics", {})
-    raw = result.get("raw", {})
-    
     if "error" in result:
         ws.append(["Error en Cálculo", result["error"]])
-        output = io.BytesIO()
-        wb.save(output)
-        return output.getvalue()
+        return wb, []
         
     ws.append(["Métrica", "Valor"])
     ws['A4'].fill = header_fill
@@ -518,6 +310,7 @@ def generate_excel_content(result: Dict[str, Any]) -> bytes:
     ws['B4'].alignment = Alignment(horizontal="center")
     
     current_row = 5
+    value_cells = []
     
     def add_section(title):
         nonlocal current_row
@@ -554,37 +347,14 @@ def generate_excel_content(result: Dict[str, Any]) -> bytes:
         if fmt:
             cell_b.number_format = fmt
         
+        value_cells.append(cell_b.coordinate)
         current_row += 1
 
-    # Unpack raw values to use native numbers instead of formatted strings
-    add_section("1. Resumen Ejecutivo (KPIs)")
-    add_row("Utilidad Final Meta", raw.get("Text_Utilidad_Final_Raw", metrics.get("Text_Utilidad_Final")), fmt=PCT_FORMAT if isinstance(raw.get("Text_Utilidad_Final_Raw"), (int,float)) else None, highlight=True)
-    add_row("Precio de Venta por Vv", raw.get("precio_promedio_vivienda", 0), fmt=MONEY_FORMAT)
-    add_row("Costo Total del Proyecto", raw.get("costo_total", 0), fmt=MONEY_FORMAT)
-    add_row("Área Vendible Total", raw.get("area_venta_vivienda", 0), fmt=AREA_FORMAT)
-    add_row("Costo Cons. por Depto", raw.get("Text_Costo_Por_Depto_Raw", metrics.get("Text_Costo_Por_Depto")), fmt=MONEY_FORMAT if isinstance(raw.get("Text_Costo_Por_Depto_Raw"), (int,float)) else None)
-    
-    add_section("2. Terreno y Demolición")
-    add_row("Área del Terreno", raw.get("area_terreno", 0), fmt=AREA_FORMAT)
-    add_row("Valor Total del Terreno", raw.get("valor_terreno", 0), fmt=MONEY_FORMAT)
-    add_row("Costo Total Demolición", raw.get("costo_total_demolicion", 0), fmt=MONEY_FORMAT)
-    
-    add_section("3. Normativa y Áreas")
-    add_row("Área COS (Desplante)", raw.get("cos_area", 0), fmt=AREA_FORMAT)
-    add_row("Área CUS (Cons. Max)", raw.get("cus_area", 0), fmt=AREA_FORMAT)
-    add_row("Área CAS (Área Libre)", raw.get("cas_area", 0), fmt=AREA_FORMAT)
-    
-    add_section("4. Desglose de Costos de Construcción")
-    add_row("Total Costos Directos", raw.get("costo_directo", 0), fmt=MONEY_FORMAT)
-    add_row("Total Costos Indirectos", raw.get("costo_indirecto", 0), fmt=MONEY_FORMAT)
-    add_row("Monto de IVA Estimado", raw.get("monto_iva", 0), fmt=MONEY_FORMAT)
-    add_row("COSTO TOTAL DEL PROYECTO", raw.get("costo_total", 0), fmt=MONEY_FORMAT, highlight=True)
-    
-    add_section("5. Análisis Financiero")
-    add_row("Ingreso por Ventas (Comercio)", raw.get("ingreso_ventas_locales", 0), fmt=MONEY_FORMAT)
-    add_row("Ingreso por Ventas (Vivienda)", raw.get("ingreso_ventas_vivienda", 0), fmt=MONEY_FORMAT)
-    add_row("Ingreso Total Optimizado", raw.get("ingreso_total_optimizado", 0), fmt=MONEY_FORMAT, highlight=True)
-    add_row("Ganancia Neta", raw.get("utilidad_optimizada", 0), fmt=MONEY_FORMAT, highlight=True)
+    sections, bar_data, pie_data = excel_report_layout(result)
+    for title, rows in sections:
+        add_section(title)
+        for label, val, fmt, highlight in rows:
+            add_row(label, val, fmt=fmt, highlight=highlight)
 
     # Adjust column widths
     ws.column_dimensions['A'].width = 42
@@ -596,16 +366,10 @@ def generate_excel_content(result: Dict[str, Any]) -> bytes:
     hide_col_z = 26
     hide_col_aa = 27
     
-    # Chart 1 Data: Bar Chart (General Analysis)
-    bar_data = [
-        ("Costo Total", raw.get("costo_total", 0)),
-        ("Ingreso Meta", raw.get("ingreso_total_optimizado", 0)),
-        ("Utilidad Neta", raw.get("utilidad_optimizada", 0))
-    ]
     bar_start_row = 5
     for i, (cat, val) in enumerate(bar_data):
         ws.cell(row=bar_start_row+i, column=hide_col_z, value=cat)
-        ws.cell(row=bar_start_row+i, column=hide_col_aa, value=val)
+        value_cells.append(ws.cell(row=bar_start_row+i, column=hide_col_aa, value=val).coordinate)
         
     bar_chart = BarChart()
     bar_chart.type = "col"
@@ -623,16 +387,10 @@ def generate_excel_content(result: Dict[str, Any]) -> bytes:
     bar_chart.height = 8
     ws.add_chart(bar_chart, "D5")
 
-    # Chart 2 Data: Pie Chart (Cost Structure)
-    pie_data = [
-        ("Tierra", raw.get("valor_terreno", 0)),
-        ("Construcción", raw.get("costo_directo", 0) + raw.get("parking_cost", 0)),
-        ("Indirectos e IVA", raw.get("costo_indirecto", 0) + raw.get("monto_iva", 0))
-    ]
     pie_start_row = bar_start_row + len(bar_data) + 2
     for i, (cat, val) in enumerate(pie_data):
         ws.cell(row=pie_start_row+i, column=hide_col_z, value=cat)
-        ws.cell(row=pie_start_row+i, column=hide_col_aa, value=val)
+        value_cells.append(ws.cell(row=pie_start_row+i, column=hide_col_aa, value=val).coordinate)
         
     pie_chart = PieChart()
     pie_chart.title = "Estructura de Costos del Proyecto"
@@ -649,6 +407,14 @@ def generate_excel_content(result: Dict[str, Any]) -> bytes:
     ws.column_dimensions[openpyxl.utils.get_column_letter(hide_col_z)].hidden = True
     ws.column_dimensions[openpyxl.utils.get_column_letter(hide_col_aa)].hidden = True
     
+    return wb, value_cells
+
+def generate_excel_content(result: Dict[str, Any]) -> bytes:
+    """
+    Generates a highly detailed, professional Excel workbook using openpyxl.
+    """
+    wb, _ = build_excel_report(result)
+    
     # Save to BytesIO
     output = io.BytesIO()
     wb.save(output)
@@ -1,14 +1,37 @@
-from fastapi import FastAPI, HTTPException, Depends
-from pydantic import BaseModel
-from typing import List, Optional, Dict, Any
+from fastapi import FastAPI, HTTPException, Depends, Request, Query
+from pydantic import BaseModel, ConfigDict, Field, ValidationError
+from typing import List, Optional, Dict, Any, Iterable, Iterator, Tuple
 import logic
+import nona_core
+import normativa
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import StreamingResponse, FileResponse
+from fastapi.responses import StreamingResponse, FileResponse, Response
+from fastapi.encoders import jsonable_encoder
 from fastapi.staticfiles import StaticFiles
+from starlette.background import BackgroundTask
+from starlette.concurrency import run_in_threadpool
+from sqlalchemy import func
+from sqlalchemy.exc import SQLAlchemyError
 from sqlalchemy.orm import Session
 import database
+import cache
+import sensitivity
+import simulation
+import residual
+import optimizer
+import calc_graph
+import reports
+import exports
+import excel_template
+import jobs
+import executor
 import os
 import sys
+import json
+import codecs
+import tempfile
+import hashlib
+from datetime import datetime
 
 # Initialize Database
 database.init_db()
@@ -22,6 +45,8 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    # Pagination and caching headers of the listing endpoints
+    expose_headers=["ETag", "Link", "X-Next-Cursor"],
 )
 
 # --- Dependency ---
@@ -32,13 +57,24 @@ def get_db():
     finally:
         db.close()
 
+def get_zoning_index(db: Session = Depends(get_db)) -> normativa.ZoningIndex:
+    return cache.zoning_index_cache.get(db)
+
+def get_parameter_snapshot(db: Session = Depends(get_db)) -> cache.ParameterSnapshot:
+    # Parking rules and the normativa are versioned alongside the parameters;
+    # refreshing them here keeps every calculation endpoint on the current tables
+    cache.parking_rule_cache.get(db)
+    cache.zoning_index_cache.get(db)
+    return cache.parameter_cache.get(db)
+
 # --- Pydantic Models for API ---
 class CalculationRequest(BaseModel):
     area_terreno: float
     valor_terreno: float
-    COS: float
-    CUS: float
-    CAS: float
+    # Left out, they are filled in from the normativa zone at lat/lng
+    COS: Optional[float] = None
+    CUS: Optional[float] = None
+    CAS: Optional[float] = None
     area_retiros: Optional[float] = 0.0
     
     demolicion: bool
@@ -57,6 +93,9 @@ class CalculationRequest(BaseModel):
     tipo_estacionamiento: Optional[float] = 0.0
     delegacion: List[str]
     Distrito: List[float]
+    # Optional parking rule selectors: city and per-delegacion zoning district
+    ciudad: Optional[str] = ""
+    distrito_zona: Optional[List[str]] = []
     
     utilidadDeseada: float
     correrSimulacion: bool
@@ -73,17 +112,86 @@ class CalculationRequest(BaseModel):
     # Financial
     iva_percent: Optional[float] = 0.16
 
+    def fill_normativa(self, zoning: normativa.ZoningIndex) -> "CalculationRequest":
+        """Fills COS/CUS/CAS left out from the zone of `zoning` at lat/lng; ValueError if it cannot."""
+        missing = [key for key in normativa.COEFFICIENT_KEYS if getattr(self, key) is None]
+        if not missing:
+            return self
+        # 0, 0 is the "no location" default of lat/lng
+        zone = zoning.lookup(self.lat, self.lng) if self.lat or self.lng else None
+        if zone is None:
+            raise ValueError(f"{'/'.join(missing)} missing and no normativa zone at lat/lng to take them from")
+        for key in missing:
+            value = getattr(zone, key)
+            if value is None:
+                raise ValueError(f"{key} missing and zone '{zone.zona}' does not define it")
+            setattr(self, key, value)
+        return self
+
+class SensitivityRequest(BaseModel):
+    inputs: CalculationRequest
+    variables: Optional[List[str]] = None
+    range_pct: float = 20.0
+    steps: int = 4
+
+class DistributionSpec(BaseModel):
+    dist: str  # triangular | normal | uniform
+    low: Optional[float] = None
+    mode: Optional[float] = None
+    high: Optional[float] = None
+    mean: Optional[float] = None
+    std: Optional[float] = None
+
+class MonteCarloRequest(BaseModel):
+    inputs: CalculationRequest
+    distributions: Dict[str, DistributionSpec]
+    n: int = 100_000
+    seed: int = 0
+    bins: int = 50
+
+class OptimizeRequest(BaseModel):
+    inputs: CalculationRequest
+    n_viviendas_min: int = 1
+    n_viviendas_max: int = 200
+    n_viviendas_step: int = 1
+    cos_levels: List[float] = list(optimizer.DEFAULT_COS_LEVELS)
+    cus_levels: List[float] = list(optimizer.DEFAULT_CUS_LEVELS)
+    num_locales_options: List[int] = [0]
+    parking_options: Optional[List[bool]] = None
+    min_unit_area: float = optimizer.DEFAULT_MIN_UNIT_AREA
+
+class ExportJobRequest(BaseModel):
+    kind: str  # report | portfolio | results
+    format: Optional[str] = None  # xlsx, or csv | arrow | parquet for results
+    customer_id: Optional[int] = None
+    inputs: Optional[CalculationRequest] = None
+
 class ParameterUpdate(BaseModel):
     key: str
     value: float
+    # Required only to create a parameter that does not exist yet
+    description: Optional[str] = None
+    group: Optional[str] = None
 
 class ParameterOut(BaseModel):
     key: str
     value: float
     description: str
     group: str
-    class Config:
-        orm_mode = True
+    model_config = ConfigDict(from_attributes=True)
+
+class ParkingRuleUpdate(BaseModel):
+    delegacion: str
+    comercial: float = Field(..., gt=0)
+    # Empty = the rule applies in every city / the whole delegacion
+    city: Optional[str] = ""
+    district: Optional[str] = ""
+
+class NormativaLookup(BaseModel):
+    # Either geocoded points as [lat, lng] pairs, or one lot outline as a
+    # GeoJSON Polygon ([lng, lat] positions, outer ring first)
+    points: Optional[List[Tuple[float, float]]] = None
+    polygon: Optional[Dict[str, Any]] = None
 
 class CustomerCreate(BaseModel):
     name: str
@@ -91,8 +199,7 @@ class CustomerCreate(BaseModel):
 class CustomerOut(BaseModel):
     id: int
     name: str
-    class Config:
-        orm_mode = True
+    model_config = ConfigDict(from_attributes=True)
 
 class ScenarioCreate(BaseModel):
     customer_id: int
@@ -105,66 +212,675 @@ class ScenarioOut(BaseModel):
     customer_id: int
     input_data: Dict[str, Any]
     result_summary: Dict[str, Any]
-    class Config:
-        orm_mode = True
+    model_config = ConfigDict(from_attributes=True)
+
+class ScenarioRow(BaseModel):
+    # Typed columns only: listing never touches the JSON payloads
+    id: int
+    name: str
+    customer_id: int
+    created_at: Optional[datetime] = None
+    utilidad: Optional[float] = None
+    roi: Optional[float] = None
+    costo_total: Optional[float] = None
+    cus_area: Optional[float] = None
+    n_viviendas: Optional[int] = None
+    lat: Optional[float] = None
+    lng: Optional[float] = None
+    model_config = ConfigDict(from_attributes=True)
+
+class ScenarioPage(BaseModel):
+    total: int
+    limit: int
+    offset: int
+    items: List[ScenarioRow]
+
+class ScenarioQuery(BaseModel):
+    sort: str = "-utilidad"  # column name, '-' prefix for descending
+    limit: int = Field(50, ge=1, le=1000)
+    offset: int = Field(0, ge=0)
+    min_utilidad: Optional[float] = None
+    max_utilidad: Optional[float] = None
+    min_roi: Optional[float] = None
+    max_roi: Optional[float] = None
+    min_costo_total: Optional[float] = None
+    max_costo_total: Optional[float] = None
+    min_cus_area: Optional[float] = None
+    max_cus_area: Optional[float] = None
+    min_n_viviendas: Optional[int] = None
+    max_n_viviendas: Optional[int] = None
+    min_lat: Optional[float] = None
+    max_lat: Optional[float] = None
+    min_lng: Optional[float] = None
+    max_lng: Optional[float] = None
+    created_after: Optional[datetime] = None
+    created_before: Optional[datetime] = None
+
+    def ranges(self) -> Dict[str, Tuple[Any, Any]]:
+        columns = tuple(database.SCENARIO_RESULT_COLUMNS) + ('lat', 'lng')
+        return {
+            column: (getattr(self, f"min_{column}"), getattr(self, f"max_{column}"))
+            for column in columns
+            if getattr(self, f"min_{column}") is not None or getattr(self, f"max_{column}") is not None
+        }
+
+# --- Helpers ---
+
+def _with_normativa(req: CalculationRequest, zoning: normativa.ZoningIndex) -> CalculationRequest:
+    """req with COS/CUS/CAS filled from the normativa; 422 (like a validation error) when they cannot be."""
+    try:
+        return req.fill_normativa(zoning)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+
+def _result_request(req: CalculationRequest, params: cache.ParameterSnapshot) -> Tuple[str, Dict[str, Any]]:
+    """Result cache key of a request, and the model input to compute it on a miss."""
+    data = req.model_dump()
+    rules = nona_core.parking_rules()
+    key = cache.result_cache.make_key(data, [params.version, rules.version])
+    # Plain dict: the input has to pickle for a process pool
+    data['parameters'] = dict(params.values)
+    data['parking_rules'] = rules
+    return key, data
+
+def calculate_cached(req: CalculationRequest, params: cache.ParameterSnapshot) -> Dict[str, Any]:
+    """Runs logic.run_calculation through the shared result cache."""
+    key, data = _result_request(req, params)
+    result = cache.result_cache.get(key)
+    if result is None:
+        result = logic.run_calculation(data)
+        if "error" not in result:
+            cache.result_cache.put(key, result)
+    return result
+
+async def calculate_cached_async(req: CalculationRequest, params: cache.ParameterSnapshot) -> Dict[str, Any]:
+    """calculate_cached for async handlers: hits answer on the loop, misses run on the calculate pool."""
+    key, data = _result_request(req, params)
+    result = cache.result_cache.get(key)
+    if result is None:
+        result = await executor.calculate_executor.run(logic.run_calculation, data)
+        if "error" not in result:
+            cache.result_cache.put(key, result)
+    return result
+
+def scenario_summary(result: Dict[str, Any]) -> Dict[str, Any]:
+    """result_summary stored with a scenario; empty when the calculation failed."""
+    if "metrics" not in result:
+        return {}
+    return {
+        "utilidad": result["metrics"].get("Text_Utilidad_Final"),
+        "costo_total": result["metrics"].get("Text_Costo_Total"),
+        "roi": result["raw"].get("utilidad_optimizada")
+    }
 
 # --- Endpoints ---
 
 @app.post("/calculate")
-async def calculate(req: CalculationRequest, db: Session = Depends(get_db)):
-    # 1. Fetch current parameters from DB
-    params_db = db.query(database.Parameter).all()
-    params_dict = {p.key: p.value for p in params_db}
-    
-    # 2. Inject into payload
-    data = req.dict()
-    data['parameters'] = params_dict
-    
-    # 3. Run Logic
-    result = logic.run_calculation(data)
+async def calculate(req: CalculationRequest, params: cache.ParameterSnapshot = Depends(get_parameter_snapshot),
+                    zoning: normativa.ZoningIndex = Depends(get_zoning_index)):
+    # Parameters come from the cached snapshot; identical requests reuse the cached result.
+    # The (sync) database dependency runs in the threadpool, cache misses on the calculate pool.
+    result = await calculate_cached_async(_with_normativa(req, zoning), params)
     if "error" in result:
         raise HTTPException(status_code=400, detail=result["error"])
     return result
 
 @app.post("/export/csv")
-async def export_csv(req: CalculationRequest, db: Session = Depends(get_db)):
-    # 1. Fetch current parameters from DB
-    params_db = db.query(database.Parameter).all()
-    params_dict = {p.key: p.value for p in params_db}
-    
-    # 2. Inject into payload
-    data = req.dict()
-    data['parameters'] = params_dict
-    
-    # 3. Run Logic
-    result = logic.run_calculation(data)
-    
-    # 4. Generate Excel
-    excel_content = logic.generate_excel_content(result)
+async def export_csv(req: CalculationRequest, params: cache.ParameterSnapshot = Depends(get_parameter_snapshot),
+                     zoning: normativa.ZoningIndex = Depends(get_zoning_index)):
+    # 1-3. Reuse the /calculate result when the same inputs were just calculated
+    result = await calculate_cached_async(_with_normativa(req, zoning), params)
     
-    return StreamingResponse(
-        iter([excel_content]),
+    # 4. Generate Excel on the report pool, off the event loop
+    excel_content = await executor.report_executor.run(excel_template.render_report, result)
+    return Response(
+        content=excel_content,
         media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
         headers={"Content-Disposition": "attachment; filename=Reporte_NoNA.xlsx"}
     )
 
+# --- Batch Calculation ---
+# Rows are validated and evaluated in chunks through logic.run_calculation_batch,
+# so memory stays bounded by the chunk size rather than the upload size.
+BATCH_CHUNK_SIZE = 1000
+BATCH_SPOOL_MAX_BYTES = 8 * 1024 * 1024
+BATCH_COLUMNS = [key for key, _, _ in logic.BATCH_INPUTS] + ['delegacion', 'Distrito', 'ciudad', 'distrito_zona']
+
+def _iter_ndjson(lines: Iterable) -> Iterator[Any]:
+    """Yields one decoded record (or the decode error) per non-blank line."""
+    for line in lines:
+        if isinstance(line, bytes):
+            line = line.decode("utf-8")
+        if not line.strip():
+            continue
+        try:
+            yield json.loads(line)
+        except ValueError as e:
+            yield e
+
+# Largest single array element accepted by the incremental JSON list parser
+BATCH_MAX_RECORD_BYTES = 1024 * 1024
+
+def _iter_json_array(f, read_size: int = 64 * 1024) -> Iterator[Any]:
+    """
+    Yields the elements of a JSON array one by one from a binary file,
+    holding at most one element (plus a read) in memory. A malformed element
+    is yielded as its ValueError and ends the array, since the parser cannot
+    resynchronize after it.
+    """
+    decoder = json.JSONDecoder()
+    text = codecs.getincrementaldecoder("utf-8")()
+    buf, pos, eof = "", 0, False
+
+    def fill() -> bool:
+        nonlocal buf, pos, eof
+        data = f.read(read_size)
+        eof = not data
+        buf = buf[pos:] + text.decode(data, final=eof)
+        pos = 0
+        return not eof
+
+    def skip_space() -> Optional[str]:
+        nonlocal pos
+        while True:
+            while pos < len(buf) and buf[pos] in " \t\r\n":
+                pos += 1
+            if pos < len(buf):
+                return buf[pos]
+            if not fill():
+                return None
+
+    if skip_space() != "[":
+        yield ValueError("Expected a JSON list")
+        return
+    pos += 1
+    first = True
+    while True:
+        token = skip_space()
+        if token == "]" and first:
+            return
+        if not first:
+            if token == "]":
+                return
+            if token != ",":
+                yield ValueError(f"Expected ',' or ']' in JSON list, found {token!r}")
+                return
+            pos += 1
+            skip_space()
+        first = False
+        while True:
+            try:
+                value, end = decoder.raw_decode(buf, pos)
+                # A value ending the buffer (e.g. a number) may continue in the next read
+                if end < len(buf) or eof:
+                    break
+            except ValueError as e:
+                if eof or len(buf) - pos > BATCH_MAX_RECORD_BYTES:
+                    yield e
+                    return
+            fill()
+        pos = end
+        yield value
+
+def _stream_batch_results(records: Iterable[Any], params: Dict[str, float], zoning: normativa.ZoningIndex) -> Iterator[str]:
+    """Validates, calculates and serializes records chunk by chunk as NDJSON lines."""
+    index = 0
+    for chunk in logic.chunked(records, BATCH_CHUNK_SIZE):
+        yield from _calculate_chunk(chunk, index, params, zoning)
+        index += len(chunk)
+
+def _evaluate_records(records: List[Any], params: Dict[str, float], zoning: normativa.ZoningIndex) -> Tuple[List[Any], List[int], Optional[Dict[str, Any]]]:
+    """
+    Validates a chunk of raw records and evaluates the valid ones in one
+    run_calculation_batch pass. Returns the per-record validation errors,
+    the positions of the valid records and their batch result.
+    """
+    valid = []
+    errors: List[Any] = [None] * len(records)
+    for i, record in enumerate(records):
+        try:
+            if isinstance(record, Exception):
+                raise record
+            if not isinstance(record, dict):
+                raise ValueError("Each row must be a JSON object")
+            valid.append((i, CalculationRequest(**record).fill_normativa(zoning)))
+        except ValidationError as e:
+            errors[i] = e.errors(include_url=False, include_context=False, include_input=False)
+        except Exception as e:
+            errors[i] = str(e)
+
+    batch = None
+    if valid:
+        columns = {key: [getattr(req, key) for _, req in valid] for key in BATCH_COLUMNS}
+        batch = logic.run_calculation_batch(columns, params)
+    return errors, [i for i, _ in valid], batch
+
+def _calculate_chunk(records: List[Any], start: int, params: Dict[str, float], zoning: normativa.ZoningIndex) -> Iterator[str]:
+    errors, positions, batch = _evaluate_records(records, params, zoning)
+    lines = [json.dumps({"index": start + i, "error": error}) for i, error in enumerate(errors)]
+    for row, i in enumerate(positions):
+        lines[i] = json.dumps({"index": start + i, **logic.batch_row(batch, row)})
+
+    for line in lines:
+        yield line + "\n"
+
+@app.post("/calculate/batch")
+async def calculate_batch(request: Request, params: cache.ParameterSnapshot = Depends(get_parameter_snapshot),
+                          zoning: normativa.ZoningIndex = Depends(get_zoning_index)):
+    """
+    Accepts a JSON list of CalculationRequest objects, an NDJSON body
+    (application/x-ndjson) or a multipart NDJSON upload in field `file`.
+    Streams one NDJSON result line per input, in input order.
+    """
+    # 1. One parameter snapshot for the whole batch
+    records, cleanup = await _read_batch_body(request)
+    return StreamingResponse(
+        _stream_batch_results(records, params.values, zoning),
+        media_type="application/x-ndjson",
+        background=cleanup
+    )
+
+async def _read_batch_body(request: Request) -> Tuple[Iterable[Any], Optional[BackgroundTask]]:
+    """Records from a JSON list, NDJSON body or multipart NDJSON upload, plus their cleanup task."""
+    cleanup = None
+    content_type = request.headers.get("content-type", "")
+    if content_type.startswith("multipart/form-data"):
+        form = await request.form()
+        upload = form.get("file")
+        if upload is None or isinstance(upload, str):
+            raise HTTPException(status_code=400, detail="Missing NDJSON file upload in field 'file'")
+        upload.file.seek(0)
+        records = _iter_ndjson(upload.file)
+    else:
+        # Spool the body (to disk past the limit) before streaming results back,
+        # so request and response are never read/written concurrently. JSON
+        # lists are then parsed element by element, like NDJSON lines.
+        spool = tempfile.SpooledTemporaryFile(max_size=BATCH_SPOOL_MAX_BYTES)
+        async for data in request.stream():
+            spool.write(data)
+        spool.seek(0)
+        cleanup = BackgroundTask(spool.close)
+        if "ndjson" in content_type or "jsonlines" in content_type:
+            records = _iter_ndjson(spool)
+        else:
+            head = b""
+            while not head:
+                data = spool.read(4096)
+                if not data:
+                    break
+                head = data.lstrip()[:1]
+            spool.seek(0)
+            if head != b"[":
+                spool.close()
+                raise HTTPException(status_code=400, detail="Expected a JSON list or NDJSON")
+            records = _iter_json_array(spool)
+    return records, cleanup
+
+def _export_response(fmt: str, chunks: Iterable[exports.ResultChunk], filename: str, cleanup: Optional[BackgroundTask] = None) -> StreamingResponse:
+    if fmt not in exports.EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"format must be one of {list(exports.EXPORT_FORMATS)}")
+    try:
+        exports.require_pyarrow(fmt)
+    except RuntimeError as e:
+        raise HTTPException(status_code=501, detail=str(e))
+    media_type, extension = exports.EXPORT_FORMATS[fmt]
+    return StreamingResponse(
+        exports.iter_export(fmt, chunks),
+        media_type=media_type,
+        headers={"Content-Disposition": f"attachment; filename={filename}.{extension}"},
+        background=cleanup
+    )
+
+def _record_chunks(records: Iterable[Any], params: Dict[str, float], zoning: normativa.ZoningIndex) -> Iterator[exports.ResultChunk]:
+    index = 0
+    for chunk in logic.chunked(records, BATCH_CHUNK_SIZE):
+        errors, positions, batch = _evaluate_records(chunk, params, zoning)
+        yield exports.result_chunk(index, [None] * len(chunk), errors, positions, batch)
+        index += len(chunk)
+
+@app.post("/calculate/batch/export")
+async def export_batch(request: Request, format: str = "csv", params: cache.ParameterSnapshot = Depends(get_parameter_snapshot),
+                       zoning: normativa.ZoningIndex = Depends(get_zoning_index)):
+    """
+    Same input as /calculate/batch; streams the flattened `raw` results as
+    CSV, Arrow IPC stream or Parquet (?format=csv|arrow|parquet).
+    """
+    records, cleanup = await _read_batch_body(request)
+    return _export_response(format, _record_chunks(records, params.values, zoning), "Resultados_NoNA", cleanup)
+
+@app.post("/sensitivity")
+def run_sensitivity(req: SensitivityRequest, params: cache.ParameterSnapshot = Depends(get_parameter_snapshot),
+                    zoning: normativa.ZoningIndex = Depends(get_zoning_index)):
+    inputs = _with_normativa(req.inputs, zoning)
+    try:
+        return sensitivity.run_sensitivity(
+            inputs.model_dump(), params.values, req.variables, req.range_pct, req.steps
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.post("/residual-land-value")
+def residual_land_value(req: CalculationRequest, params: cache.ParameterSnapshot = Depends(get_parameter_snapshot),
+                        zoning: normativa.ZoningIndex = Depends(get_zoning_index)):
+    """Maximum valor_terreno per m2 that still reaches utilidadDeseada."""
+    data = _with_normativa(req, zoning).model_dump()
+    data['parameters'] = params.values
+    try:
+        return residual.solve_residual_land_value(data)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.post("/residual-land-value/batch")
+def residual_land_value_batch(reqs: List[CalculationRequest], params: cache.ParameterSnapshot = Depends(get_parameter_snapshot),
+                              zoning: normativa.ZoningIndex = Depends(get_zoning_index)):
+    if not reqs:
+        return []
+    reqs = [_with_normativa(req, zoning) for req in reqs]
+    columns = {key: [getattr(req, key) for req in reqs] for key in BATCH_COLUMNS}
+    return residual.solve_residual_land_value_batch(columns, params.values)
+
+@app.post("/optimize/massing")
+def optimize_massing(req: OptimizeRequest, params: cache.ParameterSnapshot = Depends(get_parameter_snapshot),
+                     zoning: normativa.ZoningIndex = Depends(get_zoning_index)):
+    """Pareto front of profit vs. cost vs. units within the lot's COS/CUS/CAS caps."""
+    if req.n_viviendas_step < 1:
+        raise HTTPException(status_code=400, detail="n_viviendas_step must be >= 1")
+    inputs = _with_normativa(req.inputs, zoning)
+    try:
+        return optimizer.optimize_massing(
+            inputs.model_dump(),
+            params.values,
+            range(req.n_viviendas_min, req.n_viviendas_max + 1, req.n_viviendas_step),
+            cos_levels=req.cos_levels,
+            cus_levels=req.cus_levels,
+            num_locales_options=req.num_locales_options,
+            parking_options=req.parking_options,
+            min_unit_area=req.min_unit_area
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.post("/simulation/montecarlo")
+def run_montecarlo(req: MonteCarloRequest, params: cache.ParameterSnapshot = Depends(get_parameter_snapshot),
+                   zoning: normativa.ZoningIndex = Depends(get_zoning_index)):
+    """Streams NDJSON progress events (partial statistics) and a final result event."""
+    inputs = _with_normativa(req.inputs, zoning)
+    try:
+        events = simulation.run_montecarlo(
+            inputs.model_dump(),
+            params.values,
+            {var: spec.model_dump() for var, spec in req.distributions.items()},
+            n=req.n,
+            seed=req.seed,
+            bins=req.bins,
+            executor=executor.simulation_executor,
+            parking_rules=nona_core.parking_rules()
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return StreamingResponse(
+        (json.dumps(event) + "\n" for event in events),
+        media_type="application/x-ndjson"
+    )
+
+@app.get("/model/graph")
+def model_graph():
+    return calc_graph.graph_spec()
+
+@app.get("/cache/stats")
+def cache_stats(params: cache.ParameterSnapshot = Depends(get_parameter_snapshot)):
+    return {
+        "parameter_version": params.version,
+        "results": cache.result_cache.stats()
+    }
+
+# --- Background Export Jobs ---
+@app.post("/exports", status_code=202)
+def create_export_job(req: ExportJobRequest, db: Session = Depends(get_db),
+                      zoning: normativa.ZoningIndex = Depends(get_zoning_index)):
+    """Queues an export on the worker pool; poll GET /exports/{id} and fetch /exports/{id}/file."""
+    if req.kind == "report":
+        if req.inputs is None:
+            raise HTTPException(status_code=400, detail="report exports need `inputs`")
+        payload = _with_normativa(req.inputs, zoning).model_dump()
+    else:
+        if req.customer_id is None:
+            raise HTTPException(status_code=400, detail=f"{req.kind} exports need `customer_id`")
+        if db.get(database.Customer, req.customer_id) is None:
+            raise HTTPException(status_code=404, detail="Customer not found")
+        payload = {"customer_id": req.customer_id}
+    params = get_parameter_snapshot(db)
+    try:
+        job = jobs.export_jobs.submit(req.kind, req.format, payload, params.values, nona_core.parking_rules())
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except RuntimeError as e:
+        raise HTTPException(status_code=501, detail=str(e))
+    return jobs.export_jobs.describe(job)
+
+@app.get("/exports")
+def list_export_jobs():
+    return {"stats": jobs.export_jobs.stats(), "jobs": jobs.export_jobs.jobs()}
+
+def _get_export_job(job_id: str) -> jobs.ExportJob:
+    job = jobs.export_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Export job not found or expired")
+    return job
+
+@app.get("/exports/{job_id}")
+def get_export_job(job_id: str):
+    return jobs.export_jobs.describe(_get_export_job(job_id))
+
+@app.delete("/exports/{job_id}")
+def cancel_export_job(job_id: str):
+    _get_export_job(job_id)
+    return jobs.export_jobs.describe(jobs.export_jobs.cancel(job_id))
+
+@app.get("/exports/{job_id}/file")
+def download_export_job(job_id: str):
+    job = _get_export_job(job_id)
+    if job.status != "done":
+        raise HTTPException(status_code=409, detail=f"Export job is {job.status}")
+    return FileResponse(job.path, media_type=job.media_type, filename=job.filename)
+
 @app.get("/parameters", response_model=List[ParameterOut])
 def get_parameters(db: Session = Depends(get_db)):
     return db.query(database.Parameter).all()
 
 @app.put("/parameters")
 def update_parameters(updates: List[ParameterUpdate], db: Session = Depends(get_db)):
-    for up in updates:
-        db_param = db.query(database.Parameter).filter(database.Parameter.key == up.key).first()
-        if db_param:
-            db_param.value = up.value
+    """
+    Upserts the given parameters atomically as one versioned change-set and
+    returns the keys whose values actually changed. Description/group edits
+    are saved without a new version, so cached results stay valid.
+    """
+    try:
+        version, changed = database.apply_parameter_updates(db, [up.model_dump() for up in updates])
+    except ValueError as e:
+        db.rollback()
+        raise HTTPException(status_code=400, detail=str(e))
+    db.commit()
+    if changed:
+        cache.parameter_cache.invalidate()
+    return {"status": "updated" if changed else "unchanged", "version": version, "changed": changed}
+
+@app.get("/parameters/history")
+def parameter_history(limit: int = Query(50, ge=1, le=1000), db: Session = Depends(get_db)):
+    """Most recent parameter change-sets: version, time and {key: [old, new]}."""
+    rows = db.query(database.ParameterChange).order_by(database.ParameterChange.version.desc()).limit(limit)
+    return [{"version": r.version, "changed_at": r.changed_at, "changes": r.changes} for r in rows]
+
+@app.get("/parameters/versions/{version}")
+def parameters_at_version(version: int, db: Session = Depends(get_db)):
+    """Parameter values as they were at `version`, for pinned recalculations."""
+    try:
+        values = database.parameters_at_version(db, version)
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    return {"version": version, "values": values}
+
+@app.get("/parking-rules")
+def get_parking_rules(city: Optional[str] = None, db: Session = Depends(get_db)):
+    """Stored parking rules (all, or one city's plus the city-wide ones) and their version."""
+    query = db.query(database.ParkingRule)
+    if city is not None:
+        query = query.filter(database.ParkingRule.city.in_(["", nona_core.ParkingRules.normalize(city)]))
+    rules = query.order_by(database.ParkingRule.city, database.ParkingRule.delegacion, database.ParkingRule.district)
+    return {
+        "version": database.get_parameter_version(db, database.PARKING_RULES_VERSION_ID),
+        "rules": [
+            {"id": r.id, "city": r.city, "delegacion": r.delegacion, "district": r.district, "comercial": r.comercial}
+            for r in rules
+        ],
+    }
+
+@app.put("/parking-rules")
+def update_parking_rules(rules: List[ParkingRuleUpdate], db: Session = Depends(get_db)):
+    """Upserts parking rules as one versioned change; returns the rule keys that changed."""
+    try:
+        version, changed = database.apply_parking_rules(db, [r.model_dump() for r in rules])
+    except ValueError as e:
+        db.rollback()
+        raise HTTPException(status_code=400, detail=str(e))
+    db.commit()
+    if changed:
+        cache.parking_rule_cache.invalidate()
+    return {"status": "updated" if changed else "unchanged", "version": version, "changed": changed}
+
+@app.delete("/parking-rules/{rule_id}")
+def delete_parking_rule(rule_id: int, db: Session = Depends(get_db)):
+    try:
+        version = database.delete_parking_rule(db, rule_id)
+    except ValueError as e:
+        db.rollback()
+        raise HTTPException(status_code=404, detail=str(e))
+    db.commit()
+    cache.parking_rule_cache.invalidate()
+    return {"status": "deleted", "version": version}
+
+# --- Normativa ---
+def _zone_out(zone: Optional[normativa.Zone]) -> Optional[Dict[str, Any]]:
+    return zone._asdict() if zone is not None else None
+
+@app.get("/normativa")
+def get_normativa(db: Session = Depends(get_db)):
+    """Loaded normativa sources with their zone counts, and the normativa version."""
+    rows = (
+        db.query(database.ZoningZone.source, func.count(database.ZoningZone.id))
+        .group_by(database.ZoningZone.source).order_by(database.ZoningZone.source)
+    )
+    return {
+        "version": database.get_parameter_version(db, database.NORMATIVA_VERSION_ID),
+        "sources": [{"source": source, "zones": count} for source, count in rows],
+    }
+
+@app.put("/normativa/{source}")
+def put_normativa(source: str, geojson: Dict[str, Any], db: Session = Depends(get_db)):
+    """
+    Replaces the zones of `source` with the polygons of a GeoJSON
+    FeatureCollection; each feature needs COS and CUS (CAS optional) and
+    preferably a `zona` name among its properties. Shapefiles are loaded with
+    load_normativa.py.
+    """
+    try:
+        version, zones = database.replace_zoning_source(db, source, normativa.read_geojson(geojson))
+    except (ValueError, KeyError, TypeError, IndexError) as e:
+        db.rollback()
+        raise HTTPException(status_code=400, detail=f"Invalid normativa: {e}")
     db.commit()
-    return {"status": "updated"}
+    cache.zoning_index_cache.invalidate()
+    return {"status": "updated", "version": version, "zones": zones}
+
+@app.delete("/normativa/{source}")
+def delete_normativa(source: str, db: Session = Depends(get_db)):
+    try:
+        version = database.delete_zoning_source(db, source)
+    except ValueError as e:
+        db.rollback()
+        raise HTTPException(status_code=404, detail=str(e))
+    db.commit()
+    cache.zoning_index_cache.invalidate()
+    return {"status": "deleted", "version": version}
+
+@app.get("/normativa/lookup")
+def normativa_lookup(lat: float, lng: float, index: normativa.ZoningIndex = Depends(get_zoning_index)):
+    """Zone and coefficients (COS/CUS/CAS) at a point; 404 outside every zone."""
+    zone = index.lookup(lat, lng)
+    if zone is None:
+        raise HTTPException(status_code=404, detail="No normativa zone at this location")
+    return _zone_out(zone)
+
+@app.post("/normativa/lookup")
+def normativa_lookup_many(req: NormativaLookup, index: normativa.ZoningIndex = Depends(get_zoning_index)):
+    """
+    Bulk point lookup ({"points": [[lat, lng], ...]} -> a zone or null per
+    point) or a lot outline ({"polygon": GeoJSON Polygon} -> the zone of the
+    lot plus every zone it touches).
+    """
+    if req.polygon is not None:
+        try:
+            rings = normativa.geometry_rings(req.polygon)
+            zone, touched = index.lookup_polygon(rings[0])
+        except (ValueError, KeyError, TypeError, IndexError) as e:
+            raise HTTPException(status_code=400, detail=f"Invalid polygon: {e}")
+        return {"zone": _zone_out(zone), "zones": [_zone_out(z) for z in touched]}
+    if req.points is None:
+        raise HTTPException(status_code=400, detail="Send `points` or `polygon`")
+    return [_zone_out(zone) for zone in index.lookup_many(req.points)]
+
+# --- Listings ---
+# Keyset pages in id order: ?limit=&after=<cursor>&fields=a,b,c. The body stays
+# a plain JSON list; the next cursor travels in X-Next-Cursor and a Link header.
+# The ETag is derived from the listing state (row count and max id) plus the
+# page parameters, so If-None-Match is answered with a 304 before the page query.
+LIST_PAGE_SIZE = 100
+LIST_MAX_PAGE_SIZE = 1000
+CUSTOMER_FIELDS = ('id', 'name', 'created_at')
+CUSTOMER_DEFAULT_FIELDS = ('id', 'name')
+SCENARIO_FIELDS = (
+    'id', 'name', 'customer_id', 'created_at', 'input_data', 'result_summary'
+) + tuple(database.SCENARIO_RESULT_COLUMNS) + ('lat', 'lng')
+# input_data is the bulk of a scenario; it is only sent when asked for
+SCENARIO_DEFAULT_FIELDS = ('id', 'name', 'customer_id', 'created_at', 'result_summary')
+
+def _list_fields(fields: Optional[str], allowed: Tuple[str, ...], default: Tuple[str, ...]) -> Tuple[str, ...]:
+    if not fields:
+        return default
+    selected = tuple(dict.fromkeys(f.strip() for f in fields.split(",") if f.strip()))
+    unknown = [f for f in selected if f not in allowed]
+    if unknown or not selected:
+        raise HTTPException(status_code=400, detail=f"fields must be a comma-separated subset of {list(allowed)}")
+    return selected
+
+def _page_response(
+    request: Request, db: Session, model, selected: Tuple[str, ...],
+    after: Optional[int], limit: int, **filters
+) -> Response:
+    state = database.listing_state(db, model, **filters)
+    key = repr((model.__tablename__, sorted(filters.items()), state, selected, after, limit))
+    etag = '"' + hashlib.sha1(key.encode("utf-8")).hexdigest() + '"'
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if etag in (tag.strip() for tag in request.headers.get("if-none-match", "").split(",")):
+        return Response(status_code=304, headers=headers)
+    rows, next_cursor = database.keyset_page(db, model, selected, after, limit, **filters)
+    if next_cursor is not None:
+        headers["X-Next-Cursor"] = str(next_cursor)
+        headers["Link"] = f'<{request.url.include_query_params(after=next_cursor)}>; rel="next"'
+    body = json.dumps(jsonable_encoder(rows), separators=(",", ":")).encode("utf-8")
+    return Response(body, media_type="application/json", headers=headers)
 
 # Customer Endpoints
-@app.get("/customers", response_model=List[CustomerOut])
-def get_customers(db: Session = Depends(get_db)):
-    return db.query(database.Customer).all()
+@app.get("/customers")
+def get_customers(
+    request: Request,
+    limit: int = Query(LIST_PAGE_SIZE, ge=1, le=LIST_MAX_PAGE_SIZE),
+    after: Optional[int] = None,
+    fields: Optional[str] = None,
+    db: Session = Depends(get_db)
+):
+    selected = _list_fields(fields, CUSTOMER_FIELDS, CUSTOMER_DEFAULT_FIELDS)
+    return _page_response(request, db, database.Customer, selected, after, limit)
 
 @app.post("/customers", response_model=CustomerOut)
 def create_customer(customer: CustomerCreate, db: Session = Depends(get_db)):
@@ -179,32 +895,193 @@ def create_customer(customer: CustomerCreate, db: Session = Depends(get_db)):
 
 # Scenario Endpoints
 @app.post("/scenarios", response_model=ScenarioOut)
-def create_scenario(scenario: ScenarioCreate, db: Session = Depends(get_db)):
-    # Run calculation first to get summary
-    calc_result = logic.run_calculation(scenario.input_data.dict())
-    
-    summary = {}
-    if "metrics" in calc_result:
-        summary = {
-            "utilidad": calc_result["metrics"].get("Text_Utilidad_Final"),
-            "costo_total": calc_result["metrics"].get("Text_Costo_Total"),
-            "roi": calc_result["raw"].get("utilidad_optimizada")
-        }
+def create_scenario(scenario: ScenarioCreate, db: Session = Depends(get_db),
+                    zoning: normativa.ZoningIndex = Depends(get_zoning_index)):
+    _with_normativa(scenario.input_data, zoning)
+    # Run calculation first to get summary (same parameters and cache as /calculate)
+    calc_result = calculate_cached(scenario.input_data, get_parameter_snapshot(db))
     
+    input_data = scenario.input_data.model_dump()
     new_scenario = database.Scenario(
         customer_id=scenario.customer_id,
         name=scenario.name,
-        input_data=scenario.input_data.dict(),
-        result_summary=summary
+        input_data=input_data,
+        result_summary=scenario_summary(calc_result),
+        **database.scenario_metrics(input_data, calc_result.get("raw"))
     )
     db.add(new_scenario)
     db.commit()
     db.refresh(new_scenario)
     return new_scenario
 
-@app.get("/customers/{customer_id}/scenarios", response_model=List[ScenarioOut])
-def get_scenarios(customer_id: int, db: Session = Depends(get_db)):
-    return db.query(database.Scenario).filter(database.Scenario.customer_id == customer_id).all()
+# --- Bulk Scenario Ingest ---
+# Rows are validated, calculated through run_calculation_batch and inserted with
+# one executemany per chunk, committed chunk by chunk. Bad rows are reported and
+# skipped; a chunk that fails to insert is reported row by row and the next goes on.
+SCENARIO_INGEST_CHUNK = 1000
+
+def _ingest_chunk(db: Session, records: List[Any], start: int, customer_id: Optional[int],
+                  params: Dict[str, float], zoning: normativa.ZoningIndex,
+                  customers: set) -> Tuple[List[Optional[int]], List[Dict[str, Any]]]:
+    ids: List[Optional[int]] = [None] * len(records)
+    errors = []
+    valid = []
+    for i, record in enumerate(records):
+        try:
+            if isinstance(record, Exception):
+                raise record
+            if not isinstance(record, dict):
+                raise ValueError("Each row must be a JSON object")
+            if customer_id is not None:
+                record = {"customer_id": customer_id, **record}
+            scenario = ScenarioCreate(**record)
+            scenario.input_data.fill_normativa(zoning)
+            valid.append((i, scenario))
+        except ValidationError as e:
+            errors.append({"index": start + i, "error": e.errors(include_url=False, include_context=False, include_input=False)})
+        except Exception as e:
+            errors.append({"index": start + i, "error": str(e)})
+
+    unknown = {s.customer_id for _, s in valid} - customers
+    if unknown:
+        customers.update(
+            row.id for row in db.query(database.Customer.id).filter(database.Customer.id.in_(unknown))
+        )
+    for i, s in valid:
+        if s.customer_id not in customers:
+            errors.append({"index": start + i, "error": f"Customer {s.customer_id} not found"})
+    valid = [(i, s) for i, s in valid if s.customer_id in customers]
+    if not valid:
+        return ids, errors
+
+    inputs = [s.input_data.model_dump() for _, s in valid]
+    batch = logic.run_calculation_batch({key: [d[key] for d in inputs] for key in BATCH_COLUMNS}, params)
+    created_at = datetime.utcnow()
+    rows = []
+    for row, (_, s) in enumerate(valid):
+        result = logic.batch_row(batch, row, formatting="text")
+        rows.append({
+            "customer_id": s.customer_id,
+            "name": s.name,
+            "created_at": created_at,
+            "input_data": inputs[row],
+            "result_summary": scenario_summary(result),
+            **database.scenario_metrics(inputs[row], result.get("raw")),
+        })
+    try:
+        # Core executemany (no ORM bookkeeping); RETURNING hands back the ids in row order
+        table = database.Scenario.__table__
+        new_ids = db.connection().execute(
+            table.insert().returning(table.c.id, sort_by_parameter_order=True), rows
+        ).scalars().all()
+        db.commit()
+    except SQLAlchemyError as e:
+        db.rollback()
+        errors.extend({"index": start + i, "error": f"Insert failed: {e.__class__.__name__}"} for i, _ in valid)
+        return ids, errors
+    for (i, _), new_id in zip(valid, new_ids):
+        ids[i] = new_id
+    return ids, errors
+
+def ingest_scenarios(records: Iterable[Any], customer_id: Optional[int], params: Dict[str, float],
+                     zoning: normativa.ZoningIndex) -> Dict[str, Any]:
+    db = database.SessionLocal()
+    ids: List[Optional[int]] = []
+    errors: List[Dict[str, Any]] = []
+    customers: set = set()
+    try:
+        for chunk in logic.chunked(records, SCENARIO_INGEST_CHUNK):
+            chunk_ids, chunk_errors = _ingest_chunk(db, chunk, len(ids), customer_id, params, zoning, customers)
+            ids.extend(chunk_ids)
+            errors.extend(chunk_errors)
+    finally:
+        db.close()
+    errors.sort(key=lambda e: e["index"])
+    return {"inserted": len(ids) - len(errors), "failed": len(errors), "ids": ids, "errors": errors}
+
+@app.post("/scenarios/bulk")
+async def create_scenarios_bulk(request: Request, customer_id: Optional[int] = None,
+                                params: cache.ParameterSnapshot = Depends(get_parameter_snapshot),
+                                zoning: normativa.ZoningIndex = Depends(get_zoning_index)):
+    """
+    Saves many scenarios at once. Accepts the same bodies as /calculate/batch
+    (JSON list, NDJSON, multipart NDJSON upload) of ScenarioCreate objects;
+    `customer_id` fills in rows that do not name one. Returns the new ids in
+    input order (null for rejected rows) and the per-row errors.
+    """
+    records, cleanup = await _read_batch_body(request)
+    try:
+        # Validation, calculation and inserts are blocking: keep them off the event loop
+        return await run_in_threadpool(ingest_scenarios, records, customer_id, params.values, zoning)
+    finally:
+        if cleanup is not None:
+            await cleanup()
+
+@app.get("/scenarios/{scenario_id}", response_model=ScenarioOut)
+def get_scenario(scenario_id: int, db: Session = Depends(get_db)):
+    scenario = db.get(database.Scenario, scenario_id)
+    if scenario is None:
+        raise HTTPException(status_code=404, detail="Scenario not found")
+    return scenario
+
+@app.get("/customers/{customer_id}/scenarios")
+def get_scenarios(
+    customer_id: int,
+    request: Request,
+    limit: int = Query(LIST_PAGE_SIZE, ge=1, le=LIST_MAX_PAGE_SIZE),
+    after: Optional[int] = None,
+    fields: Optional[str] = None,
+    db: Session = Depends(get_db)
+):
+    """A page of the customer's scenarios; add input_data to `fields` for the full payload."""
+    selected = _list_fields(fields, SCENARIO_FIELDS, SCENARIO_DEFAULT_FIELDS)
+    return _page_response(request, db, database.Scenario, selected, after, limit, customer_id=customer_id)
+
+@app.get("/customers/{customer_id}/scenarios/query", response_model=ScenarioPage)
+def query_scenarios(customer_id: int, q: ScenarioQuery = Depends(), db: Session = Depends(get_db)):
+    """
+    Filters, sorts and pages a customer's scenarios on the typed, indexed
+    result columns, e.g. ?sort=-roi&min_utilidad=15&limit=20.
+    """
+    try:
+        total, rows = database.query_scenarios(
+            db, customer_id, q.ranges(), q.created_after, q.created_before,
+            sort=q.sort, limit=q.limit, offset=q.offset
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"total": total, "limit": q.limit, "offset": q.offset, "items": rows}
+
+def _scenario_chunks(customer_id: int, params: Dict[str, float]) -> Iterator[exports.ResultChunk]:
+    # Streams outlive the request's session, so the generator owns its own
+    db = database.SessionLocal()
+    try:
+        yield from exports.scenario_chunks(database.customer_scenarios(db, customer_id, BATCH_CHUNK_SIZE), params, BATCH_CHUNK_SIZE)
+    finally:
+        db.close()
+
+@app.get("/customers/{customer_id}/scenarios/results")
+def export_scenario_results(customer_id: int, format: str = "csv", db: Session = Depends(get_db)):
+    """Flattened `raw` results of every scenario as CSV, Arrow IPC stream or Parquet."""
+    if db.get(database.Customer, customer_id) is None:
+        raise HTTPException(status_code=404, detail="Customer not found")
+    params = get_parameter_snapshot(db)
+    return _export_response(format, _scenario_chunks(customer_id, params.values), f"Escenarios_NoNA_{customer_id}")
+
+@app.get("/customers/{customer_id}/scenarios/export")
+def export_scenarios(customer_id: int, db: Session = Depends(get_db)):
+    """Portfolio workbook: a summary sheet plus one sheet per scenario, streamed in chunks."""
+    if db.get(database.Customer, customer_id) is None:
+        raise HTTPException(status_code=404, detail="Customer not found")
+    params = get_parameter_snapshot(db)
+    scenarios = database.customer_scenarios(db, customer_id, BATCH_CHUNK_SIZE)
+    # Built while the session is open; only the finished file is streamed
+    spool = reports.spool_portfolio(reports.scenario_results(scenarios, params.values, BATCH_CHUNK_SIZE))
+    return StreamingResponse(
+        reports.iter_file(spool),
+        media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+        headers={"Content-Disposition": f"attachment; filename=Portafolio_NoNA_{customer_id}.xlsx"}
+    )
 
 # --- Serve Static Frontend (for PyInstaller/Executable) ---
 # Check if we are running in a PyInstaller bundle
@@ -20,7 +20,7 @@ a = Analysis(
     pathex=[],
     binaries=[],
     datas=added_files,
-    hiddenimports=['uvicorn', 'logic', 'database', 'openpyxl'],
+    hiddenimports=['uvicorn', 'logic', 'database', 'cache', 'sensitivity', 'simulation', 'residual', 'optimizer', 'calc_graph', 'nona_core', 'normativa', 'reports', 'exports', 'excel_template', 'jobs', 'executor', 'openpyxl'],
     hookspath=[],
     hooksconfig={},
     runtime_hooks=[],
@@ -0,0 +1,1066 @@
+"""
+NoNA Calculation Core
+The feasibility model shared by the web backend (logic.py) and the Grasshopper
+component (NoNA.py). Standard library only: no Rhino, FastAPI or openpyxl
+imports, so it loads the same inside Rhino's Python and behind the API.
+
+Holds the constants and helpers, the node graph (MODEL_LEAVES / MODEL_NODES)
+and its incremental front end: evaluate() runs the full model once and keeps
+every intermediate value; update() applies changed request fields and reruns
+only the nodes whose inputs actually changed. StateCache keeps one state per
+key (a Grasshopper component instance) so every solve is such an update.
+run_calculation_batch evaluates many rows (portfolios, lots of an urban
+block) column at a time with the same arithmetic.
+"""
+
+import math
+import sys
+from array import array
+from collections import OrderedDict
+from operator import itemgetter
+from typing import Dict, List, Any, Tuple, Optional, Sequence, Callable, Hashable, NamedTuple, Iterable, Iterator
+
+# ==============================================================================
+# CONFIGURATION & CONSTANTS
+# ==============================================================================
+# Defaults for fallback
+DEFAULT_PARAMS = {
+    'COST_DEMOLITION_M2': 1600.0,
+    'COST_LICENSE_M2': 15.0,
+    'COST_WASTE_PERCENT': 0.15,
+    'PARKING_M2_PER_SPOT': 12.5,
+    'PARKING_DRIVEWAY_FACTOR': 1.50,
+    # Indirects
+    'PCT_HONORARIOS': 15.0,
+    'PCT_LEGALES': 2.0,
+    'PCT_ADM': 10.0,
+    'PCT_FIN': 3.0,
+    'PCT_COM': 6.0
+}
+
+CONSTANTS = {
+    'PARKING_FACTORS': {
+        'centro': {'comercial': 35},
+        'poniente': {'comercial': 25},
+        'norte': {'comercial': 30},
+        'sur': {'comercial': 25}
+    }
+}
+
+# ==============================================================================
+# PARKING RULES
+# ==============================================================================
+
+class ParkingRules:
+    """
+    Compiled parking rule table: (city, delegacion, district) -> row, with the
+    commercial divisor of every row (m2 of commercial area per spot) in an
+    array.
+
+    Names match trimmed and case-insensitively. Every spelling looked up is
+    memoized, so after the first time a lookup is a single dict probe. A rule
+    with an empty city applies in every city and one with an empty district
+    to the whole delegacion; the most specific rule wins.
+    """
+
+    MEMO_LIMIT = 65536
+
+    def __init__(self, rules: Iterable[Tuple[str, str, str, float]] = (), version: int = 0):
+        self.version = version
+        self.keys: List[Tuple[str, str, str]] = []
+        self.comercial = array('d')
+        self._rows: Dict[Tuple[str, str, str], int] = {}
+        self._memo: Dict[Tuple[Any, Any, Any], int] = {}
+        for city, delegacion, district, comercial in rules:
+            key = (self.normalize(city), self.normalize(delegacion), self.normalize(district))
+            row = self._rows.get(key)
+            if row is None:
+                self._rows[key] = len(self.keys)
+                self.keys.append(key)
+                self.comercial.append(comercial)
+            else:
+                self.comercial[row] = comercial
+
+    @staticmethod
+    def normalize(name: Any) -> str:
+        return sys.intern(str(name).strip().lower()) if name else ''
+
+    def find(self, city: Any, delegacion: Any, district: Any = '') -> int:
+        """Row of the rule that applies, or -1 for an unknown delegacion."""
+        spelling = (city, delegacion, district)
+        row = self._memo.get(spelling)
+        if row is None:
+            city, delegacion, district = (self.normalize(v) for v in spelling)
+            rows = self._rows
+            row = rows.get((city, delegacion, district))
+            if row is None:
+                row = rows.get((city, delegacion, ''))
+            if row is None:
+                row = rows.get(('', delegacion, ''), -1)
+            if len(self._memo) >= self.MEMO_LIMIT:
+                self._memo.clear()
+            self._memo[spelling] = row
+        return row
+
+
+# Built-in rules (CONSTANTS['PARKING_FACTORS'], valid in every city), used
+# until an application installs its own table with set_parking_rules()
+DEFAULT_PARKING_RULES = ParkingRules(
+    ('', name, '', rule['comercial']) for name, rule in CONSTANTS['PARKING_FACTORS'].items()
+)
+_parking_rules = DEFAULT_PARKING_RULES
+
+
+def parking_rules() -> ParkingRules:
+    """Rule table used when a calculation does not bring its own."""
+    return _parking_rules
+
+
+def set_parking_rules(rules: ParkingRules) -> None:
+    global _parking_rules
+    _parking_rules = rules
+
+
+def calculate_land_metrics(area_terreno: float, cost_per_unit: float) -> Tuple[float, float, str, str]:
+    """Calculates total land value from numeric area input."""
+    total_value = area_terreno * cost_per_unit
+    return area_terreno, total_value, f"{area_terreno:.2f} m2", f"${total_value:,.2f} mxn"
+
+def calculate_demolition_cost(
+    do_demolition: bool, 
+    area_demolition: float, 
+    land_area: float,
+    params: Dict[str, float]
+) -> Tuple[float, str]:
+    """Computes demolition, license, and waste removal costs."""
+    if not do_demolition:
+        return 0.0, "$0.00 mxn"
+        
+    cost_dem = area_demolition * params.get('COST_DEMOLITION_M2', DEFAULT_PARAMS['COST_DEMOLITION_M2'])
+    cost_lic = land_area * params.get('COST_LICENSE_M2', DEFAULT_PARAMS['COST_LICENSE_M2'])
+    cost_res = land_area * params.get('COST_WASTE_PERCENT', DEFAULT_PARAMS['COST_WASTE_PERCENT'])
+    
+    total = cost_dem + cost_lic + cost_res
+    return total, f"${total:,.2f} mxn"
+
+def calculate_regulatory_areas(
+    land_area: float, 
+    cos: float, 
+    cus: float, 
+    cas: float, 
+    retiros_area: float
+) -> Dict[str, float]:
+    """Calculates permitted construction areas based on coefficients."""
+    return {
+        'cos_area': land_area * cos,
+        'cus_area': land_area * cus,
+        'cas_area': land_area * cas,
+        'net_area': land_area - retiros_area
+    }
+
+def calculate_mixed_use(
+    is_mixed: bool, 
+    num_locales: int, 
+    cos_area: float, 
+    price_per_m2: float
+) -> Dict[str, float]:
+    """Calculates commercial area metrics if mixed-use is enabled."""
+    results = {
+        'area_local': 0.0,
+        'venta_local': 0.0,
+        'ingreso_total': 0.0,
+        'area_comercio': 0.0
+    }
+    
+    if not is_mixed:
+        return results
+        
+    if num_locales > 0:
+        # Logic from original: Commercial Area = COS Area
+        results['area_comercio'] = cos_area 
+        results['area_local'] = cos_area / float(num_locales)
+        results['venta_local'] = results['area_local'] * price_per_m2
+        results['ingreso_total'] = results['venta_local'] * num_locales
+    
+    return results
+
+def calculate_parking(
+    enable: bool, 
+    n_viviendas: int, 
+    cos_area: float, 
+    circ_area: float,
+    delegaciones: List[str],
+    factors: List[float],
+    cost_per_m2: float,
+    params: Dict[str, float],
+    rules: Optional[ParkingRules] = None,
+    city: str = '',
+    districts: Sequence[str] = ()
+) -> Dict[str, Any]:
+    """
+    Calculates parking spots, area, and cost based on district.
+    districts[i] (optional) names the zoning district of delegaciones[i].
+    Delegaciones without a rule add no spots and are listed under 'unknown'.
+    """
+    if not enable:
+        return {'cost': 0.0, 'area': 0.0, 'details': {}, 'unknown': []}
+
+    rules = rules if rules is not None else _parking_rules
+    comercial = rules.comercial
+
+    total_cost = 0.0
+    total_area_m2 = 0.0
+    
+    c_vivienda_list = []
+    c_comercio_list = []
+    c_total_list = []
+    unknown = []
+    
+    m2_spot = params.get('PARKING_M2_PER_SPOT', DEFAULT_PARAMS['PARKING_M2_PER_SPOT'])
+    drive_factor = params.get('PARKING_DRIVEWAY_FACTOR', DEFAULT_PARAMS['PARKING_DRIVEWAY_FACTOR'])
+
+    for k, (dep, fac) in enumerate(zip(delegaciones, factors)):
+        row = rules.find(city, dep, districts[k] if k < len(districts) else '')
+        if row < 0:
+            unknown.append(dep)
+            continue
+            
+        c_viv = n_viviendas * fac
+        c_com = (cos_area - circ_area) / comercial[row] if cos_area else 0
+        
+        spots = math.ceil(c_viv + c_com)
+        area = spots * m2_spot * drive_factor
+        cost = area * cost_per_m2
+        
+        total_cost += cost
+        total_area_m2 += area
+        
+        c_vivienda_list.append(c_viv)
+        c_comercio_list.append(c_com)
+        c_total_list.append(spots)
+
+    return {
+        'cost': total_cost,
+        'area': total_area_m2,
+        'cost_per_m2': cost_per_m2,
+        'details': {
+            'cajones_vivienda': c_vivienda_list,
+            'cajones_comercio': c_comercio_list,
+            'cajones_total': c_total_list
+        },
+        'unknown': unknown
+    }
+
+def solve_target_price(
+    cost_total: float, 
+    desired_margin_percent: float,
+    current_income: float
+) -> Tuple[float, float, float]:
+    """Solves for required total sales price to achieve target margin."""
+    if desired_margin_percent >= 100:
+        return 0.0, 0.0, desired_margin_percent
+        
+    target_revenue = cost_total / (1.0 - (desired_margin_percent / 100.0))
+    new_gain = target_revenue - cost_total
+    
+    return target_revenue, new_gain, desired_margin_percent
+
+# ==============================================================================
+# CALCULATION GRAPH
+# ==============================================================================
+# The model is a fixed DAG of pure nodes. Each node reads named values (request
+# inputs, parameters or upstream outputs; taken from its function signature)
+# and returns its outputs in declared order. Nodes are listed in topological
+# order, so a single pass evaluates the whole model; update() reruns
+# only the nodes downstream of a change. The arithmetic is kept in the same
+# order as the batch engine so both paths agree bit for bit.
+
+# Outputs of the 'indirects' node, nested under 'costos_indirectos_desglose' in `raw`
+INDIRECT_BREAKDOWN_FIELDS = ('honorarios', 'legales', 'administrativos', 'financieros', 'comerciales')
+
+# (input key, converter, default) - request fields read by the model
+MODEL_INPUTS = (
+    ('area_terreno', float, 0),
+    ('valor_terreno', float, 0),
+    ('COS', float, 0),
+    ('CUS', float, 0),
+    ('CAS', float, 0),
+    ('area_retiros', float, 0),
+    ('demolicion', bool, False),
+    ('area_demolicion', float, 0),
+    ('n_viviendas', int, 0),
+    ('usos_mixtos', bool, False),
+    ('num_locales', int, 0),
+    ('costo_local_m2', float, 0),
+    ('costoMetroConstruccion', float, 0),
+    ('Costo_de_venta_m2', float, 0),
+    ('areaCirculacionPorcentaje', float, 0),
+    ('estacionamiento', bool, False),
+    ('tipo_estacionamiento', float, 0),
+    ('utilidadDeseada', float, 20.0),
+    ('correrSimulacion', bool, False),
+    ('iva_percent', float, 0.16),
+)
+
+
+def _parse_field(key: str, convert, default) -> Callable[[Dict[str, Any]], Any]:
+    return lambda data: convert(data.get(key, default))
+
+
+def _parse_param(key: str) -> Callable[[Dict[str, Any]], Any]:
+    # Missing parameters fall back to DEFAULT_PARAMS, as in the helpers
+    return lambda data: data.get('parameters', {}).get(key, DEFAULT_PARAMS[key])
+
+
+def _parse_delegacion(data: Dict[str, Any]) -> List[str]:
+    delegacion = data.get('delegacion', [])
+    if isinstance(delegacion, str): delegacion = [delegacion]
+    return delegacion
+
+
+def _parse_distrito(data: Dict[str, Any]) -> List[float]:
+    Distrito = data.get('Distrito', [])
+    if isinstance(Distrito, (int, float)): Distrito = [Distrito]
+    return Distrito
+
+
+def _parse_ciudad(data: Dict[str, Any]) -> str:
+    return data.get('ciudad') or ''
+
+
+def _parse_distrito_zona(data: Dict[str, Any]) -> List[str]:
+    zonas = data.get('distrito_zona') or []
+    if isinstance(zonas, str): zonas = [zonas]
+    return zonas
+
+
+def _parse_parking_rules(data: Dict[str, Any]) -> ParkingRules:
+    return data.get('parking_rules') or _parking_rules
+
+
+# Leaf value -> (request field it comes from, parser)
+MODEL_LEAVES: Dict[str, Tuple[str, Callable[[Dict[str, Any]], Any]]] = {
+    key: (key, _parse_field(key, convert, default)) for key, convert, default in MODEL_INPUTS
+}
+MODEL_LEAVES['delegacion'] = ('delegacion', _parse_delegacion)
+MODEL_LEAVES['Distrito'] = ('Distrito', _parse_distrito)
+MODEL_LEAVES['ciudad'] = ('ciudad', _parse_ciudad)
+MODEL_LEAVES['distrito_zona'] = ('distrito_zona', _parse_distrito_zona)
+MODEL_LEAVES['parking_rules'] = ('parking_rules', _parse_parking_rules)
+MODEL_LEAVES.update({key: ('parameters', _parse_param(key)) for key in DEFAULT_PARAMS})
+
+
+class ModelNode(NamedTuple):
+    name: str
+    fn: Callable[..., tuple]
+    inputs: Tuple[str, ...]
+    outputs: Tuple[str, ...]
+    formula: str  # section of MATHEMATICAL_FORMULAS.md
+    args: Callable[[Dict[str, Any]], tuple]  # values -> positional arguments of fn
+
+
+def _node(name: str, fn: Callable[..., tuple], outputs: Tuple[str, ...], formula: str) -> ModelNode:
+    code = fn.__code__
+    inputs = code.co_varnames[:code.co_argcount]
+    # Every node reads at least two values, so itemgetter always returns a tuple
+    assert len(inputs) > 1, name
+    return ModelNode(name, fn, inputs, outputs, formula, itemgetter(*inputs))
+
+
+def _land(area_terreno, valor_terreno):
+    return (area_terreno * valor_terreno,)
+
+
+def _regulatory(area_terreno, COS, CUS, CAS, area_retiros):
+    reg = calculate_regulatory_areas(area_terreno, COS, CUS, CAS, area_retiros)
+    return reg['cos_area'], reg['cus_area'], reg['cas_area'], reg['net_area']
+
+
+def _demolition(demolicion, area_demolicion, area_terreno,
+                COST_DEMOLITION_M2, COST_LICENSE_M2, COST_WASTE_PERCENT):
+    if not demolicion:
+        return 0.0, 0.0, 0.0, 0.0
+    dem_cost_only = area_demolicion * COST_DEMOLITION_M2
+    lic_cost = area_terreno * COST_LICENSE_M2
+    # NOTE: COST_WASTE_PERCENT is applied per m2 of land, as in NoNA.py
+    res_cost = area_terreno * COST_WASTE_PERCENT
+    return dem_cost_only, lic_cost, res_cost, dem_cost_only + lic_cost + res_cost
+
+
+def _mixed_use(usos_mixtos, num_locales, cos_area, costo_local_m2):
+    mix = calculate_mixed_use(usos_mixtos, num_locales, cos_area, costo_local_m2)
+    return mix['area_local'], mix['area_comercio'], mix['ingreso_total']
+
+
+def _parking(estacionamiento, n_viviendas, cos_area, cus_area, areaCirculacionPorcentaje,
+             delegacion, Distrito, tipo_estacionamiento, PARKING_M2_PER_SPOT, PARKING_DRIVEWAY_FACTOR,
+             ciudad, distrito_zona, parking_rules):
+    area_circulacion = cus_area * areaCirculacionPorcentaje
+    park = calculate_parking(
+        estacionamiento, n_viviendas, cos_area, area_circulacion,
+        delegacion, Distrito, tipo_estacionamiento,
+        {'PARKING_M2_PER_SPOT': PARKING_M2_PER_SPOT, 'PARKING_DRIVEWAY_FACTOR': PARKING_DRIVEWAY_FACTOR},
+        parking_rules, ciudad, distrito_zona
+    )
+    details = park['details']
+    return (
+        area_circulacion, park['cost'], park['area'],
+        sum(details['cajones_total']) if details else 0,
+        sum(details['cajones_vivienda']) if details else 0,
+        sum(details['cajones_comercio']) if details else 0,
+        tuple(park['unknown']),
+    )
+
+
+def _direct_costs(cus_area, costoMetroConstruccion, total_dem_cost):
+    base_construction = cus_area * costoMetroConstruccion
+    return base_construction, base_construction + total_dem_cost
+
+
+def _income(cus_area, area_comercio, parking_area, Costo_de_venta_m2, ingreso_ventas_locales):
+    area_venta = cus_area - (area_comercio + parking_area)
+    ingreso_vivienda = area_venta * Costo_de_venta_m2
+    return area_venta, ingreso_vivienda, ingreso_vivienda + ingreso_ventas_locales
+
+
+def _indirects(costo_directo, ingreso_inicial, PCT_HONORARIOS, PCT_LEGALES, PCT_ADM, PCT_FIN, PCT_COM):
+    honorarios = costo_directo * (PCT_HONORARIOS/100.0)
+    legales = ingreso_inicial * (PCT_LEGALES/100.0)
+    administrativos = ingreso_inicial * (PCT_ADM/100.0)
+    financieros = ingreso_inicial * (PCT_FIN/100.0)
+    comerciales = ingreso_inicial * (PCT_COM/100.0)
+    total = honorarios + legales + administrativos + financieros + comerciales
+    return honorarios, legales, administrativos, financieros, comerciales, total
+
+
+def _iva(valor_terreno_total, costo_directo, costo_indirecto, parking_cost, iva_percent):
+    # Base for IVA: Construction Directs + Indirects + Parking Cost
+    base_construction_total = costo_directo + costo_indirecto + parking_cost
+    monto_iva = base_construction_total * iva_percent
+    return monto_iva, valor_terreno_total + base_construction_total + monto_iva
+
+
+def _profit(ingreso_inicial, costo_total, ingreso_ventas_locales, correrSimulacion, utilidadDeseada):
+    ganancia_bruta = ingreso_inicial - costo_total
+    utilidad_actual = (ganancia_bruta / ingreso_inicial * 100.0) if ingreso_inicial > 0 else 0.0
+    target_rev, target_gain, target_util = ingreso_inicial, ganancia_bruta, utilidad_actual
+    if correrSimulacion:
+        target_rev, target_gain, target_util = solve_target_price(costo_total, utilidadDeseada, ingreso_inicial)
+    roi = (target_gain / costo_total * 100) if costo_total else 0
+    return utilidad_actual, target_rev, target_rev - ingreso_ventas_locales, target_util, target_gain, roi
+
+
+def _unit_metrics(costo_total, n_viviendas, area_venta_vivienda, cus_area):
+    costo_por_departamento = costo_total / n_viviendas if n_viviendas > 0 else 0.0
+    eficiencia = ((area_venta_vivienda / cus_area) * 100) if cus_area else 0
+    return costo_por_departamento, eficiencia
+
+
+MODEL_NODES: Tuple[ModelNode, ...] = (
+    _node('land', _land, ('valor_terreno_total',), '1. Métricas del Terreno'),
+    _node('regulatory', _regulatory, ('cos_area', 'cus_area', 'cas_area', 'net_area'),
+          '2. Normativa y Áreas Permitidas'),
+    _node('demolition', _demolition, ('dem_cost_only', 'lic_cost', 'res_cost', 'total_dem_cost'),
+          '3. Costos de Demolición y Preliminares'),
+    _node('mixed_use', _mixed_use, ('area_locales', 'area_comercio', 'ingreso_ventas_locales'),
+          '4. Usos Mixtos (Comercial)'),
+    _node('parking', _parking, ('area_circulacion', 'parking_cost', 'parking_area',
+                                'parking_spots', 'parking_spots_res', 'parking_spots_com', 'parking_unknown'),
+          '5. Estacionamiento'),
+    _node('direct_costs', _direct_costs, ('base_construction', 'costo_directo'),
+          '6. Costos de Construcción / Costos Directos'),
+    _node('income', _income, ('area_venta_vivienda', 'ingreso_vivienda_inicial', 'ingreso_inicial'),
+          '7. Ingresos y Utilidad / Ingreso Bruto Inicial'),
+    _node('indirects', _indirects, INDIRECT_BREAKDOWN_FIELDS + ('costo_indirecto',),
+          '6. Costos de Construcción / Costos Indirectos'),
+    _node('iva', _iva, ('monto_iva', 'costo_total'),
+          '6. Costos de Construcción / Costo Total del Proyecto'),
+    _node('profit', _profit, ('utilidad_inicial', 'ingreso_optimizado', 'ingreso_ventas_vivienda',
+                              'utilidad_optimizada', 'utilidad_monto', 'roi'),
+          '7. Ingresos y Utilidad / 8. Simulación y Optimización'),
+    _node('unit_metrics', _unit_metrics, ('costo_por_departamento', 'eficiencia'),
+          '7. Ingresos y Utilidad'),
+)
+
+
+def parse_leaves(data: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Converts a request dict into the graph's leaf values. Raises on invalid input.
+    Same result as applying every MODEL_LEAVES parser, in a single pass.
+    """
+    values = {key: convert(data.get(key, default)) for key, convert, default in MODEL_INPUTS}
+    values['delegacion'] = _parse_delegacion(data)
+    values['Distrito'] = _parse_distrito(data)
+    values['ciudad'] = _parse_ciudad(data)
+    values['distrito_zona'] = _parse_distrito_zona(data)
+    values['parking_rules'] = _parse_parking_rules(data)
+    params = data.get('parameters', {})
+    for key, default in DEFAULT_PARAMS.items():
+        values[key] = params.get(key, default)
+    return values
+
+
+def evaluate_nodes(values: Dict[str, Any]) -> Dict[str, Any]:
+    """Runs every node in order over `values` (leaves), adding their outputs in place."""
+    for node in MODEL_NODES:
+        values.update(zip(node.outputs, node.fn(*node.args(values))))
+    return values
+
+
+def assemble_raw(values: Dict[str, Any]) -> Dict[str, Any]:
+    """Builds the `raw` result dict from fully evaluated graph values."""
+    return {
+        "area_terreno": values['area_terreno'],
+        "valor_terreno": values['valor_terreno_total'],
+        "costo_unitario_terreno": values['valor_terreno'],
+
+        # Normative
+        "cos_area": values['cos_area'],
+        "cus_area": values['cus_area'],
+        "cas_area": values['cas_area'],
+        "net_area": values['net_area'],
+
+        # Demolition specifics
+        "dem_cost_only": values['dem_cost_only'],
+        "lic_cost": values['lic_cost'],
+        "res_cost": values['res_cost'],
+        "total_dem_cost": values['total_dem_cost'],
+
+        # Areas
+        "area_venta_vivienda": values['area_venta_vivienda'],
+        "area_locales": values['area_locales'],
+        "area_circulacion": values['area_circulacion'],
+        "area_comercio": values['area_comercio'],
+
+        # Costs
+        "costo_directo": values['costo_directo'],
+        "base_construction": values['base_construction'],
+        "costo_indirecto": values['costo_indirecto'],
+        "costos_indirectos_desglose": {k: values[k] for k in INDIRECT_BREAKDOWN_FIELDS},
+        "costo_total": values['costo_total'],
+        "monto_iva": values['monto_iva'],
+
+        # Income
+        "ingreso_inicial": values['ingreso_inicial'],
+        "ingreso_vivienda_inicial": values['ingreso_vivienda_inicial'],
+        "ingreso_optimizado": values['ingreso_optimizado'],
+        "ingreso_ventas_locales": values['ingreso_ventas_locales'],
+        "ingreso_ventas_vivienda": values['ingreso_ventas_vivienda'],
+
+        # Profit
+        "utilidad_inicial": values['utilidad_inicial'],
+        "utilidad_optimizada": values['utilidad_optimizada'],
+        "utilidad_monto": values['utilidad_monto'],
+        "roi": values['roi'],
+
+        # Parking
+        "parking_cost": values['parking_cost'],
+        "parking_area": values['parking_area'],
+        "parking_spots": values['parking_spots'],
+        "parking_spots_res": values['parking_spots_res'],
+        "parking_spots_com": values['parking_spots_com'],
+        "parking_unknown": list(values['parking_unknown']),
+
+        # Project
+        "n_viviendas": values['n_viviendas'],
+        "costo_por_departamento": values['costo_por_departamento'],
+        "eficiencia": values['eficiencia']
+    }
+
+
+def compute_raw(data: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Numeric core of logic.run_calculation.
+    Returns the `raw` results only; no text is formatted. Raises on invalid input.
+    """
+    return assemble_raw(evaluate_nodes(parse_leaves(data)))
+
+
+# ==============================================================================
+# BATCH (COLUMNAR) ENGINE
+# ==============================================================================
+# Every output column produced by run_calculation_batch, in the same order as
+# the scalar `raw` dict. The five indirect-cost columns are nested back under
+# 'costos_indirectos_desglose' by logic.batch_row().
+BATCH_RAW_FIELDS = (
+    'area_terreno', 'valor_terreno', 'costo_unitario_terreno',
+    'cos_area', 'cus_area', 'cas_area', 'net_area',
+    'dem_cost_only', 'lic_cost', 'res_cost', 'total_dem_cost',
+    'area_venta_vivienda', 'area_locales', 'area_circulacion', 'area_comercio',
+    'costo_directo', 'base_construction', 'costo_indirecto',
+    'honorarios', 'legales', 'administrativos', 'financieros', 'comerciales',
+    'costo_total', 'monto_iva',
+    'ingreso_inicial', 'ingreso_vivienda_inicial', 'ingreso_optimizado', 'ingreso_ventas_locales', 'ingreso_ventas_vivienda',
+    'utilidad_inicial', 'utilidad_optimizada', 'utilidad_monto', 'roi',
+    'parking_cost', 'parking_area', 'parking_spots', 'parking_spots_res', 'parking_spots_com',
+    'n_viviendas', 'costo_por_departamento', 'eficiencia'
+)
+
+# (input key, converter, default) - same request fields as the scalar model
+BATCH_INPUTS = MODEL_INPUTS
+
+
+def is_column(value: Any) -> bool:
+    """True for per-row sequences (lists, tuples, arrays, NumPy vectors)."""
+    return hasattr(value, '__len__') and not isinstance(value, (str, bytes, dict))
+
+
+def batch_length(columns: Dict[str, Any]) -> int:
+    """Infers the number of rows and checks that all columns agree."""
+    lengths = {len(v) for v in columns.values() if is_column(v)}
+    if len(lengths) > 1:
+        raise ValueError(f"Column lengths do not match: {sorted(lengths)}")
+    return lengths.pop() if lengths else 1
+
+
+def convert_column(
+    values: Any,
+    convert,
+    n: int,
+    errors: List[Optional[str]]
+) -> List[Any]:
+    """Converts one input column row by row, recording failures in `errors`."""
+    if not is_column(values):
+        try:
+            return [convert(values)] * n
+        except Exception as e:
+            msg = str(e)
+            for i in range(n):
+                if errors[i] is None:
+                    errors[i] = msg
+            return [convert(0)] * n
+
+    try:
+        return list(map(convert, values))
+    except Exception:
+        pass  # fall back to row-by-row conversion to locate the failures
+
+    out = []
+    for i, v in enumerate(values):
+        try:
+            out.append(convert(v))
+        except Exception as e:
+            if errors[i] is None:
+                errors[i] = str(e)
+            out.append(convert(0))
+    return out
+
+
+def _list_column(values: Any, n: int, scalar_types: tuple) -> List[Any]:
+    """
+    Normalizes delegacion/Distrito columns to one list per row. A missing or
+    scalar column becomes one shared list, so the per-row memos keyed on the
+    list's identity hit on every row.
+    """
+    if values is None or isinstance(values, scalar_types):
+        return [[values] if values is not None else []] * n
+    rows = []
+    for v in values:
+        if v is None:
+            v = []
+        elif isinstance(v, scalar_types):
+            v = [v]
+        rows.append(v)
+    return rows
+
+
+def _param_column(params: Dict[str, Any], key: str, n: int) -> List[float]:
+    """Broadcasts a shared parameter, or validates a per-row parameter column."""
+    value = params.get(key, DEFAULT_PARAMS[key])
+    if not is_column(value):
+        return [value] * n
+    if len(value) != n:
+        raise ValueError(f"Parameter column '{key}' has {len(value)} rows, expected {n}")
+    return [float(v) for v in value]
+
+
+def batch_columns(records: Sequence[Dict[str, Any]]) -> Dict[str, List[Any]]:
+    """Columns for run_calculation_batch from request-shaped dicts (missing keys take the defaults)."""
+    columns = {key: [r.get(key, default) for r in records] for key, _, default in BATCH_INPUTS}
+    columns['delegacion'] = [r.get('delegacion', []) for r in records]
+    columns['Distrito'] = [r.get('Distrito', []) for r in records]
+    columns['ciudad'] = [r.get('ciudad') or '' for r in records]
+    columns['distrito_zona'] = [r.get('distrito_zona') or [] for r in records]
+    return columns
+
+
+# Batch inputs holding one list per row
+LIST_INPUT_COLUMNS = ('delegacion', 'Distrito', 'distrito_zona')
+
+
+def shared_columns(record: Dict[str, Any], n: int) -> Dict[str, Any]:
+    """
+    Columns for `n` rows that all start from `record`, as batch_columns([record])
+    builds them: scalar inputs stay single values (converted once per batch) and
+    the per-row lists are one shared list. Callers overwrite the inputs they vary.
+    """
+    columns = {key: column[0] for key, column in batch_columns([record]).items()}
+    for key in LIST_INPUT_COLUMNS:
+        columns[key] = [columns[key]] * n
+    return columns
+
+
+def chunked(items: Iterable[Any], size: int) -> Iterator[List[Any]]:
+    """Consecutive lists of at most `size` items."""
+    chunk = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def run_calculation_batch(
+    columns: Dict[str, Any],
+    parameters: Optional[Dict[str, float]] = None,
+    parking_rules: Optional[ParkingRules] = None
+) -> Dict[str, Any]:
+    """
+    Columnar entry point for portfolio screening.
+
+    `columns` maps the same keys accepted by logic.run_calculation to per-row
+    sequences (lists, `array`s or NumPy vectors); scalars are broadcast to
+    every row. `delegacion`/`Distrito`/`distrito_zona` take one list (or
+    single value) per row, `ciudad` one name. `parameters` is shared by all rows; any single
+    parameter may instead be a per-row column (used by sensitivity sweeps over
+    the PCT_* indirects). `parking_rules` defaults to parking_rules().
+
+    Every stage is evaluated column-at-a-time with the exact arithmetic of the
+    scalar path, so each row matches run_calculation bit-for-bit. Rows whose
+    inputs fail are flagged in `mask` (0 = failed), carry their message in
+    `errors` and have NaN in every output column. `parking_unknown` lists,
+    per row, the delegaciones that have no parking rule.
+    """
+    n = batch_length(columns)
+    params = parameters if parameters is not None else columns.get('parameters', {}) or {}
+    errors: List[Optional[str]] = [None] * n
+
+    cols = {
+        key: convert_column(columns.get(key, default), convert, n, errors)
+        for key, convert, default in BATCH_INPUTS
+    }
+    delegaciones = _list_column(columns.get('delegacion'), n, (str,))
+    distritos = _list_column(columns.get('Distrito'), n, (int, float))
+    zonas = _list_column(columns.get('distrito_zona'), n, (str,))
+    ciudades = columns.get('ciudad') or ''
+    ciudades = [c or '' for c in ciudades] if is_column(ciudades) else [ciudades] * n
+    if len(delegaciones) != n or len(distritos) != n or len(zonas) != n or len(ciudades) != n:
+        raise ValueError("delegacion/Distrito/distrito_zona/ciudad columns must have one entry per row")
+    rules = parking_rules if parking_rules is not None else _parking_rules
+
+    area = cols['area_terreno']
+    demolicion = cols['demolicion']
+    usos_mixtos = cols['usos_mixtos']
+    num_locales = cols['num_locales']
+    n_viviendas = cols['n_viviendas']
+
+    p_dem = _param_column(params, 'COST_DEMOLITION_M2', n)
+    p_lic = _param_column(params, 'COST_LICENSE_M2', n)
+    p_res = _param_column(params, 'COST_WASTE_PERCENT', n)
+    m2_spot = _param_column(params, 'PARKING_M2_PER_SPOT', n)
+    drive_factor = _param_column(params, 'PARKING_DRIVEWAY_FACTOR', n)
+    f_hon = [p / 100.0 for p in _param_column(params, 'PCT_HONORARIOS', n)]
+    f_leg = [p / 100.0 for p in _param_column(params, 'PCT_LEGALES', n)]
+    f_adm = [p / 100.0 for p in _param_column(params, 'PCT_ADM', n)]
+    f_fin = [p / 100.0 for p in _param_column(params, 'PCT_FIN', n)]
+    f_com = [p / 100.0 for p in _param_column(params, 'PCT_COM', n)]
+
+    # 1. Land
+    valor_total = [a * v for a, v in zip(area, cols['valor_terreno'])]
+
+    # 2. Normative
+    cos_area = [a * c for a, c in zip(area, cols['COS'])]
+    cus_area = [a * c for a, c in zip(area, cols['CUS'])]
+    cas_area = [a * c for a, c in zip(area, cols['CAS'])]
+    net_area = [a - r for a, r in zip(area, cols['area_retiros'])]
+
+    # 3. Demolition
+    dem_only = [ad * p if d else 0.0 for d, ad, p in zip(demolicion, cols['area_demolicion'], p_dem)]
+    lic_cost = [a * p if d else 0.0 for d, a, p in zip(demolicion, area, p_lic)]
+    res_cost = [a * p if d else 0.0 for d, a, p in zip(demolicion, area, p_res)]
+    dem_cost = [do + lc + rc if d else 0.0 for d, do, lc, rc in zip(demolicion, dem_only, lic_cost, res_cost)]
+
+    # 4. Mixed use
+    is_mixed = [m and k > 0 for m, k in zip(usos_mixtos, num_locales)]
+    area_comercio = [c if m else 0.0 for m, c in zip(is_mixed, cos_area)]
+    area_local = [c / float(k) if m else 0.0 for m, c, k in zip(is_mixed, cos_area, num_locales)]
+    ingreso_locales = [
+        (al * p) * k if m else 0.0
+        for m, al, p, k in zip(is_mixed, area_local, cols['costo_local_m2'], num_locales)
+    ]
+
+    # 5. Parking (per-row district lists, so evaluated row by row).
+    # Rule rows are resolved once per distinct (ciudad, delegacion list,
+    # distrito_zona list), and rows with identical parking inputs (e.g. Monte
+    # Carlo or sensitivity sweeps that leave the massing untouched) reuse the
+    # first row's result.
+    area_circulacion = [c * p for c, p in zip(cus_area, cols['areaCirculacionPorcentaje'])]
+    park_cost = [0.0] * n
+    park_area = [0.0] * n
+    spots_total = [0] * n
+    spots_res = [0] * n
+    spots_com = [0] * n
+    parking_unknown: List[Tuple[str, ...]] = [()] * n
+    comercial = rules.comercial
+    rule_memo: Dict[tuple, Any] = {}
+    parking_memo: Dict[tuple, Any] = {}
+    for i in range(n):
+        if not cols['estacionamiento'][i] or errors[i] is not None:
+            continue
+        city = ciudades[i]
+        rule_key = (city, id(delegaciones[i]), id(zonas[i]))
+        rule_rows = rule_memo.get(rule_key)
+        if rule_rows is None:
+            try:
+                districts = zonas[i]
+                rule_rows = tuple(
+                    rules.find(city, dep, districts[k] if k < len(districts) else '')
+                    for k, dep in enumerate(delegaciones[i])
+                )
+            except Exception as e:
+                rule_rows = str(e)
+            rule_memo[rule_key] = rule_rows
+        if isinstance(rule_rows, str):
+            errors[i] = rule_rows
+            continue
+
+        key = (
+            rule_key, id(distritos[i]), n_viviendas[i], cos_area[i],
+            area_circulacion[i], cols['tipo_estacionamiento'][i], m2_spot[i], drive_factor[i]
+        )
+        park = parking_memo.get(key)
+        if park is None:
+            try:
+                cost_m2 = cols['tipo_estacionamiento'][i]
+                c_viv_list, c_com_list, c_tot_list, unknown = [], [], [], []
+                total_cost = 0.0
+                total_area = 0.0
+                for dep, row, fac in zip(delegaciones[i], rule_rows, distritos[i]):
+                    if row < 0:
+                        unknown.append(dep)
+                        continue
+                    c_viv = n_viviendas[i] * fac
+                    c_com = (cos_area[i] - area_circulacion[i]) / comercial[row] if cos_area[i] else 0
+                    spots = math.ceil(c_viv + c_com)
+                    p_area = spots * m2_spot[i] * drive_factor[i]
+                    total_cost += p_area * cost_m2
+                    total_area += p_area
+                    c_viv_list.append(c_viv)
+                    c_com_list.append(c_com)
+                    c_tot_list.append(spots)
+                park = (total_cost, total_area, sum(c_tot_list), sum(c_viv_list), sum(c_com_list), unknown)
+            except Exception as e:
+                park = str(e)
+            parking_memo[key] = park
+        if isinstance(park, str):
+            errors[i] = park
+            continue
+        park_cost[i], park_area[i], spots_total[i], spots_res[i], spots_com[i], unknown = park
+        parking_unknown[i] = tuple(unknown)
+
+    # 6. Costs and income
+    base_construction = [c * k for c, k in zip(cus_area, cols['costoMetroConstruccion'])]
+    costos_directos = [b + d for b, d in zip(base_construction, dem_cost)]
+    area_venta = [c - (ac + pa) for c, ac, pa in zip(cus_area, area_comercio, park_area)]
+    ingreso_vivienda = [av * p for av, p in zip(area_venta, cols['Costo_de_venta_m2'])]
+    ingreso_inicial = [iv + il for iv, il in zip(ingreso_vivienda, ingreso_locales)]
+
+    # Indirects
+    honorarios = [cd * f for cd, f in zip(costos_directos, f_hon)]
+    legales = [ib * f for ib, f in zip(ingreso_inicial, f_leg)]
+    administrativos = [ib * f for ib, f in zip(ingreso_inicial, f_adm)]
+    financieros = [ib * f for ib, f in zip(ingreso_inicial, f_fin)]
+    comerciales = [ib * f for ib, f in zip(ingreso_inicial, f_com)]
+    costos_indirectos = [
+        h + l + a + f + c
+        for h, l, a, f, c in zip(honorarios, legales, administrativos, financieros, comerciales)
+    ]
+
+    # Taxes (IVA)
+    base_total = [cd + ci + pc for cd, ci, pc in zip(costos_directos, costos_indirectos, park_cost)]
+    monto_iva = [b * iva for b, iva in zip(base_total, cols['iva_percent'])]
+    costo_total = [tv + b + iva for tv, b, iva in zip(valor_total, base_total, monto_iva)]
+
+    # 7. Simulation
+    ganancia = [ib - ct for ib, ct in zip(ingreso_inicial, costo_total)]
+    utilidad_actual = [
+        (g / ib * 100.0) if ib > 0 else 0.0 for g, ib in zip(ganancia, ingreso_inicial)
+    ]
+    target_rev = list(ingreso_inicial)
+    target_gain = list(ganancia)
+    target_util = list(utilidad_actual)
+    for i, (sim, ud) in enumerate(zip(cols['correrSimulacion'], cols['utilidadDeseada'])):
+        if sim:
+            target_rev[i], target_gain[i], target_util[i] = solve_target_price(
+                costo_total[i], ud, ingreso_inicial[i]
+            )
+
+    raw = {
+        'area_terreno': area,
+        'valor_terreno': valor_total,
+        'costo_unitario_terreno': cols['valor_terreno'],
+        'cos_area': cos_area,
+        'cus_area': cus_area,
+        'cas_area': cas_area,
+        'net_area': net_area,
+        'dem_cost_only': dem_only,
+        'lic_cost': lic_cost,
+        'res_cost': res_cost,
+        'total_dem_cost': dem_cost,
+        'area_venta_vivienda': area_venta,
+        'area_locales': area_local,
+        'area_circulacion': area_circulacion,
+        'area_comercio': area_comercio,
+        'costo_directo': costos_directos,
+        'base_construction': base_construction,
+        'costo_indirecto': costos_indirectos,
+        'honorarios': honorarios,
+        'legales': legales,
+        'administrativos': administrativos,
+        'financieros': financieros,
+        'comerciales': comerciales,
+        'costo_total': costo_total,
+        'monto_iva': monto_iva,
+        'ingreso_inicial': ingreso_inicial,
+        'ingreso_vivienda_inicial': ingreso_vivienda,
+        'ingreso_optimizado': target_rev,
+        'ingreso_ventas_locales': ingreso_locales,
+        'ingreso_ventas_vivienda': [tr - il for tr, il in zip(target_rev, ingreso_locales)],
+        'utilidad_inicial': utilidad_actual,
+        'utilidad_optimizada': target_util,
+        'utilidad_monto': target_gain,
+        'roi': [(tg / ct * 100) if ct else 0 for tg, ct in zip(target_gain, costo_total)],
+        'parking_cost': park_cost,
+        'parking_area': park_area,
+        'parking_spots': spots_total,
+        'parking_spots_res': spots_res,
+        'parking_spots_com': spots_com,
+        'n_viviendas': n_viviendas,
+        'costo_por_departamento': [
+            ct / nv if nv > 0 else 0.0 for ct, nv in zip(costo_total, n_viviendas)
+        ],
+        'eficiencia': [((av / c) * 100) if c else 0 for av, c in zip(area_venta, cus_area)],
+    }
+
+    mask = array('B', [e is None for e in errors])
+    nan = float('nan')
+    columns_out = {}
+    for key in BATCH_RAW_FIELDS:
+        col = array('d', raw[key])
+        for i, ok in enumerate(mask):
+            if not ok:
+                col[i] = nan
+        columns_out[key] = col
+
+    return {'n': n, 'raw': columns_out, 'mask': mask, 'errors': errors, 'parking_unknown': parking_unknown}
+
+
+# ==============================================================================
+# INCREMENTAL EVALUATION
+# ==============================================================================
+# A node whose outputs come out identical stops the propagation, so e.g. a new
+# Costo_de_venta_m2 reruns income, indirects, IVA, profit and unit metrics but
+# never land, regulatory, demolition or parking.
+
+class CalcState(NamedTuple):
+    data: Dict[str, Any]      # request the state was computed from
+    values: Dict[str, Any]    # every leaf and node output
+    raw: Dict[str, Any]       # same shape as compute_raw()
+    recomputed: List[str]     # nodes evaluated to produce this state
+
+
+# Request field -> leaves parsed from it ('parameters' feeds every parameter leaf)
+FIELD_LEAVES: Dict[str, List[str]] = {}
+for _leaf, (_field, _) in MODEL_LEAVES.items():
+    FIELD_LEAVES.setdefault(_field, []).append(_leaf)
+
+
+def _same(a: Any, b: Any) -> bool:
+    """Exact equality: same type and value, and 0.0 / -0.0 kept apart."""
+    if type(a) is not type(b) or a != b:
+        return False
+    return not isinstance(a, float) or math.copysign(1.0, a) == math.copysign(1.0, b)
+
+
+def evaluate(data: Dict[str, Any]) -> CalcState:
+    """Full evaluation. Raises on invalid input, like compute_raw()."""
+    values = evaluate_nodes(parse_leaves(data))
+    return CalcState(dict(data), values, assemble_raw(values), [node.name for node in MODEL_NODES])
+
+
+def update(prev: CalcState, changed_fields: Dict[str, Any]) -> CalcState:
+    """
+    Applies `changed_fields` (request keys -> new values) on top of `prev` and
+    recomputes only the affected nodes. `prev` is left untouched; the result
+    equals evaluate() on the merged request.
+    """
+    data = dict(prev.data)
+    data.update(changed_fields)
+    values = dict(prev.values)
+
+    dirty = set()
+    for field in changed_fields:
+        for leaf in FIELD_LEAVES.get(field, ()):
+            value = MODEL_LEAVES[leaf][1](data)
+            if not _same(value, values[leaf]):
+                values[leaf] = value
+                dirty.add(leaf)
+
+    recomputed = []
+    for node in MODEL_NODES:
+        if dirty.isdisjoint(node.inputs):
+            continue
+        outputs = node.fn(*node.args(values))
+        for key, value in zip(node.outputs, outputs):
+            if not _same(value, values[key]):
+                values[key] = value
+                dirty.add(key)
+        recomputed.append(node.name)
+
+    raw = assemble_raw(values) if dirty else prev.raw
+    return CalcState(data, values, raw, recomputed)
+
+
+def downstream(fields: List[str]) -> List[str]:
+    """Nodes that may have to rerun when the given request fields change."""
+    reached = {leaf for field in fields for leaf in FIELD_LEAVES.get(field, ())}
+    names = []
+    for node in MODEL_NODES:
+        if not reached.isdisjoint(node.inputs):
+            reached.update(node.outputs)
+            names.append(node.name)
+    return names
+
+
+class StateCache:
+    """
+    Last CalcState per key, least recently used dropped beyond `maxsize`.
+
+    solve() diffs the new request against the cached one and hands only the
+    fields that differ to update(), so a Grasshopper slider drag reruns the
+    nodes downstream of that slider and nothing else.
+    """
+
+    def __init__(self, maxsize: int = 256):
+        self.maxsize = maxsize
+        self._states: 'OrderedDict[Hashable, CalcState]' = OrderedDict()
+
+    def solve(self, key: Hashable, data: Dict[str, Any]) -> CalcState:
+        """State for `data`, updated from the last one stored under `key`. Raises on invalid input."""
+        prev = self._states.get(key)
+        if prev is None or not prev.data.keys() <= data.keys():
+            # First solve, or an input was unwired: nothing to diff against
+            state = evaluate(data)
+        else:
+            changed = {k: v for k, v in data.items() if k not in prev.data or not _same(v, prev.data[k])}
+            state = update(prev, changed) if changed else prev._replace(recomputed=[])
+        self._states[key] = state
+        self._states.move_to_end(key)
+        while len(self._states) > self.maxsize:
+            self._states.popitem(last=False)
+        return state
+
+    def discard(self, key: Hashable) -> None:
+        self._states.pop(key, None)
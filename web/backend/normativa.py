@@ -0,0 +1,428 @@
+"""
+NoNA Normativa
+Zoning polygons with their coefficients (COS / CUS / CAS) and an in-memory
+spatial index that resolves a point or a lot polygon to the zone that applies.
+Standard library only, like nona_core.
+
+Zones are read from GeoJSON (WGS84, [lng, lat]) or from polygon shapefiles
+(.shp + .dbf) in geographic coordinates. The index is an STR-packed R-tree
+over the zone bounding boxes; each zone splits its edges into horizontal
+bands, so a point-in-polygon test only crosses the edges of one band instead
+of the whole outline. Where zones overlap (an overlay inside a general zone)
+the smallest one wins.
+"""
+
+import json
+import math
+import os
+import struct
+from array import array
+from typing import Dict, List, Any, Tuple, Optional, Sequence, Iterable, Iterator, NamedTuple
+
+Point = Tuple[float, float]  # (x, y) = (lng, lat)
+Ring = List[Point]
+
+# Property names accepted for the zone name and the coefficients (case-insensitive)
+ZONE_NAME_KEYS = ('zona', 'clave', 'zonificacion', 'name', 'nombre')
+COEFFICIENT_KEYS = ('COS', 'CUS', 'CAS')
+
+
+class Zone(NamedTuple):
+    id: int
+    source: str
+    zona: str
+    COS: float
+    CUS: float
+    CAS: Optional[float]
+
+
+# ==============================================================================
+# READERS
+# ==============================================================================
+
+def geometry_rings(geometry: Dict[str, Any]) -> List[Ring]:
+    """Every ring (outer boundaries and holes) of a GeoJSON Polygon or MultiPolygon."""
+    kind = geometry.get('type') if isinstance(geometry, dict) else None
+    if kind == 'Polygon':
+        polygons = [geometry['coordinates']]
+    elif kind == 'MultiPolygon':
+        polygons = geometry['coordinates']
+    else:
+        raise ValueError(f"Unsupported geometry type: {kind}")
+    return [[(float(p[0]), float(p[1])) for p in ring] for polygon in polygons for ring in polygon]
+
+
+def read_geojson(data: Any) -> Iterator[Tuple[Dict[str, Any], List[Ring]]]:
+    """(properties, rings) of every polygon feature of a GeoJSON object, path or string."""
+    if isinstance(data, str):
+        if os.path.exists(data):
+            with open(data, encoding='utf-8') as f:
+                data = json.load(f)
+        else:
+            data = json.loads(data)
+    kind = data.get('type')
+    if kind == 'FeatureCollection':
+        features = data.get('features') or []
+    elif kind == 'Feature':
+        features = [data]
+    else:
+        features = [{'type': 'Feature', 'properties': {}, 'geometry': data}]
+    for feature in features:
+        if feature.get('geometry') is None:
+            continue
+        yield feature.get('properties') or {}, geometry_rings(feature['geometry'])
+
+
+def _dbf_value(raw: bytes, kind: str, encoding: str) -> Any:
+    try:
+        text = raw.decode(encoding)
+    except UnicodeDecodeError:
+        text = raw.decode('latin-1')
+    text = text.strip().rstrip('\x00')
+    if kind in 'NF':
+        try:
+            return float(text)
+        except ValueError:
+            return None
+    if kind == 'L':
+        return text[:1] in ('Y', 'y', 'T', 't') if text not in ('', '?') else None
+    return text
+
+
+def read_dbf(path: str, encoding: Optional[str] = None) -> List[Optional[Dict[str, Any]]]:
+    """Records of a dBase III table; deleted records are None."""
+    if encoding is None:
+        cpg = os.path.splitext(path)[0] + '.cpg'
+        encoding = 'utf-8'
+        if os.path.exists(cpg):
+            with open(cpg, encoding='ascii', errors='ignore') as f:
+                encoding = f.read().strip() or encoding
+    with open(path, 'rb') as f:
+        data = f.read()
+    count, header_size, record_size = struct.unpack('<4xIHH', data[:12])
+    fields = []
+    pos = 32
+    while data[pos] != 0x0D:
+        name = data[pos:pos + 11].split(b'\0', 1)[0].decode('ascii', 'replace')
+        fields.append((name, chr(data[pos + 11]), data[pos + 16]))
+        pos += 32
+    records: List[Optional[Dict[str, Any]]] = []
+    pos = header_size
+    for _ in range(count):
+        record = data[pos:pos + record_size]
+        pos += record_size
+        if record[:1] == b'*':
+            records.append(None)
+            continue
+        values, offset = {}, 1
+        for name, kind, size in fields:
+            values[name] = _dbf_value(record[offset:offset + size], kind, encoding)
+            offset += size
+        records.append(values)
+    return records
+
+
+def read_shapefile(path: str) -> Iterator[Tuple[Dict[str, Any], List[Ring]]]:
+    """
+    (properties, rings) of every polygon of a shapefile, with the attributes
+    of the .dbf next to it. Coordinates must be geographic (lng/lat): this
+    module does not reproject, so a projected .prj is rejected.
+    """
+    base = os.path.splitext(path)[0]
+    if os.path.exists(base + '.prj'):
+        with open(base + '.prj', encoding='ascii', errors='ignore') as f:
+            if f.read().lstrip().upper().startswith('PROJCS'):
+                raise ValueError(f"{path} uses a projected CRS; reproject it to WGS84 (EPSG:4326) first")
+    with open(path, 'rb') as f:
+        data = f.read()
+    if len(data) < 100 or struct.unpack('>i', data[:4])[0] != 9994:
+        raise ValueError(f"{path} is not a shapefile")
+
+    shapes: List[Optional[List[Ring]]] = []
+    pos = 100
+    while pos + 8 <= len(data):
+        size = struct.unpack('>i', data[pos + 4:pos + 8])[0] * 2
+        content = data[pos + 8:pos + 8 + size]
+        pos += 8 + size
+        shape_type = struct.unpack('<i', content[:4])[0]
+        if shape_type == 0:
+            shapes.append(None)
+            continue
+        if shape_type not in (5, 15, 25):  # Polygon, PolygonZ, PolygonM
+            raise ValueError(f"{path}: only polygon shapefiles are supported (shape type {shape_type})")
+        num_parts, num_points = struct.unpack('<2i', content[36:44])
+        parts = list(struct.unpack('<%di' % num_parts, content[44:44 + 4 * num_parts])) + [num_points]
+        start = 44 + 4 * num_parts
+        coords = struct.unpack('<%dd' % (2 * num_points), content[start:start + 16 * num_points])
+        points = list(zip(coords[0::2], coords[1::2]))
+        shapes.append([points[parts[k]:parts[k + 1]] for k in range(num_parts)])
+
+    dbf = base + '.dbf'
+    records = read_dbf(dbf) if os.path.exists(dbf) else [{} for _ in shapes]
+    for properties, rings in zip(records, shapes):
+        if properties is not None and rings:
+            yield properties, rings
+
+
+def read_features(path: str) -> Iterator[Tuple[Dict[str, Any], List[Ring]]]:
+    """read_shapefile for .shp files, read_geojson otherwise."""
+    if path.lower().endswith('.shp'):
+        return read_shapefile(path)
+    return read_geojson(path)
+
+
+def zone_values(properties: Dict[str, Any], rings: List[Ring]) -> Dict[str, Any]:
+    """
+    Stored form of one feature: zone name, coefficients and rings. COS and CUS
+    are required; CAS may be missing.
+    """
+    lower = {str(k).lower(): v for k, v in properties.items()}
+    zona = next((str(lower[k]) for k in ZONE_NAME_KEYS if lower.get(k) not in (None, '')), '')
+    values: Dict[str, Any] = {'zona': zona}
+    for key in COEFFICIENT_KEYS:
+        value = lower.get(key.lower())
+        if value in (None, ''):
+            if key != 'CAS':
+                raise ValueError(f"Zone '{zona}' has no {key}")
+            values[key.lower()] = None
+            continue
+        try:
+            values[key.lower()] = float(value)
+        except (TypeError, ValueError):
+            raise ValueError(f"Zone '{zona}': {key} is not a number ({value!r})")
+    if not any(len(ring) >= 3 for ring in rings):
+        raise ValueError(f"Zone '{zona}' has no polygon")
+    values['properties'] = properties
+    values['rings'] = [[list(p) for p in ring] for ring in rings]
+    return values
+
+
+# ==============================================================================
+# GEOMETRY
+# ==============================================================================
+
+class BandedPolygon:
+    """
+    Rings tested with the even-odd rule, which also handles holes. Edges are
+    bucketed into horizontal bands of the bounding box, so contains() only
+    looks at the edges that span the point's latitude band.
+    """
+
+    __slots__ = ('minx', 'miny', 'maxx', 'maxy', 'area', '_bands', '_band_height')
+
+    MAX_BANDS = 4096
+
+    def __init__(self, rings: Sequence[Sequence[Point]]):
+        edges = []
+        area = 0.0
+        xs, ys = [], []
+        for ring in rings:
+            n = len(ring)
+            ring_area = 0.0
+            for k in range(n):
+                x1, y1 = ring[k]
+                x2, y2 = ring[(k + 1) % n]
+                ring_area += x1 * y2 - x2 * y1
+                if y1 != y2:
+                    edges.append((x1, y1, x2, y2))
+                xs.append(x1)
+                ys.append(y1)
+            area += ring_area
+        if not xs:
+            raise ValueError("Empty polygon")
+        self.minx, self.maxx = min(xs), max(xs)
+        self.miny, self.maxy = min(ys), max(ys)
+        # Outer rings and holes wind in opposite directions in valid data, so
+        # the signed sum is the net area
+        self.area = abs(area) / 2.0
+
+        n_bands = max(1, min(len(edges) // 4, self.MAX_BANDS))
+        self._band_height = (self.maxy - self.miny) / n_bands or 1.0
+        self._bands: List[List[Tuple[float, float, float, float]]] = [[] for _ in range(n_bands)]
+        for edge in edges:
+            lo, hi = sorted((edge[1], edge[3]))
+            first = self._band(lo)
+            last = self._band(hi)
+            for b in range(first, last + 1):
+                self._bands[b].append(edge)
+
+    def _band(self, y: float) -> int:
+        b = int((y - self.miny) / self._band_height)
+        return min(max(b, 0), len(self._bands) - 1)
+
+    def contains(self, x: float, y: float) -> bool:
+        if not (self.minx <= x <= self.maxx and self.miny <= y <= self.maxy):
+            return False
+        inside = False
+        for x1, y1, x2, y2 in self._bands[self._band(y)]:
+            if (y1 > y) != (y2 > y) and x < x1 + (y - y1) * (x2 - x1) / (y2 - y1):
+                inside = not inside
+        return inside
+
+
+def interior_point(ring: Sequence[Point]) -> Point:
+    """
+    A point inside a lot outline: its area centroid, or, for concave lots
+    where the centroid falls outside, the middle of the widest inside span on
+    the centroid's latitude.
+    """
+    n = len(ring)
+    a = cx = cy = 0.0
+    for k in range(n):
+        x1, y1 = ring[k]
+        x2, y2 = ring[(k + 1) % n]
+        cross = x1 * y2 - x2 * y1
+        a += cross
+        cx += (x1 + x2) * cross
+        cy += (y1 + y2) * cross
+    if a == 0.0:
+        xs, ys = [p[0] for p in ring], [p[1] for p in ring]
+        return sum(xs) / n, sum(ys) / n
+    cx, cy = cx / (3.0 * a), cy / (3.0 * a)
+    polygon = BandedPolygon([ring])
+    if polygon.contains(cx, cy):
+        return cx, cy
+    crossings = sorted(
+        x1 + (cy - y1) * (x2 - x1) / (y2 - y1)
+        for (x1, y1), (x2, y2) in zip(ring, list(ring[1:]) + [ring[0]])
+        if (y1 > cy) != (y2 > cy)
+    )
+    spans = [(crossings[k + 1] - crossings[k], crossings[k], crossings[k + 1]) for k in range(0, len(crossings) - 1, 2)]
+    if not spans:
+        return cx, cy
+    _, left, right = max(spans)
+    return (left + right) / 2.0, cy
+
+
+# ==============================================================================
+# SPATIAL INDEX
+# ==============================================================================
+
+def _str_order(minx, miny, maxx, maxy, capacity: int) -> List[int]:
+    """Sort-Tile-Recursive order: vertical slices by x centre, each sorted by y centre."""
+    n = len(minx)
+    if not n:
+        return []
+    slices = math.ceil(math.sqrt(math.ceil(n / capacity)))
+    per_slice = slices * capacity
+    by_x = sorted(range(n), key=lambda i: minx[i] + maxx[i])
+    order: List[int] = []
+    for start in range(0, n, per_slice):
+        order.extend(sorted(by_x[start:start + per_slice], key=lambda i: miny[i] + maxy[i]))
+    return order
+
+
+class STRtree:
+    """
+    Static R-tree over bounding boxes (minx, miny, maxx, maxy), bulk-loaded
+    with Sort-Tile-Recursive packing. Level 0 holds the boxes themselves;
+    entry k of every level above covers entries [ref[k], ref[k] + capacity)
+    of the level below. query() returns the item ids whose box holds a point.
+    """
+
+    def __init__(self, boxes: Sequence[Tuple[float, float, float, float]], node_capacity: int = 10):
+        self.capacity = node_capacity
+        self.levels: List[Tuple[array, array, array, array, array]] = []
+        columns = [list(c) for c in zip(*boxes)] if boxes else [[], [], [], []]
+        refs = list(range(len(boxes)))
+        while True:
+            order = _str_order(*columns, node_capacity)
+            level = tuple(array('d', [c[i] for i in order]) for c in columns) + (array('l', [refs[i] for i in order]),)
+            self.levels.append(level)
+            n = len(order)
+            if n <= node_capacity:
+                break
+            starts = range(0, n, node_capacity)
+            columns = [
+                [min(level[0][s:s + node_capacity]) for s in starts],
+                [min(level[1][s:s + node_capacity]) for s in starts],
+                [max(level[2][s:s + node_capacity]) for s in starts],
+                [max(level[3][s:s + node_capacity]) for s in starts],
+            ]
+            refs = list(starts)
+
+    def query(self, x: float, y: float) -> List[int]:
+        return self.query_box(x, y, x, y)
+
+    def query_box(self, minx: float, miny: float, maxx: float, maxy: float) -> List[int]:
+        """Item ids whose box intersects the given box."""
+        found: List[int] = []
+        top = len(self.levels) - 1
+        stack = [(top, 0, len(self.levels[top][0]))]
+        while stack:
+            depth, start, end = stack.pop()
+            x0, y0, x1, y1, ref = self.levels[depth]
+            for k in range(start, end):
+                if x0[k] <= maxx and minx <= x1[k] and y0[k] <= maxy and miny <= y1[k]:
+                    if depth == 0:
+                        found.append(ref[k])
+                    else:
+                        below = len(self.levels[depth - 1][0])
+                        stack.append((depth - 1, ref[k], min(ref[k] + self.capacity, below)))
+        return found
+
+
+class ZoningIndex:
+    """
+    Compiled normativa: zones plus their polygons behind an STRtree.
+
+    lookup() resolves a point, lookup_polygon() a lot outline. Where zones
+    overlap, the one with the smallest area (the most specific) applies.
+    """
+
+    def __init__(self, zones: Iterable[Tuple[Zone, Sequence[Sequence[Point]]]] = (), version: int = 0):
+        self.version = version
+        self.zones: List[Zone] = []
+        self.polygons: List[BandedPolygon] = []
+        for zone, rings in zones:
+            self.zones.append(zone)
+            self.polygons.append(BandedPolygon(rings))
+        self._tree = STRtree([(p.minx, p.miny, p.maxx, p.maxy) for p in self.polygons])
+
+    def __len__(self) -> int:
+        return len(self.zones)
+
+    def _containing(self, x: float, y: float) -> List[int]:
+        polygons = self.polygons
+        hits = [i for i in self._tree.query(x, y) if polygons[i].contains(x, y)]
+        hits.sort(key=lambda i: polygons[i].area)
+        return hits
+
+    def lookup(self, lat: float, lng: float) -> Optional[Zone]:
+        """Zone at a point, or None outside every zone."""
+        hits = self._containing(lng, lat)
+        return self.zones[hits[0]] if hits else None
+
+    def lookup_many(self, points: Iterable[Tuple[float, float]]) -> List[Optional[Zone]]:
+        """lookup() for every (lat, lng) of a geocoded portfolio."""
+        return [self.lookup(lat, lng) for lat, lng in points]
+
+    def lookup_polygon(self, ring: Sequence[Point]) -> Tuple[Optional[Zone], List[Zone]]:
+        """
+        Zone of a lot outline ([lng, lat] pairs): the zone at an interior point
+        of the lot, plus every zone that holds the lot's interior point or one
+        of its corners, so a lot split between zones can be flagged.
+        """
+        ring = [(float(p[0]), float(p[1])) for p in ring]
+        if len(ring) < 3:
+            raise ValueError("A lot polygon needs at least 3 points")
+        x, y = interior_point(ring)
+        hits = self._containing(x, y)
+        touched = list(hits)
+        for px, py in ring:
+            touched.extend(i for i in self._containing(px, py) if i not in touched)
+        return (self.zones[hits[0]] if hits else None), [self.zones[i] for i in touched]
+
+
+EMPTY_INDEX = ZoningIndex()
+_zoning_index = EMPTY_INDEX
+
+
+def zoning_index() -> ZoningIndex:
+    """Index used to fill in COS/CUS/CAS from a request's location."""
+    return _zoning_index
+
+
+def set_zoning_index(index: ZoningIndex) -> None:
+    global _zoning_index
+    _zoning_index = index
@@ -0,0 +1,142 @@
+"""
+NoNA Massing Optimizer
+Searches n_viviendas, COS / CUS (as fractions of the regulatory caps),
+num_locales and the parking option for the schemes on the Pareto front of
+profit (max), total cost (min) and units (max).
+
+Candidates that cannot be feasible are pruned from the area bounds before any
+evaluation; the rest are evaluated in a single run_calculation_batch pass.
+"""
+
+import itertools
+from typing import Dict, List, Any, Optional, Sequence
+
+import logic
+
+DEFAULT_COS_LEVELS = (0.5, 0.75, 1.0)
+DEFAULT_CUS_LEVELS = (0.5, 0.6, 0.7, 0.8, 0.9, 1.0)
+DEFAULT_MIN_UNIT_AREA = 40.0
+MAX_CANDIDATES = 200_000
+
+
+def pareto_front(points: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Non-dominated points for (utilidad max, costo_total min, n_viviendas max)."""
+    ordered = sorted(points, key=lambda p: (-p['utilidad'], p['costo_total'], -p['n_viviendas']))
+    front: List[Dict[str, Any]] = []
+    for p in ordered:
+        dominated = False
+        for q in front:
+            # q has utilidad >= p by ordering
+            if q['costo_total'] <= p['costo_total'] and q['n_viviendas'] >= p['n_viviendas'] and (
+                q['utilidad'] > p['utilidad'] or q['costo_total'] < p['costo_total']
+                or q['n_viviendas'] > p['n_viviendas']
+            ):
+                dominated = True
+                break
+        if not dominated:
+            front.append(p)
+    return front
+
+
+def optimize_massing(
+    data: Dict[str, Any],
+    params: Dict[str, float],
+    n_viviendas_range: Sequence[int],
+    cos_levels: Sequence[float] = DEFAULT_COS_LEVELS,
+    cus_levels: Sequence[float] = DEFAULT_CUS_LEVELS,
+    num_locales_options: Sequence[int] = (0,),
+    parking_options: Optional[Sequence[bool]] = None,
+    min_unit_area: float = DEFAULT_MIN_UNIT_AREA
+) -> Dict[str, Any]:
+    """
+    `data` carries the lot and the regulatory caps (its COS / CUS / CAS);
+    levels are fractions of those caps in (0, 1]. num_locales 0 means no
+    mixed use. Units must average at least `min_unit_area` m2 sellable.
+    """
+    for level in list(cos_levels) + list(cus_levels):
+        if not 0 < level <= 1:
+            raise ValueError("COS/CUS levels must be fractions of the cap in (0, 1]")
+    if min_unit_area <= 0:
+        raise ValueError("min_unit_area must be positive")
+    n_values = [n for n in n_viviendas_range if n > 0]
+    if not n_values:
+        raise ValueError("n_viviendas range is empty")
+    if parking_options is None:
+        parking_options = (bool(data.get('estacionamiento', False)),)
+
+    area = float(data.get('area_terreno', 0))
+    cos_cap = float(data.get('COS', 0))
+    cus_cap = float(data.get('CUS', 0))
+    cas = float(data.get('CAS', 0))
+    retiros = float(data.get('area_retiros', 0))
+
+    total = len(n_values) * len(cos_levels) * len(cus_levels) * len(num_locales_options) * len(parking_options)
+    if total > MAX_CANDIDATES:
+        raise ValueError(f"Search space has {total} candidates (max {MAX_CANDIDATES})")
+
+    candidates = []
+    pruned = 0
+    for cos_f, cus_f, locales, parking in itertools.product(cos_levels, cus_levels, num_locales_options, parking_options):
+        cos = cos_cap * cos_f
+        cus = cus_cap * cus_f
+        reg = logic.calculate_regulatory_areas(area, cos, cus, cas, retiros)
+        # Built area can never be smaller than the footprint, and footprint plus
+        # the required open (CAS) area must fit on the lot
+        if reg['cus_area'] < reg['cos_area'] or reg['cos_area'] + reg['cas_area'] > area:
+            pruned += len(n_values)
+            continue
+        # Upper bound on sellable housing area (before parking is deducted)
+        sellable = reg['cus_area'] - (reg['cos_area'] if locales > 0 else 0.0)
+        max_units = sellable / min_unit_area
+        for n in n_values:
+            if n > max_units:
+                pruned += 1
+                continue
+            candidates.append((n, cos, cus, locales, parking))
+
+    result: Dict[str, Any] = {'candidates': total, 'pruned': pruned, 'evaluated': len(candidates)}
+    if not candidates:
+        return dict(result, infeasible=0, best=None, pareto=[])
+
+    n = len(candidates)
+    columns = logic.shared_columns(data, n)
+    columns['correrSimulacion'] = False
+    columns['n_viviendas'] = [c[0] for c in candidates]
+    columns['COS'] = [c[1] for c in candidates]
+    columns['CUS'] = [c[2] for c in candidates]
+    columns['num_locales'] = [c[3] for c in candidates]
+    columns['usos_mixtos'] = [c[3] > 0 for c in candidates]
+    columns['estacionamiento'] = [c[4] for c in candidates]
+
+    batch = logic.run_calculation_batch(columns, params)
+    raw = batch['raw']
+
+    feasible = []
+    infeasible = 0
+    for i, (units, cos, cus, locales, parking) in enumerate(candidates):
+        area_venta = raw['area_venta_vivienda'][i]
+        if not batch['mask'][i] or area_venta / units < min_unit_area:
+            infeasible += 1
+            continue
+        feasible.append({
+            'n_viviendas': units,
+            'COS': cos,
+            'CUS': cus,
+            'num_locales': locales,
+            'usos_mixtos': locales > 0,
+            'estacionamiento': parking,
+            'utilidad': raw['utilidad_monto'][i],
+            'margen': raw['utilidad_inicial'][i],
+            'roi': raw['roi'][i],
+            'costo_total': raw['costo_total'][i],
+            'area_venta_vivienda': area_venta,
+            'area_promedio_vivienda': area_venta / units,
+        })
+
+    front = pareto_front(feasible)
+    return dict(
+        result,
+        infeasible=infeasible,
+        best=front[0] if front else None,
+        pareto=front
+    )
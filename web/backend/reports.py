@@ -0,0 +1,248 @@
+"""
+NoNA Portfolio Reports
+Multi-scenario Excel export: one sheet per scenario plus a summary sheet.
+
+The workbook is built in openpyxl write-only mode, so every sheet is streamed
+to its own temporary file as rows are appended and closed as soon as it is
+complete. Cells reference shared named styles instead of carrying their own
+Font / PatternFill objects. The finished file is spooled and sent in chunks,
+so memory stays flat whatever the number of scenarios.
+"""
+
+import re
+import tempfile
+from typing import Dict, List, Any, Iterable, Iterator, Optional, Tuple, IO
+
+import openpyxl
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import NamedStyle, Font, PatternFill, Alignment, Border, Side
+
+import logic
+from logic import BRAND_BLUE, BRAND_SLATE, LIGHT_GRAY, MEDIUM_GRAY, GREEN_ACCENT
+
+CHUNK_ROWS = 1000
+SPOOL_MAX_BYTES = 16 * 1024 * 1024
+CHUNK_SIZE = 64 * 1024
+
+# Number format per value kind; 'pct' values are raw percentages (20.0 -> 20%)
+NUMBER_FORMATS = {
+    'money': logic.MONEY_FORMAT,
+    'area': logic.AREA_FORMAT,
+    'pct': logic.PCT_FORMAT,
+    'number': 'General',
+}
+
+# (section title, ((label, raw key, kind, highlight), ...))
+REPORT_SECTIONS = (
+    ("1. Resumen Ejecutivo (KPIs)", (
+        ("Utilidad Final Meta", 'utilidad_optimizada', 'pct', True),
+        ("Costo Total del Proyecto", 'costo_total', 'money', False),
+        ("Área Vendible Total", 'area_venta_vivienda', 'area', False),
+        ("Costo por Depto", 'costo_por_departamento', 'money', False),
+        ("ROI", 'roi', 'pct', False),
+    )),
+    ("2. Terreno y Demolición", (
+        ("Área del Terreno", 'area_terreno', 'area', False),
+        ("Valor Total del Terreno", 'valor_terreno', 'money', False),
+        ("Costo Total Demolición", 'total_dem_cost', 'money', False),
+    )),
+    ("3. Normativa y Áreas", (
+        ("Área COS (Desplante)", 'cos_area', 'area', False),
+        ("Área CUS (Cons. Max)", 'cus_area', 'area', False),
+        ("Área CAS (Área Libre)", 'cas_area', 'area', False),
+    )),
+    ("4. Desglose de Costos de Construcción", (
+        ("Total Costos Directos", 'costo_directo', 'money', False),
+        ("Total Costos Indirectos", 'costo_indirecto', 'money', False),
+        ("Costo de Estacionamiento", 'parking_cost', 'money', False),
+        ("Monto de IVA Estimado", 'monto_iva', 'money', False),
+        ("COSTO TOTAL DEL PROYECTO", 'costo_total', 'money', True),
+    )),
+    ("5. Análisis Financiero", (
+        ("Ingreso por Ventas (Comercio)", 'ingreso_ventas_locales', 'money', False),
+        ("Ingreso por Ventas (Vivienda)", 'ingreso_ventas_vivienda', 'money', False),
+        ("Ingreso Total Optimizado", 'ingreso_optimizado', 'money', True),
+        ("Ganancia Neta", 'utilidad_monto', 'money', True),
+    )),
+)
+
+# (header, raw key, kind) - one summary row per scenario
+SUMMARY_COLUMNS = (
+    ("Utilidad %", 'utilidad_optimizada', 'pct'),
+    ("Ganancia Neta", 'utilidad_monto', 'money'),
+    ("ROI", 'roi', 'pct'),
+    ("Costo Total", 'costo_total', 'money'),
+    ("Ingreso Total", 'ingreso_optimizado', 'money'),
+    ("Área Vendible", 'area_venta_vivienda', 'area'),
+    ("Viviendas", 'n_viviendas', 'number'),
+)
+
+
+def _style(name: str, font: Font, fill: Optional[PatternFill] = None, border: Optional[Border] = None,
+           alignment: Optional[Alignment] = None, number_format: str = 'General') -> NamedStyle:
+    style = NamedStyle(name=name, font=font, number_format=number_format)
+    if fill is not None:
+        style.fill = fill
+    if border is not None:
+        style.border = border
+    if alignment is not None:
+        style.alignment = alignment
+    return style
+
+
+def build_styles() -> List[NamedStyle]:
+    """Every named style used by the report; registered once per workbook."""
+    zebra = PatternFill(start_color=LIGHT_GRAY, end_color=LIGHT_GRAY, fill_type="solid")
+    thin_bottom = Border(bottom=Side(style='thin', color=MEDIUM_GRAY))
+    styles = [
+        _style('nona_title', Font(color=BRAND_SLATE, bold=True, size=18)),
+        _style('nona_subtitle', Font(color=BRAND_BLUE, bold=True, size=14)),
+        _style('nona_caption', Font(color="64748B", italic=True, size=12)),
+        _style('nona_header', Font(color="FFFFFF", bold=True, size=12),
+               fill=PatternFill(start_color=BRAND_BLUE, end_color=BRAND_BLUE, fill_type="solid"),
+               alignment=Alignment(horizontal="center")),
+        _style('nona_section', Font(color=BRAND_BLUE, bold=True, size=11),
+               border=Border(bottom=Side(style='thick', color=BRAND_BLUE))),
+        _style('nona_error', Font(color="DC2626", italic=True)),
+    ]
+    for striped in (False, True):
+        suffix = '_zebra' if striped else ''
+        fill = zebra if striped else None
+        for highlight in (False, True):
+            hl = '_hl' if highlight else ''
+            styles.append(_style(
+                f'nona_label{hl}{suffix}', Font(bold=True, color=BRAND_SLATE if highlight else "334155"),
+                fill=fill, border=thin_bottom
+            ))
+            for kind, number_format in NUMBER_FORMATS.items():
+                styles.append(_style(
+                    f'nona_{kind}{hl}{suffix}', Font(bold=highlight, color=GREEN_ACCENT if highlight else "475569"),
+                    fill=fill, border=thin_bottom, alignment=Alignment(horizontal="right"),
+                    number_format=number_format
+                ))
+    return styles
+
+
+def _cell(ws, value: Any, style: str) -> WriteOnlyCell:
+    cell = WriteOnlyCell(ws, value)
+    cell.style = style
+    return cell
+
+
+def _value(raw: Dict[str, Any], key: str, kind: str) -> Any:
+    value = raw.get(key, 0) or 0
+    return value / 100.0 if kind == 'pct' else value
+
+
+_INVALID_TITLE_CHARS = re.compile(r'[\[\]:*?/\\]')
+
+
+def sheet_title(index: int, name: str) -> str:
+    """Unique, Excel-safe sheet title (31 chars max) prefixed with the scenario number."""
+    return f"{index} {_INVALID_TITLE_CHARS.sub(' ', name or '')}".strip()[:31]
+
+
+def _write_scenario_sheet(wb, title: str, name: str, result: Dict[str, Any]) -> None:
+    ws = wb.create_sheet(title)
+    ws.sheet_view.showGridLines = False
+    ws.column_dimensions['A'].width = 42
+    ws.column_dimensions['B'].width = 28
+
+    ws.append([_cell(ws, name, 'nona_title')])
+    ws.append([_cell(ws, "Reporte Financiero y Arquitectónico", 'nona_caption')])
+    ws.append([])
+    if "error" in result:
+        ws.append([_cell(ws, "Error en Cálculo", 'nona_label'), _cell(ws, str(result["error"]), 'nona_error')])
+        ws.close()
+        return
+
+    raw = result.get("raw", {})
+    ws.append([_cell(ws, "Métrica", 'nona_header'), _cell(ws, "Valor", 'nona_header')])
+    row = 5
+    for title_text, rows in REPORT_SECTIONS:
+        ws.append([])
+        ws.append([_cell(ws, title_text.upper(), 'nona_section'), _cell(ws, "", 'nona_section')])
+        row += 2
+        for label, key, kind, highlight in rows:
+            suffix = ('_hl' if highlight else '') + ('_zebra' if row % 2 == 0 else '')
+            ws.append([
+                _cell(ws, label, f'nona_label{suffix}'),
+                _cell(ws, _value(raw, key, kind), f'nona_{kind}{suffix}'),
+            ])
+            row += 1
+    # Release the sheet's temporary file handle now rather than at save time
+    ws.close()
+
+
+def write_portfolio_workbook(scenarios: Iterable[Tuple[str, Dict[str, Any]]], fileobj: IO[bytes]) -> int:
+    """
+    Writes the portfolio workbook for `scenarios` ((name, result) pairs, where
+    result is a run_calculation-style {'raw': ...} or {'error': ...}) into
+    `fileobj`. Returns the number of scenarios written.
+    """
+    wb = openpyxl.Workbook(write_only=True)
+    for style in build_styles():
+        wb.add_named_style(style)
+
+    summary = wb.create_sheet("Resumen")
+    summary.sheet_view.showGridLines = False
+    summary.column_dimensions['A'].width = 36
+    summary.freeze_panes = 'B3'
+    summary.append([_cell(summary, "NoNA", 'nona_title'), _cell(summary, "Resumen de Portafolio", 'nona_subtitle')])
+    summary.append([_cell(summary, header, 'nona_header') for header in ("Escenario",) + tuple(c[0] for c in SUMMARY_COLUMNS)])
+
+    count = 0
+    for count, (name, result) in enumerate(scenarios, start=1):
+        title = sheet_title(count, name)
+        _write_scenario_sheet(wb, title, name, result)
+
+        suffix = '_zebra' if count % 2 == 0 else ''
+        cells = [_cell(summary, name, f'nona_label{suffix}')]
+        if "error" in result:
+            cells.append(_cell(summary, str(result["error"]), 'nona_error'))
+        else:
+            raw = result.get("raw", {})
+            cells.extend(_cell(summary, _value(raw, key, kind), f'nona_{kind}{suffix}') for _, key, kind in SUMMARY_COLUMNS)
+        summary.append(cells)
+
+    wb.save(fileobj)
+    return count
+
+
+def scenario_results(
+    scenarios: Iterable[Any],
+    params: Dict[str, float],
+    chunk_size: int = CHUNK_ROWS,
+    parking_rules: Optional[logic.ParkingRules] = None
+) -> Iterator[Tuple[str, Dict[str, Any]]]:
+    """(name, result) per stored scenario, evaluated in run_calculation_batch chunks."""
+    for chunk in logic.chunked(scenarios, chunk_size):
+        batch = logic.run_calculation_batch(
+            logic.batch_columns([s.input_data or {} for s in chunk]), params, parking_rules
+        )
+        for row, s in enumerate(chunk):
+            yield s.name, logic.batch_row(batch, row)
+
+
+def spool_portfolio(scenarios: Iterable[Tuple[str, Dict[str, Any]]]) -> IO[bytes]:
+    """Builds the workbook into a spooled temporary file, rewound for reading."""
+    spool = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_BYTES)
+    try:
+        write_portfolio_workbook(scenarios, spool)
+    except Exception:
+        spool.close()
+        raise
+    spool.seek(0)
+    return spool
+
+
+def iter_file(fileobj: IO[bytes], chunk_size: int = CHUNK_SIZE) -> Iterator[bytes]:
+    """Yields the file in chunks and closes it when done."""
+    try:
+        while True:
+            chunk = fileobj.read(chunk_size)
+            if not chunk:
+                break
+            yield chunk
+    finally:
+        fileobj.close()
@@ -0,0 +1,192 @@
+"""
+NoNA Residual Land Value
+Inverse of run_calculation: the maximum land value per m2 (valor_terreno)
+that still reaches the desired margin (utilidadDeseada).
+
+Land value only enters the model through the land cost, which is added to the
+total cost outside the IVA base, so
+
+    costo_total(v) = area_terreno * v + K
+
+and the margin target has a closed form:
+
+    v = (ingreso * (1 - utilidadDeseada / 100) - K) / area_terreno
+
+Each closed-form answer is verified by re-evaluating the model; if the
+structure ever stops being linear in v the solver falls back to a bracketed
+Brent root search on the full model.
+"""
+
+import math
+from typing import Dict, List, Any, Callable, Optional
+
+import logic
+import nona_core
+
+# Accepted margin error (percentage points) when verifying the closed form
+MARGIN_TOLERANCE = 1e-6
+
+
+def brentq(
+    f: Callable[[float], float],
+    a: float,
+    b: float,
+    xtol: float = 1e-9,
+    maxiter: int = 100
+) -> float:
+    """Brent's method for a root of f in [a, b] (f(a) and f(b) must differ in sign)."""
+    fa, fb = f(a), f(b)
+    if fa == 0.0:
+        return a
+    if fb == 0.0:
+        return b
+    if (fa > 0) == (fb > 0):
+        raise ValueError("Root is not bracketed")
+    if abs(fa) < abs(fb):
+        a, b, fa, fb = b, a, fb, fa
+    c, fc = a, fa
+    d = e = b - a
+    for _ in range(maxiter):
+        if fb == 0.0:
+            return b
+        if (fb > 0) == (fc > 0):
+            c, fc = a, fa
+            d = e = b - a
+        if abs(fc) < abs(fb):
+            a, b, c = b, c, b
+            fa, fb, fc = fb, fc, fb
+        tol = 2.0 * 2.2e-16 * abs(b) + 0.5 * xtol
+        m = 0.5 * (c - b)
+        if abs(m) <= tol:
+            return b
+        if abs(e) >= tol and abs(fa) > abs(fb):
+            s = fb / fa
+            if a == c:
+                # Secant step
+                p = 2.0 * m * s
+                q = 1.0 - s
+            else:
+                # Inverse quadratic interpolation
+                q = fa / fc
+                r = fb / fc
+                p = s * (2.0 * m * q * (q - r) - (b - a) * (r - 1.0))
+                q = (q - 1.0) * (r - 1.0) * (s - 1.0)
+            if p > 0:
+                q = -q
+            else:
+                p = -p
+            if 2.0 * p < min(3.0 * m * q - abs(tol * q), abs(e * q)):
+                e, d = d, p / q
+            else:
+                d = e = m
+        else:
+            d = e = m
+        a, fa = b, fb
+        b += d if abs(d) > tol else math.copysign(tol, m)
+        fb = f(b)
+    return b
+
+
+def _margin(data: Dict[str, Any], valor_terreno: float) -> float:
+    raw = logic.compute_raw(dict(data, valor_terreno=valor_terreno, correrSimulacion=False))
+    return raw['utilidad_inicial']
+
+
+def _solve_bracketed(data: Dict[str, Any], target: float, start: float) -> float:
+    """Brent fallback: bracket the root upward from v=0 and solve on the full model."""
+    f = lambda v: _margin(data, v) - target
+    hi = max(start, 1.0)
+    for _ in range(200):
+        if f(hi) < 0:
+            return brentq(f, 0.0, hi)
+        hi *= 2.0
+    raise ValueError("Could not bracket the residual land value")
+
+
+def _result(area: float, value: float, margin: float, method: str) -> Dict[str, Any]:
+    return {
+        'valor_terreno_m2': value,
+        'valor_terreno_total': area * value,
+        'utilidad': margin,
+        'feasible': value >= 0.0,
+        'method': method,
+    }
+
+
+def _finish_row(
+    data: Dict[str, Any],
+    area: float,
+    revenue: float,
+    fixed_cost: float,
+    target: float,
+    check: Optional[float] = None
+) -> Dict[str, Any]:
+    """Closed form + verification for one row; `check` is the margin at the candidate if known."""
+    if area <= 0:
+        raise ValueError("area_terreno must be positive")
+    if revenue <= 0:
+        raise ValueError("Project has no revenue; margin is undefined")
+
+    value = (revenue * (1.0 - target / 100.0) - fixed_cost) / area
+    if value < 0:
+        # Even free land misses the target: report the (negative) gap per m2 and
+        # the best achievable margin, i.e. the one at zero land cost
+        return _result(area, value, (revenue - fixed_cost) / revenue * 100.0, 'closed_form')
+
+    margin = check if check is not None else _margin(data, value)
+    if abs(margin - target) <= MARGIN_TOLERANCE:
+        return _result(area, value, margin, 'closed_form')
+
+    value = _solve_bracketed(data, target, value)
+    return _result(area, value, _margin(data, value), 'brent')
+
+
+def solve_residual_land_value(data: Dict[str, Any]) -> Dict[str, Any]:
+    """Residual land value per m2 for one request (uses data['utilidadDeseada'])."""
+    target = float(data.get('utilidadDeseada', 20.0))
+    raw = logic.compute_raw(dict(data, valor_terreno=0.0, correrSimulacion=False))
+    return _finish_row(data, raw['area_terreno'], raw['ingreso_inicial'], raw['costo_total'], target)
+
+
+def solve_residual_land_value_batch(
+    columns: Dict[str, Any],
+    parameters: Optional[Dict[str, float]] = None
+) -> List[Dict[str, Any]]:
+    """
+    Portfolio form. Two run_calculation_batch passes (land at zero, then at
+    the closed-form candidate) solve and verify every row; only rows that fail
+    verification fall back to the scalar Brent search.
+    """
+    n = nona_core.batch_length(columns)
+    params = parameters if parameters is not None else columns.get('parameters', {}) or {}
+    base = dict(columns, valor_terreno=0.0, correrSimulacion=False)
+    first = logic.run_calculation_batch(base, params)
+    raw = first['raw']
+
+    # Conversion failures are already flagged in first['mask']
+    targets = nona_core.convert_column(columns.get('utilidadDeseada', 20.0), float, n, [None] * n)
+
+    candidates = []
+    for i in range(n):
+        area, revenue = raw['area_terreno'][i], raw['ingreso_inicial'][i]
+        if first['mask'][i] and area > 0 and revenue > 0:
+            candidates.append((revenue * (1.0 - targets[i] / 100.0) - raw['costo_total'][i]) / area)
+        else:
+            candidates.append(0.0)
+    check = logic.run_calculation_batch(dict(base, valor_terreno=candidates), params)['raw']['utilidad_inicial']
+
+    results = []
+    for i in range(n):
+        if not first['mask'][i]:
+            results.append({'error': first['errors'][i]})
+            continue
+        row = {key: (value[i] if nona_core.is_column(value) else value) for key, value in columns.items()}
+        row['parameters'] = params
+        try:
+            results.append(_finish_row(
+                row, raw['area_terreno'][i], raw['ingreso_inicial'][i], raw['costo_total'][i],
+                targets[i], check[i]
+            ))
+        except ValueError as e:
+            results.append({'error': str(e)})
+    return results
@@ -5,6 +5,7 @@ try:
     import uvicorn
     import webbrowser
     import threading
+    import multiprocessing
     import time
     from main import app
 
@@ -13,6 +14,8 @@ try:
         webbrowser.open("http://127.0.0.1:8000/dashboard")
 
     if __name__ == "__main__":
+        # Required for the process pools (simulation, export jobs, reports) in the frozen executable
+        multiprocessing.freeze_support()
         threading.Thread(target=open_browser, daemon=True).start()
         uvicorn.run(app, host="127.0.0.1", port=8000)
 except Exception as e:
@@ -0,0 +1,330 @@
+"""
+NoNA Run Log
+Design-space history for the Grasshopper component (NoNA.py): one row per
+solve, appended to <name>.csv next to a compact binary sidecar <name>.runlog
+that replays without parsing text. Standard library only, like nona_core.
+
+Slider drags solve many times a second, so rows are buffered and written at
+most once per `delay` seconds, on a timer thread instead of the canvas
+thread. The history files are only ever appended to (and fsynced), so a flush
+costs the new rows, not the whole history; a record torn by a crash is
+trimmed off the tail the next time a RunLog opens the files. The summary
+reports are small and rewritten whole: a temporary file in the same folder is
+renamed over the target, so a reader (Excel) never sees half a report.
+
+Sidecar layout: MAGIC, a little-endian uint32 header length, a JSON header
+{"fields": [...]}, then fixed-width records of an 8-byte input hash followed
+by one float64 per field.
+"""
+
+import csv
+import hashlib
+import io
+import json
+import os
+import struct
+import threading
+import time
+from array import array
+from typing import Dict, List, Any, Tuple, Optional, Sequence
+
+import nona_core
+
+MAGIC = b'NONARUN1'
+
+# Numeric request values (as parsed by the model) then every result column.
+# 'valor_terreno' is the land total in the results; the unit price it comes
+# from is logged as 'costo_unitario_terreno'.
+RUN_INPUT_FIELDS = tuple(
+    key for key in [k for k, _, _ in nona_core.MODEL_INPUTS] + list(nona_core.DEFAULT_PARAMS)
+    if key not in nona_core.BATCH_RAW_FIELDS
+)
+RUN_FIELDS = ('timestamp',) + RUN_INPUT_FIELDS + nona_core.BATCH_RAW_FIELDS
+# The CSV also keeps the district lists, which the sidecar cannot hold
+CSV_FIELDS = ('input_hash',) + RUN_FIELDS + ('delegacion', 'Distrito')
+
+Row = Tuple[str, Dict[str, Any]]  # (input hash, values by field)
+
+
+def input_hash(data: Dict[str, Any]) -> str:
+    """Stable 16-hex-digit hash of a request (key order and containers do not matter)."""
+    blob = json.dumps(data, sort_keys=True, default=list, separators=(',', ':'))
+    return hashlib.blake2b(blob.encode('utf-8'), digest_size=8).hexdigest()
+
+
+def run_values(data: Dict[str, Any], raw: Dict[str, Any]) -> Dict[str, Any]:
+    """Log values of one solve: the parsed request overlaid with its results."""
+    values = nona_core.parse_leaves(data)
+    values.update(raw)
+    values['timestamp'] = time.time()
+    return values
+
+
+def _replace_atomically(path: str, write) -> None:
+    """Runs write(file) on a temporary file next to `path`, then renames it over `path`."""
+    # Same folder, so the rename never crosses filesystems; plain open() keeps the umask permissions
+    tmp = f"{path}.{os.getpid()}-{threading.get_ident()}.tmp"
+    try:
+        with open(tmp, 'xb') as f:
+            write(f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.unlink(tmp)
+        raise
+
+
+def _append(path: str, data: bytes, header: bytes = b'') -> None:
+    """
+    Appends `data` to `path` (prefixed by `header` if the file is new or
+    empty) and fsyncs it. A failed write is truncated back off, so a retry
+    never duplicates rows.
+    """
+    with open(path, 'ab') as f:
+        start = f.tell()
+        try:
+            f.write(header + data if start == 0 else data)
+            f.flush()
+            os.fsync(f.fileno())
+        except BaseException:
+            f.truncate(start)
+            raise
+
+
+def _trim_to(path: str, size: int) -> None:
+    with open(path, 'r+b') as f:
+        f.truncate(size)
+        os.fsync(f.fileno())
+
+
+def _csv_bytes(rows: Sequence[Sequence[Any]]) -> bytes:
+    buf = io.StringIO()
+    csv.writer(buf, lineterminator='\n').writerows(rows)
+    return buf.getvalue().encode('utf-8')
+
+
+def write_csv_atomic(path: str, rows: Sequence[Sequence[Any]]) -> None:
+    """Replaces `path` with the given CSV rows in one rename."""
+    data = _csv_bytes(rows)
+    _replace_atomically(path, lambda f: f.write(data))
+
+
+def _sidecar_header(fields: Sequence[str]) -> bytes:
+    header = json.dumps({'fields': list(fields)}).encode('utf-8')
+    return MAGIC + struct.pack('<I', len(header)) + header
+
+
+def _read_sidecar_header(f) -> Optional[List[str]]:
+    """Field names of a sidecar opened at its start (left positioned at the first record), None if not one."""
+    head = f.read(len(MAGIC) + 4)
+    if len(head) < len(MAGIC) + 4 or head[:len(MAGIC)] != MAGIC:
+        return None
+    size, = struct.unpack('<I', head[len(MAGIC):])
+    header = f.read(size)
+    # A header torn by a crash while the file was created
+    if len(header) < size:
+        return None
+    return json.loads(header.decode('utf-8'))['fields']
+
+
+def read_sidecar(path: str) -> Dict[str, Any]:
+    """
+    Replays a sidecar as columns: 'input_hash' (hex strings) and one
+    array('d') per field. A torn trailing record is ignored.
+    """
+    with open(path, 'rb') as f:
+        fields = _read_sidecar_header(f)
+        if fields is None:
+            raise ValueError(f"{path} is not a NoNA run log")
+        body = f.read()
+    record = struct.Struct('<8s%dd' % len(fields))
+    body = body[:len(body) - len(body) % record.size]
+    columns: Dict[str, Any] = {'input_hash': []}
+    columns.update({field: array('d') for field in fields})
+    targets = [columns[field] for field in fields]
+    for digest, *values in record.iter_unpack(body):
+        columns['input_hash'].append(digest.hex())
+        for column, value in zip(targets, values):
+            column.append(value)
+    return columns
+
+
+def _number(value: Any) -> float:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return float('nan')
+
+
+class RunLog:
+    """
+    Buffered, append-only run history of one folder.
+
+    append() only queues rows and arms a timer; the rows reach disk on
+    flush(), which the timer calls `delay` seconds after the first pending
+    row, or sooner once `max_pending` rows are queued. A failed write (e.g.
+    the CSV is open in Excel on Windows) keeps the rows for the next flush.
+    """
+
+    def __init__(self, folder: str, name: str = 'historial_noNa', delay: float = 1.0, max_pending: int = 1000):
+        self.csv_path = os.path.join(folder, name + '.csv')
+        self.sidecar_path = os.path.join(folder, name + '.runlog')
+        self.delay = delay
+        self.max_pending = max_pending
+        self.written = 0
+        self.last_error: Optional[str] = None
+        self._pending: List[Row] = []
+        # Rows queued for a file whose last write failed, per file
+        self._backlog: Dict[str, List[Row]] = {self.sidecar_path: [], self.csv_path: []}
+        self._snapshots: Dict[str, List[Sequence[Any]]] = {}
+        self._last_solve: Optional[Tuple[str, ...]] = None
+        self._record = struct.Struct('<8s%dd' % len(RUN_FIELDS))
+        self._lock = threading.Lock()        # pending rows, snapshots, timer
+        self._write_lock = threading.Lock()  # one flush at a time
+        self._timer: Optional[threading.Timer] = None
+        self._checked = False
+
+    def append(self, rows: Sequence[Row], snapshot: Optional[Tuple[str, List[Sequence[Any]]]] = None) -> bool:
+        """
+        Queues the rows of one solve, plus the latest (path, csv rows) summary
+        to rewrite on the next flush. A solve with exactly the same input
+        hashes as the previous one is not logged again. Returns True if queued.
+        """
+        solve = tuple(h for h, _ in rows)
+        flush_now = False
+        with self._lock:
+            if snapshot is not None:
+                self._snapshots[snapshot[0]] = snapshot[1]
+            if solve == self._last_solve:
+                return False
+            self._last_solve = solve
+            self._pending.extend(rows)
+            if len(self._pending) >= self.max_pending:
+                flush_now = True
+            elif self._timer is None:
+                self._timer = threading.Timer(self.delay, self.flush)
+                self._timer.daemon = True
+                self._timer.start()
+        if flush_now:
+            self.flush()
+        return True
+
+    @property
+    def pending(self) -> int:
+        return len(self._pending) + max(len(rows) for rows in self._backlog.values())
+
+    def status(self) -> str:
+        if self.last_error:
+            return f"❌ Error: {self.last_error} ({self.pending} rows pending)"
+        return f"✅ {self.written} rows logged, {self.pending} pending: {self.csv_path}"
+
+    def flush(self) -> int:
+        """Writes every queued row and snapshot; returns the rows that reached the CSV."""
+        with self._write_lock:
+            with self._lock:
+                if self._timer is not None:
+                    self._timer.cancel()
+                    self._timer = None
+                rows, self._pending = self._pending, []
+                snapshots, self._snapshots = self._snapshots, {}
+            try:
+                if not self._checked:
+                    self._rotate_mismatched()
+            except OSError as e:
+                self.last_error = str(e)
+                with self._lock:
+                    self._pending[:0] = rows
+                    for path, csv_rows in snapshots.items():
+                        self._snapshots.setdefault(path, csv_rows)
+                return 0
+
+            self.last_error = None
+            written = 0
+            for path, write in ((self.sidecar_path, self._write_sidecar), (self.csv_path, self._write_csv)):
+                batch = self._backlog[path] + rows
+                if not batch:
+                    continue
+                try:
+                    write(batch)
+                except OSError as e:
+                    # Kept for the next flush; the other file is not held back
+                    self.last_error = str(e)
+                    self._backlog[path] = batch
+                else:
+                    self._backlog[path] = []
+                    if path == self.csv_path:
+                        written = len(batch)
+            for path, csv_rows in snapshots.items():
+                try:
+                    write_csv_atomic(path, csv_rows)
+                except OSError as e:
+                    self.last_error = str(e)
+                    with self._lock:
+                        self._snapshots.setdefault(path, csv_rows)
+            self.written += written
+            return written
+
+    def close(self) -> None:
+        self.flush()
+
+    def _rotate_mismatched(self) -> None:
+        """
+        Moves logs written with another field layout aside instead of mixing
+        layouts, then trims a torn record (a crash mid-append) off the tail.
+        """
+        stale = False
+        if os.path.exists(self.sidecar_path):
+            with open(self.sidecar_path, 'rb') as f:
+                stale = _read_sidecar_header(f) != list(RUN_FIELDS)
+        if not stale and os.path.exists(self.csv_path):
+            with open(self.csv_path, newline='', encoding='utf-8') as f:
+                stale = next(csv.reader(f), None) != list(CSV_FIELDS)
+        if stale:
+            suffix = time.strftime('%Y%m%d-%H%M%S')
+            for path in (self.csv_path, self.sidecar_path):
+                if os.path.exists(path):
+                    root, ext = os.path.splitext(path)
+                    os.replace(path, f"{root}.{suffix}{ext}")
+        else:
+            self._trim_torn_tails()
+        self._checked = True
+
+    def _trim_torn_tails(self) -> None:
+        """Cuts each history file back to its last whole record (sidecar) or line (CSV)."""
+        if os.path.exists(self.sidecar_path):
+            with open(self.sidecar_path, 'rb') as f:
+                _read_sidecar_header(f)
+                start = f.tell()
+                size = f.seek(0, os.SEEK_END)
+            torn = (size - start) % self._record.size
+            if torn:
+                _trim_to(self.sidecar_path, size - torn)
+        if os.path.exists(self.csv_path):
+            with open(self.csv_path, 'rb') as f:
+                size = f.seek(0, os.SEEK_END)
+                tail = b''
+                # Rows are short; read back from the end until a line break
+                while size - len(tail) > 0 and b'\n' not in tail:
+                    step = min(4096, size - len(tail))
+                    f.seek(size - len(tail) - step)
+                    tail = f.read(step) + tail
+            torn = len(tail) - tail.rfind(b'\n') - 1 if b'\n' in tail else size
+            if torn:
+                _trim_to(self.csv_path, size - torn)
+
+    def _write_sidecar(self, rows: List[Row]) -> None:
+        data = bytearray()
+        for digest, values in rows:
+            data += self._record.pack(bytes.fromhex(digest), *(_number(values.get(f)) for f in RUN_FIELDS))
+        _append(self.sidecar_path, bytes(data), _sidecar_header(RUN_FIELDS))
+
+    def _write_csv(self, rows: List[Row]) -> None:
+        text = []
+        for digest, values in rows:
+            text.append(
+                [digest] + [values.get(field) for field in RUN_FIELDS]
+                + [' '.join(str(v) for v in values.get(key, ())) for key in ('delegacion', 'Distrito')]
+            )
+        _append(self.csv_path, _csv_bytes(text), _csv_bytes([CSV_FIELDS]))
@@ -1,5 +1,5 @@
 
-from database import SessionLocal, Parameter, init_db
+from database import SessionLocal, Parameter, init_db, apply_parameter_updates, seed_parking_rules
 
 def seed_defaults():
     db = SessionLocal()
@@ -17,12 +17,11 @@ def seed_defaults():
         {"key": "PCT_COM", "value": 6.0, "description": "% Comercialización", "group": "Indirectos"},
     ]
 
-    for d in defaults:
-        exists = db.query(Parameter).filter(Parameter.key == d["key"]).first()
-        if not exists:
-            p = Parameter(**d)
-            db.add(p)
-    
+    # Only missing keys: values edited in the settings screen are kept
+    existing = {key for (key,) in db.query(Parameter.key)}
+    apply_parameter_updates(db, [d for d in defaults if d["key"] not in existing])
+    # Built-in parking rules, only into a rule table never written before
+    seed_parking_rules(db)
     db.commit()
     db.close()
     print("✅ Defaults seeded.")
@@ -0,0 +1,110 @@
+"""
+NoNA Sensitivity Analysis
+Tornado and spider-chart data over run_calculation inputs.
+The whole perturbation grid is evaluated in a single run_calculation_batch pass.
+"""
+
+from typing import Dict, List, Any, Optional
+
+import logic
+
+# Inputs that can be perturbed, and whether they live in the request or in parameters
+INPUT_VARIABLES = ('costoMetroConstruccion', 'Costo_de_venta_m2', 'valor_terreno', 'CUS')
+PARAMETER_VARIABLES = ('PCT_HONORARIOS', 'PCT_LEGALES', 'PCT_ADM', 'PCT_FIN', 'PCT_COM')
+SENSITIVITY_VARIABLES = INPUT_VARIABLES + PARAMETER_VARIABLES
+
+# Output name -> raw result key
+SENSITIVITY_OUTPUTS = {
+    'utilidad': 'utilidad_monto',
+    'roi': 'roi',
+    'costo_total': 'costo_total',
+}
+
+MAX_STEPS = 50
+
+
+def perturbation_grid(range_pct: float, steps: int) -> List[float]:
+    """Symmetric grid of percentage deltas, e.g. (20, 2) -> [-20, -10, 0, 10, 20]."""
+    if steps < 1 or steps > MAX_STEPS:
+        raise ValueError(f"steps must be between 1 and {MAX_STEPS}")
+    if range_pct <= 0 or range_pct >= 100:
+        raise ValueError("range_pct must be between 0 and 100")
+    return [range_pct * k / steps for k in range(-steps, steps + 1)]
+
+
+def run_sensitivity(
+    data: Dict[str, Any],
+    params: Dict[str, float],
+    variables: Optional[List[str]] = None,
+    range_pct: float = 20.0,
+    steps: int = 4
+) -> Dict[str, Any]:
+    """
+    Perturbs each variable by every delta in the grid (one at a time, all
+    others at base) and returns base values, spider series and tornado bars.
+
+    The target-price simulation is disabled so that sales-price changes show
+    up in the results instead of being absorbed by the solved revenue.
+    """
+    variables = list(variables or SENSITIVITY_VARIABLES)
+    unknown = [v for v in variables if v not in SENSITIVITY_VARIABLES]
+    if unknown:
+        raise ValueError(f"Unknown sensitivity variables: {unknown}")
+
+    deltas = perturbation_grid(range_pct, steps)
+    base = dict(data, correrSimulacion=False)
+    base_params = dict(logic.DEFAULT_PARAMS)
+    base_params.update(params)
+
+    # Row 0 is the base case, then len(deltas) rows per variable
+    n = 1 + len(variables) * len(deltas)
+    columns = logic.shared_columns(base, n)
+    param_columns: Dict[str, Any] = dict(base_params)
+
+    row = 1
+    for var in variables:
+        if var in PARAMETER_VARIABLES:
+            col = param_columns[var] = [float(base_params[var])] * n
+        else:
+            col = columns[var] = [float(columns[var])] * n
+        for d in deltas:
+            col[row] = col[row] * (1.0 + d / 100.0)
+            row += 1
+
+    batch = logic.run_calculation_batch(columns, param_columns)
+    if not batch['mask'][0]:
+        raise ValueError(batch['errors'][0])
+    raw = batch['raw']
+
+    result: Dict[str, Any] = {
+        'variables': variables,
+        'deltas': deltas,
+        'base': {name: raw[key][0] for name, key in SENSITIVITY_OUTPUTS.items()},
+        'spider': {},
+        'tornado': {},
+    }
+
+    for v_index, var in enumerate(variables):
+        start = 1 + v_index * len(deltas)
+        result['spider'][var] = {
+            name: list(raw[key][start:start + len(deltas)])
+            for name, key in SENSITIVITY_OUTPUTS.items()
+        }
+
+    for name in SENSITIVITY_OUTPUTS:
+        bars = []
+        for var in variables:
+            series = result['spider'][var][name]
+            low, high = series[0], series[-1]
+            bars.append({
+                'variable': var,
+                'low': low,
+                'high': high,
+                'low_delta': deltas[0],
+                'high_delta': deltas[-1],
+                'swing': abs(high - low),
+            })
+        bars.sort(key=lambda b: b['swing'], reverse=True)
+        result['tornado'][name] = bars
+
+    return result
@@ -0,0 +1,278 @@
+"""
+NoNA Monte Carlo Risk Simulation
+Samples construction cost, sale price, absorption and land value, evaluates
+each chunk of draws with run_calculation_batch and aggregates profit / ROI.
+
+Chunks have a fixed size and a seed derived from (seed, chunk index), so the
+final result is identical whatever the number of worker processes.
+
+Chunks run on a shared, long-lived pool (executor.simulation_executor). While
+they come in, progress events carry streaming aggregates: exact count, mean,
+min, max and loss probability, with percentiles estimated from a bounded
+stratified sample of every chunk. The exact statistics and histograms are
+computed once, from a single merge of the sorted chunks, for the final result.
+"""
+
+import bisect
+import hashlib
+import heapq
+import math
+import random
+from array import array
+from concurrent.futures import Future, as_completed
+from typing import Dict, List, Any, Iterator, Optional, Sequence
+
+import logic
+
+# Sampled variables, in the (fixed) order they are drawn within a chunk.
+# 'absorcion' is the share of the sellable inventory actually sold; it scales
+# both the residential and commercial sale prices (and so every revenue-based
+# indirect).
+MC_VARIABLES = ('costoMetroConstruccion', 'Costo_de_venta_m2', 'absorcion', 'valor_terreno')
+DISTRIBUTIONS = ('triangular', 'normal', 'uniform')
+
+DEFAULT_CHUNK_SIZE = 50_000
+MAX_DRAWS = 5_000_000
+# Size of the sample behind the interim percentiles of progress events
+PROGRESS_SAMPLE_SIZE = 10_000
+
+
+def validate_distribution(var: str, spec: Dict[str, Any]) -> None:
+    if var not in MC_VARIABLES:
+        raise ValueError(f"Unknown simulation variable: {var}")
+    dist = spec.get('dist')
+    if dist not in DISTRIBUTIONS:
+        raise ValueError(f"{var}: dist must be one of {DISTRIBUTIONS}")
+    if dist == 'normal':
+        if spec.get('mean') is None or spec.get('std') is None or spec['std'] < 0:
+            raise ValueError(f"{var}: normal needs mean and std >= 0")
+        return
+    low, high = spec.get('low'), spec.get('high')
+    if low is None or high is None or low > high:
+        raise ValueError(f"{var}: {dist} needs low <= high")
+    if dist == 'triangular':
+        mode = spec.get('mode')
+        if mode is None or not (low <= mode <= high):
+            raise ValueError(f"{var}: triangular needs low <= mode <= high")
+
+
+def _chunk_seed(seed: int, index: int) -> int:
+    digest = hashlib.sha256(f"nona-montecarlo:{seed}:{index}".encode()).digest()
+    return int.from_bytes(digest[:8], 'big')
+
+
+def _sample(rng: random.Random, spec: Dict[str, Any], size: int) -> List[float]:
+    dist = spec['dist']
+    if dist == 'triangular':
+        low, high, mode = spec['low'], spec['high'], spec['mode']
+        return [rng.triangular(low, high, mode) for _ in range(size)]
+    if dist == 'uniform':
+        low, high = spec['low'], spec['high']
+        return [rng.uniform(low, high) for _ in range(size)]
+    mean, std = spec['mean'], spec['std']
+    return [rng.gauss(mean, std) for _ in range(size)]
+
+
+def _simulate_chunk(task: tuple) -> Dict[str, Any]:
+    """Worker: draws one chunk and returns its sorted profit and ROI samples (as array('d'))."""
+    base, params, rules, distributions, seed, index, size = task
+    rng = random.Random(_chunk_seed(seed, index))
+
+    columns = logic.shared_columns(base, size)
+    columns['correrSimulacion'] = False
+
+    draws = {var: _sample(rng, distributions[var], size) for var in MC_VARIABLES if var in distributions}
+    # Negative costs, prices or land values are meaningless; absorption is a share
+    for var in ('costoMetroConstruccion', 'Costo_de_venta_m2', 'valor_terreno'):
+        if var in draws:
+            columns[var] = [x if x > 0.0 else 0.0 for x in draws[var]]
+    if 'absorcion' in draws:
+        absorcion = [min(max(a, 0.0), 1.0) for a in draws['absorcion']]
+        price = columns['Costo_de_venta_m2']
+        prices = price if isinstance(price, list) else [float(price)] * size
+        local = float(columns['costo_local_m2'])
+        columns['Costo_de_venta_m2'] = [p * a for p, a in zip(prices, absorcion)]
+        columns['costo_local_m2'] = [local * a for a in absorcion]
+
+    batch = logic.run_calculation_batch(columns, params, rules)
+    mask = batch['mask']
+    profit = array('d', sorted(v for v, ok in zip(batch['raw']['utilidad_monto'], mask) if ok))
+    roi = array('d', sorted(v for v, ok in zip(batch['raw']['roi'], mask) if ok))
+    errors = [e for e in batch['errors'] if e is not None]
+    return {'index': index, 'profit': profit, 'roi': roi, 'failed': len(errors),
+            'error': errors[0] if errors else None}
+
+
+def percentile(sorted_values: Sequence[float], q: float) -> float:
+    """Linear-interpolated percentile (q in [0, 1]) of an already sorted list."""
+    if not sorted_values:
+        return float('nan')
+    pos = (len(sorted_values) - 1) * q
+    lo = math.floor(pos)
+    hi = min(lo + 1, len(sorted_values) - 1)
+    frac = pos - lo
+    return sorted_values[lo] + (sorted_values[hi] - sorted_values[lo]) * frac
+
+
+def histogram(sorted_values: Sequence[float], bins: int) -> Dict[str, List[float]]:
+    """Equal-width histogram computed by bisection on sorted data."""
+    if not sorted_values:
+        return {'edges': [], 'counts': []}
+    lo, hi = sorted_values[0], sorted_values[-1]
+    if hi == lo:
+        return {'edges': [lo, hi], 'counts': [len(sorted_values)]}
+    width = (hi - lo) / bins
+    edges = [lo + width * i for i in range(bins)] + [hi]
+    cuts = [bisect.bisect_left(sorted_values, e) for e in edges[1:-1]]
+    bounds = [0] + cuts + [len(sorted_values)]
+    return {'edges': edges, 'counts': [b - a for a, b in zip(bounds, bounds[1:])]}
+
+
+def _describe(sorted_values: Sequence[float]) -> Dict[str, float]:
+    if not sorted_values:
+        return {}
+    return {
+        'p10': percentile(sorted_values, 0.10),
+        'p50': percentile(sorted_values, 0.50),
+        'p90': percentile(sorted_values, 0.90),
+        'mean': math.fsum(sorted_values) / len(sorted_values),
+        'min': sorted_values[0],
+        'max': sorted_values[-1],
+    }
+
+
+def summarize(profit: Sequence[float], roi: Sequence[float], bins: int) -> Dict[str, Any]:
+    losses = bisect.bisect_left(profit, 0.0)
+    return {
+        'samples': len(profit),
+        'utilidad': _describe(profit),
+        'roi': _describe(roi),
+        'prob_loss': losses / len(profit) if profit else float('nan'),
+        'histograms': {
+            'utilidad': histogram(profit, bins),
+            'roi': histogram(roi, bins),
+        },
+    }
+
+
+class RunningStats:
+    """
+    Streaming aggregate of sorted chunks: exact count, mean, min, max and
+    negatives, plus a stratified sample (every k-th value of each chunk,
+    with k fixed for the whole run) for interim percentiles.
+    """
+
+    def __init__(self, total: int):
+        self.count = 0
+        self.total = 0.0
+        self.negatives = 0
+        self.min = math.inf
+        self.max = -math.inf
+        self.step = max(1, total // PROGRESS_SAMPLE_SIZE)
+        self.sample: List[float] = []
+
+    def add(self, sorted_values: Sequence[float]) -> None:
+        if not sorted_values:
+            return
+        self.count += len(sorted_values)
+        self.total += math.fsum(sorted_values)
+        self.negatives += bisect.bisect_left(sorted_values, 0.0)
+        self.min = min(self.min, sorted_values[0])
+        self.max = max(self.max, sorted_values[-1])
+        # Middle value of every stratum of `step` values
+        picked = sorted_values[self.step // 2::self.step]
+        self.sample = list(heapq.merge(self.sample, picked))
+
+    def describe(self) -> Dict[str, float]:
+        if not self.count:
+            return {}
+        return {
+            'p10': percentile(self.sample, 0.10),
+            'p50': percentile(self.sample, 0.50),
+            'p90': percentile(self.sample, 0.90),
+            'mean': self.total / self.count,
+            'min': self.min,
+            'max': self.max,
+        }
+
+
+def run_montecarlo(
+    data: Dict[str, Any],
+    params: Dict[str, float],
+    distributions: Dict[str, Dict[str, Any]],
+    n: int = 100_000,
+    seed: int = 0,
+    bins: int = 50,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    executor: Optional[Any] = None,
+    parking_rules: Optional[logic.ParkingRules] = None
+) -> Iterator[Dict[str, Any]]:
+    """
+    Validates the request and returns an iterator that yields a 'progress'
+    event (with interim statistics) after each chunk and a final 'result'
+    event. Chunks go to `executor` (an executor.RouteExecutor, usually
+    executor.simulation_executor); without one they run in-process. Every
+    chunk gets `parking_rules` (default: the active rules when called), as
+    pool workers never see the parent's installed rules.
+    """
+    if not distributions:
+        raise ValueError("At least one distribution is required")
+    for var, spec in distributions.items():
+        validate_distribution(var, spec)
+    if n < 1 or n > MAX_DRAWS:
+        raise ValueError(f"n must be between 1 and {MAX_DRAWS}")
+    if bins < 1 or chunk_size < 1:
+        raise ValueError("bins and chunk_size must be positive")
+
+    params = dict(params)
+    rules = parking_rules if parking_rules is not None else logic.parking_rules()
+    n_chunks = math.ceil(n / chunk_size)
+    tasks = [
+        (data, params, rules, distributions, seed, i, min(chunk_size, n - i * chunk_size))
+        for i in range(n_chunks)
+    ]
+    return _run(tasks, n, executor, seed, bins)
+
+
+def _run(tasks: List[tuple], n: int, executor: Optional[Any], seed: int, bins: int) -> Iterator[Dict[str, Any]]:
+    n_chunks = len(tasks)
+    chunks: List[Optional[Dict[str, Any]]] = [None] * n_chunks
+    profit_stats, roi_stats = RunningStats(n), RunningStats(n)
+    failed = 0
+    done = 0
+
+    if executor is None:
+        results = (_simulate_chunk(task) for task in tasks)
+        futures: List[Future] = []
+    else:
+        futures = [executor.submit(_simulate_chunk, task) for task in tasks]
+        results = (future.result() for future in as_completed(futures))
+    try:
+        for chunk in results:
+            chunks[chunk['index']] = chunk
+            profit_stats.add(chunk['profit'])
+            roi_stats.add(chunk['roi'])
+            failed += chunk['failed']
+            done += 1
+            if done < n_chunks:
+                yield {
+                    'type': 'progress', 'chunks_done': done, 'chunks_total': n_chunks,
+                    'samples': profit_stats.count,
+                    'utilidad': profit_stats.describe(),
+                    'roi': roi_stats.describe(),
+                    'prob_loss': profit_stats.negatives / profit_stats.count if profit_stats.count else float('nan'),
+                    'failed': failed,
+                }
+    finally:
+        # The client went away (generator closed): drop the chunks not started yet
+        for future in futures:
+            future.cancel()
+
+    # Exact statistics from one merge of the sorted chunks
+    profit = array('d', heapq.merge(*(c['profit'] for c in chunks)))
+    roi = array('d', heapq.merge(*(c['roi'] for c in chunks)))
+    first_error = next((c['error'] for c in chunks if c['error']), None)
+    yield {
+        'type': 'result', 'chunks_done': done, 'chunks_total': n_chunks, 'seed': seed,
+        **summarize(profit, roi, bins), 'failed': failed, 'error': first_error,
+    }
@@ -0,0 +1,7 @@
+import os
+import tempfile
+
+# Point the app at a throwaway SQLite database before `database` is imported.
+os.environ.setdefault(
+    "DATABASE_URL", "sqlite:///" + os.path.join(tempfile.mkdtemp(), "nona_test.db")
+)
@@ -0,0 +1,475 @@
+import json
+
+import pytest
+
+from fastapi.testclient import TestClient
+
+import main
+
+client = TestClient(main.app)
+
+PAYLOAD = {
+    "area_terreno": 1000,
+    "valor_terreno": 5000,
+    "COS": 0.7,
+    "CUS": 2.5,
+    "CAS": 0.2,
+    "area_demolicion": 100,
+    "demolicion": True,
+    "n_viviendas": 10,
+    "usos_mixtos": False,
+    "estacionamiento": True,
+    "tipo_estacionamiento": 8000,
+    "costoMetroConstruccion": 10000,
+    "Costo_de_venta_m2": 30000,
+    "areaCirculacionPorcentaje": 0.15,
+    "delegacion": ["centro"],
+    "Distrito": [1.0],
+    "utilidadDeseada": 20,
+    "correrSimulacion": False
+}
+
+def _ndjson(resp):
+    return [json.loads(line) for line in resp.text.splitlines()]
+
+def test_calculate_batch_json_list_matches_single():
+    single = client.post("/calculate", json=PAYLOAD).json()
+    resp = client.post("/calculate/batch", json=[PAYLOAD, {"area_terreno": 1}, dict(PAYLOAD, CUS=3.0)])
+    assert resp.status_code == 200
+    rows = _ndjson(resp)
+    assert [r["index"] for r in rows] == [0, 1, 2]
+    assert rows[0]["raw"] == single["raw"]
+    assert "error" in rows[1]
+    assert rows[2]["raw"]["cus_area"] == 3000.0
+
+def test_calculate_batch_ndjson_body():
+    body = "\n".join([json.dumps(PAYLOAD), "not json", json.dumps(PAYLOAD)]) + "\n"
+    resp = client.post("/calculate/batch", content=body, headers={"Content-Type": "application/x-ndjson"})
+    rows = _ndjson(resp)
+    assert len(rows) == 3
+    assert "error" in rows[1]
+    assert rows[0]["raw"] == rows[2]["raw"]
+
+def test_calculate_batch_json_list_is_parsed_incrementally():
+    import io
+    body = json.dumps([PAYLOAD] * 3)
+    assert list(main._iter_json_array(io.BytesIO(body.encode()), read_size=16)) == [PAYLOAD] * 3
+
+    # A malformed element ends the list with an error row
+    resp = client.post("/calculate/batch", content=json.dumps([PAYLOAD])[:-1] + ', {"area_terreno": ]',
+                       headers={"Content-Type": "application/json"})
+    rows = _ndjson(resp)
+    assert "raw" in rows[0] and "error" in rows[1] and len(rows) == 2
+    resp = client.post("/calculate/batch", json={"rows": []})
+    assert resp.status_code == 400 and resp.json()["detail"] == "Expected a JSON list or NDJSON"
+
+    # Rows that are not objects are reported, not passed to the model
+    rows = _ndjson(client.post("/calculate/batch", json=["centro", PAYLOAD, [1, 2]]))
+    assert rows[0]["error"] == rows[2]["error"] == "Each row must be a JSON object"
+    assert "raw" in rows[1]
+
+def test_parameter_update_invalidates_cache():
+    import cache
+    import database
+
+    db = database.SessionLocal()
+    if db.get(database.Parameter, "COST_DEMOLITION_M2") is None:
+        db.add(database.Parameter(key="COST_DEMOLITION_M2", value=1600.0, description="", group="Costos"))
+        db.commit()
+    db.close()
+
+    client.put("/parameters", json=[{"key": "COST_DEMOLITION_M2", "value": 1600.0}])
+    base = client.post("/calculate", json=PAYLOAD).json()["raw"]["dem_cost_only"]
+    version = cache.parameter_cache._snapshot.version
+
+    resp = client.put("/parameters", json=[{"key": "COST_DEMOLITION_M2", "value": 3200.0}])
+    assert resp.json()["version"] == version + 1
+    updated = client.post("/calculate", json=PAYLOAD).json()["raw"]["dem_cost_only"]
+    assert updated == 2 * base
+    assert cache.parameter_cache._snapshot.version == version + 1
+    assert cache.parameter_cache._snapshot.values["COST_DEMOLITION_M2"] == 3200.0
+
+def test_result_cache_reused_by_export():
+    import cache
+
+    payload = dict(PAYLOAD, n_viviendas=17, project_name="A")
+    before = cache.result_cache.stats()
+    first = client.post("/calculate", json=payload).json()
+    # Cosmetic fields and sub-precision float noise map to the same key
+    second = client.post("/calculate", json=dict(payload, project_name="B", CUS=2.5 + 1e-9)).json()
+    assert second == first
+    resp = client.post("/export/csv", json=payload)
+    assert resp.status_code == 200
+
+    stats = client.get("/cache/stats").json()["results"]
+    assert stats["misses"] == before["misses"] + 1
+    assert stats["hits"] == before["hits"] + 2
+
+def test_result_cache_lru_and_ttl():
+    from cache import ResultCache
+
+    rc = ResultCache(maxsize=2, ttl=60)
+    keys = [rc.make_key({"CUS": float(i)}, 0) for i in range(3)]
+    for k in keys:
+        rc.put(k, {"raw": {}})
+    assert rc.get(keys[0]) is None
+    assert rc.get(keys[2]) is not None
+    assert rc.stats()["evictions"] == 1
+    assert rc.make_key({"CUS": 1.0}, 0) != rc.make_key({"CUS": 1.0}, 1)
+    assert rc.make_key({"delegacion": ["a", "b"]}, 0) != rc.make_key({"delegacion": ["b", "a"]}, 0)
+
+    rc.ttl = -1
+    rc.put(keys[0], {"raw": {}})
+    assert rc.get(keys[0]) is None
+    assert rc.stats()["expirations"] == 1
+
+def test_export_customer_portfolio():
+    import io
+    import openpyxl
+
+    customer = client.post("/customers", json={"name": "Portafolio Export"}).json()
+    for name, payload in (("Base", PAYLOAD), ("Torre: A/B", dict(PAYLOAD, CUS=3.0))):
+        client.post("/scenarios", json={"customer_id": customer["id"], "name": name, "input_data": payload})
+
+    resp = client.get(f"/customers/{customer['id']}/scenarios/export")
+    assert resp.status_code == 200
+    wb = openpyxl.load_workbook(io.BytesIO(resp.content))
+    assert wb.sheetnames == ["Resumen", "1 Base", "2 Torre  A B"]
+
+    summary = wb["Resumen"]
+    expected = client.post("/calculate", json=PAYLOAD).json()["raw"]
+    assert summary["A3"].value == "Base"
+    assert summary["C3"].value == pytest.approx(expected["utilidad_monto"])
+    assert summary["C3"].style.startswith("nona_money")
+    assert client.get("/customers/999999/scenarios/export").status_code == 404
+
+def test_export_batch_results_csv_and_arrow():
+    import csv
+    import io
+
+    single = client.post("/calculate", json=PAYLOAD).json()["raw"]
+    body = [PAYLOAD, {"area_terreno": 1}, dict(PAYLOAD, CUS=3.0)]
+
+    resp = client.post("/calculate/batch/export?format=csv", json=body)
+    assert resp.status_code == 200
+    assert resp.headers["content-type"].startswith("text/csv")
+    rows = list(csv.DictReader(io.StringIO(resp.text)))
+    assert [r["index"] for r in rows] == ["0", "1", "2"]
+    assert float(rows[0]["costo_total"]) == single["costo_total"]
+    assert rows[1]["error"] and rows[1]["costo_total"] == ""
+    assert int(rows[2]["n_viviendas"]) == 10
+
+    assert client.post("/calculate/batch/export?format=xml", json=body).status_code == 400
+
+    pa = pytest.importorskip("pyarrow")
+    import pyarrow.parquet as pq
+
+    resp = client.post("/calculate/batch/export?format=arrow", json=body)
+    table = pa.ipc.open_stream(resp.content).read_all()
+    assert table.num_rows == 3
+    assert table.column("costo_total").to_pylist()[0] == single["costo_total"]
+    assert table.column("costo_total").null_count == 1
+
+    resp = client.post("/calculate/batch/export?format=parquet", json=body)
+    table = pq.read_table(io.BytesIO(resp.content))
+    assert table.column("utilidad_monto").to_pylist()[2] == float(rows[2]["utilidad_monto"])
+    assert table.column("error").to_pylist()[0] is None
+
+def _wait_for_job(job_id, timeout=60):
+    import time
+
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        job = client.get(f"/exports/{job_id}").json()
+        if job["status"] not in ("queued", "running"):
+            return job
+        time.sleep(0.05)
+    raise AssertionError(f"export job {job_id} did not finish")
+
+def test_export_job_progress_stays_within_its_snapshot(tmp_path, monkeypatch):
+    import jobs
+    import nona_core
+
+    customer = client.post("/customers", json={"name": "Export Snapshot"}).json()
+    for name in ("a", "b"):
+        client.post("/scenarios", json={"customer_id": customer["id"], "name": name, "input_data": PAYLOAD})
+    reported = []
+    monkeypatch.setattr(jobs, "PROGRESS_EVERY", 1)
+    monkeypatch.setattr(jobs, "_report", lambda job_id, event, value: reported.append((event, value)))
+
+    scenarios = main.database.customer_scenarios
+    def saved_meanwhile(db, customer_id, *args, **kwargs):
+        # A scenario saved after the job counted its rows
+        client.post("/scenarios", json={"customer_id": customer["id"], "name": "late", "input_data": PAYLOAD})
+        return scenarios(db, customer_id, *args, **kwargs)
+    monkeypatch.setattr(main.database, "customer_scenarios", saved_meanwhile)
+
+    path = str(tmp_path / "results.csv")
+    jobs.run_job("j", "results", "csv", {"customer_id": customer["id"]}, {}, nona_core.parking_rules(), path)
+    assert [value for event, value in reported if event == "progress"] == [0.5, 1.0]
+    with open(path) as f:
+        assert len(f.read().splitlines()) == 3
+
+def test_export_jobs():
+    import io
+    import openpyxl
+
+    customer = client.post("/customers", json={"name": "Export Jobs"}).json()
+    client.post("/scenarios", json={"customer_id": customer["id"], "name": "Base", "input_data": PAYLOAD})
+
+    resp = client.post("/exports", json={"kind": "report", "inputs": PAYLOAD})
+    assert resp.status_code == 202
+    report = _wait_for_job(resp.json()["id"])
+    assert report["status"] == "done" and report["progress"] == 1.0
+    wb = openpyxl.load_workbook(io.BytesIO(client.get(f"/exports/{report['id']}/file").content))
+    assert wb.sheetnames == ["Reporte NoNA"]
+
+    resp = client.post("/exports", json={"kind": "results", "format": "csv", "customer_id": customer["id"]})
+    results = _wait_for_job(resp.json()["id"])
+    lines = client.get(f"/exports/{results['id']}/file").text.splitlines()
+    assert len(lines) == 2 and lines[1].startswith("0,Base,")
+
+    assert client.post("/exports", json={"kind": "results", "format": "xlsx", "customer_id": customer["id"]}).status_code == 400
+    assert client.post("/exports", json={"kind": "portfolio"}).status_code == 400
+    assert client.get("/exports/missing").status_code == 404
+
+    # With every worker busy the last submissions are still queued and cancel outright
+    ids = [client.post("/exports", json={"kind": "portfolio", "customer_id": customer["id"]}).json()["id"] for _ in range(6)]
+    cancelled = client.delete(f"/exports/{ids[-1]}").json()
+    assert cancelled["cancel_requested"]
+    assert _wait_for_job(ids[-1])["status"] == "cancelled"
+    assert client.get(f"/exports/{ids[-1]}/file").status_code == 409
+    for job_id in ids[:-1]:
+        assert _wait_for_job(job_id)["status"] == "done"
+
+    stats = client.get("/exports").json()["stats"]
+    assert stats["queue_depth"] == 0 and stats["durations"]["count"] >= 7
+
+def test_query_scenarios_sorted_filtered_paged():
+    import database
+    from sqlalchemy import text
+
+    customer = client.post("/customers", json={"name": "Ranking"}).json()
+    for n in (5, 10, 20, 40):
+        client.post("/scenarios", json={"customer_id": customer["id"], "name": f"n{n}",
+                                        "input_data": dict(PAYLOAD, n_viviendas=n, lat=19.4, lng=-99.1)})
+    url = f"/customers/{customer['id']}/scenarios/query"
+
+    page = client.get(url, params={"sort": "-n_viviendas", "limit": 2}).json()
+    assert page["total"] == 4
+    assert [row["name"] for row in page["items"]] == ["n40", "n20"]
+    row = page["items"][0]
+    expected = client.post("/calculate", json=dict(PAYLOAD, n_viviendas=40)).json()["raw"]
+    assert row["costo_total"] == pytest.approx(expected["costo_total"])
+    assert row["roi"] == pytest.approx(expected["roi"])
+    assert (row["lat"], row["lng"]) == (19.4, -99.1)
+
+    page = client.get(url, params={"sort": "n_viviendas", "offset": 1, "min_n_viviendas": 10, "max_n_viviendas": 40}).json()
+    assert page["total"] == 3
+    assert [row["name"] for row in page["items"]] == ["n20", "n40"]
+    assert client.get(url, params={"sort": "input_data"}).status_code == 400
+    assert client.get(url, params={"limit": 0}).status_code == 422
+
+    with database.engine.connect() as conn:
+        plan = conn.execute(text(
+            "EXPLAIN QUERY PLAN SELECT id FROM scenarios WHERE customer_id = 1 ORDER BY utilidad DESC, id DESC LIMIT 50"
+        )).all()
+    assert "ix_scenarios_customer_utilidad" in str(plan)
+
+def test_scenario_listing_keyset_fields_etag():
+    customer = client.post("/customers", json={"name": "Paginado"}).json()
+    ids = [
+        client.post("/scenarios", json={"customer_id": customer["id"], "name": f"p{i}", "input_data": PAYLOAD}).json()["id"]
+        for i in range(5)
+    ]
+    url = f"/customers/{customer['id']}/scenarios"
+
+    first = client.get(url, params={"limit": 2})
+    assert [row["id"] for row in first.json()] == ids[:2]
+    assert "input_data" not in first.json()[0] and "result_summary" in first.json()[0]
+    cursor = first.headers["X-Next-Cursor"]
+    assert 'rel="next"' in first.headers["Link"]
+
+    seen = []
+    resp = first
+    while True:
+        seen += [row["id"] for row in resp.json()]
+        if "X-Next-Cursor" not in resp.headers:
+            break
+        resp = client.get(url, params={"limit": 2, "after": resp.headers["X-Next-Cursor"]})
+    assert seen == ids
+
+    full = client.get(url, params={"limit": 1, "after": cursor, "fields": "name,input_data"}).json()
+    assert full == [{"name": "p2", "input_data": client.get(f"/scenarios/{ids[2]}").json()["input_data"]}]
+    assert client.get(url, params={"fields": "name,secret"}).status_code == 400
+    assert client.get("/scenarios/999999").status_code == 404
+
+    again = client.get(url, params={"limit": 2}, headers={"If-None-Match": first.headers["ETag"]})
+    assert again.status_code == 304 and again.content == b""
+    assert again.headers["ETag"] == first.headers["ETag"]
+    other_page = client.get(url, params={"limit": 2, "after": cursor}, headers={"If-None-Match": first.headers["ETag"]})
+    assert other_page.status_code == 200
+    client.post("/scenarios", json={"customer_id": customer["id"], "name": "p5", "input_data": PAYLOAD})
+    stale = client.get(url, params={"limit": 2}, headers={"If-None-Match": first.headers["ETag"]})
+    assert stale.status_code == 200 and stale.headers["ETag"] != first.headers["ETag"]
+
+    customers = client.get("/customers", params={"fields": "id,name,created_at", "limit": 1000}).json()
+    assert {"id": customer["id"], "name": "Paginado"}.items() <= next(c for c in customers if c["id"] == customer["id"]).items()
+
+def test_bulk_scenario_ingest():
+    customer = client.post("/customers", json={"name": "Migracion"}).json()
+    rows = [{"name": f"m{n}", "input_data": dict(PAYLOAD, n_viviendas=n)} for n in (8, 12, 16)]
+    rows.insert(1, {"name": "sin datos", "input_data": {"area_terreno": 1}})
+    rows.append({"customer_id": 999999, "name": "ajeno", "input_data": PAYLOAD})
+    body = "\n".join(json.dumps(row) for row in rows) + "\nnot json\n"
+
+    resp = client.post(f"/scenarios/bulk?customer_id={customer['id']}", content=body,
+                       headers={"content-type": "application/x-ndjson"})
+    assert resp.status_code == 200
+    out = resp.json()
+    assert (out["inserted"], out["failed"]) == (3, 3)
+    assert [e["index"] for e in out["errors"]] == [1, 4, 5]
+    assert out["errors"][1]["error"] == "Customer 999999 not found"
+    assert out["ids"][1] is None and out["ids"][4] is None
+
+    # Stored exactly like POST /scenarios would have stored it
+    single = client.post("/scenarios", json={"customer_id": customer["id"], "name": "m12",
+                                             "input_data": dict(PAYLOAD, n_viviendas=12)}).json()
+    bulk = client.get(f"/scenarios/{out['ids'][2]}").json()
+    assert bulk["input_data"] == single["input_data"]
+    assert bulk["result_summary"] == single["result_summary"]
+    page = client.get(f"/customers/{customer['id']}/scenarios/query", params={"sort": "n_viviendas"}).json()
+    assert [row["n_viviendas"] for row in page["items"]] == [8, 12, 12, 16]
+
+    resp = client.post("/scenarios/bulk", json=[{"customer_id": customer["id"], "name": "lista", "input_data": PAYLOAD}, "lista"])
+    assert resp.json()["inserted"] == 1
+    assert resp.json()["errors"] == [{"index": 1, "error": "Each row must be a JSON object"}]
+    resp = client.post("/scenarios/bulk", json={"customer_id": customer["id"]})
+    assert resp.status_code == 400 and resp.json()["detail"] == "Expected a JSON list or NDJSON"
+
+def test_parameter_upsert_change_sets():
+    client.put("/parameters", json=[
+        {"key": "COST_LICENSE_M2", "value": 15.0, "description": "Licencia", "group": "Costos"},
+        {"key": "PCT_FIN", "value": 3.0, "description": "% Financiero", "group": "Indirectos"},
+    ])
+    before = client.get("/parameters/history?limit=1").json()[0]["version"]
+
+    resp = client.put("/parameters", json=[
+        {"key": "COST_LICENSE_M2", "value": 15.0},
+        {"key": "PCT_FIN", "value": 4.5},
+        {"key": "PCT_FIN", "value": 5.0},
+        {"key": "REGION_NORTE_FACTOR", "value": 1.1, "description": "Factor regional", "group": "Regiones"},
+    ]).json()
+    assert resp == {"status": "updated", "version": before + 1, "changed": ["PCT_FIN", "REGION_NORTE_FACTOR"]}
+    assert client.get("/parameters/history?limit=1").json()[0]["changes"] == {
+        "PCT_FIN": [3.0, 5.0], "REGION_NORTE_FACTOR": [None, 1.1]
+    }
+
+    # Unknown key without description/group: rejected, and nothing else applied
+    resp = client.put("/parameters", json=[{"key": "PCT_FIN", "value": 9.0}, {"key": "NUEVO", "value": 1.0}])
+    assert resp.status_code == 400
+    assert client.put("/parameters", json=[{"key": "PCT_FIN", "value": 5.0}]).json()["status"] == "unchanged"
+
+    # Metadata-only edits are saved but neither versioned nor audited
+    resp = client.put("/parameters", json=[{"key": "PCT_FIN", "value": 5.0, "description": "Financiamiento"}]).json()
+    assert resp == {"status": "unchanged", "version": before + 1, "changed": []}
+    assert client.get("/parameters/history?limit=1").json()[0]["version"] == before + 1
+    assert next(p for p in client.get("/parameters").json() if p["key"] == "PCT_FIN")["description"] == "Financiamiento"
+
+    pinned = client.get(f"/parameters/versions/{before}").json()["values"]
+    assert pinned["PCT_FIN"] == 3.0 and "REGION_NORTE_FACTOR" not in pinned
+    assert client.get(f"/parameters/versions/{before + 1}").json()["values"]["PCT_FIN"] == 5.0
+    assert client.get("/parameters/versions/999999").status_code == 404
+
+def test_parking_rules_endpoints():
+    base = client.post("/calculate", json=PAYLOAD).json()["raw"]
+    payload = dict(PAYLOAD, CUS=2.4, ciudad="CDMX", delegacion=["centro", "atlantis"], Distrito=[1.0, 1.0])
+    assert client.post("/calculate", json=payload).json()["raw"]["parking_unknown"] == ["atlantis"]
+
+    resp = client.put("/parking-rules", json=[
+        {"city": "CDMX", "delegacion": "Centro", "comercial": 25.0},
+        {"city": "cdmx", "delegacion": "atlantis", "district": "H3", "comercial": 40.0},
+    ]).json()
+    assert resp["status"] == "updated"
+    assert resp["changed"] == ["cdmx/atlantis/h3", "cdmx/centro/"]
+    assert client.put("/parking-rules", json=[{"delegacion": "centro", "comercial": 0}]).status_code == 422
+    rules = client.get("/parking-rules?city=Cdmx").json()
+    assert rules["version"] == resp["version"]
+    stored = [rule for rule in rules["rules"] if rule["city"] == "cdmx"]
+    assert len(stored) == 2 and {"city": "", "delegacion": "centro", "district": "", "comercial": 35.0}.items() <= rules["rules"][0].items()
+
+    # The stored rules apply at once, cached results included
+    raw = client.post("/calculate", json=dict(payload, distrito_zona=["", "h3"])).json()["raw"]
+    assert raw["parking_unknown"] == []
+    assert raw["parking_spots_com"] == (700 - 2400 * 0.15) / 25.0 + (700 - 2400 * 0.15) / 40.0
+    assert client.post("/calculate", json=payload).json()["raw"]["parking_unknown"] == ["atlantis"]
+    # Without a city the built-in, city-wide rule still applies
+    assert client.post("/calculate", json=PAYLOAD).json()["raw"] == base
+
+    for rule in stored:
+        assert client.delete(f"/parking-rules/{rule['id']}").status_code == 200
+    assert client.delete(f"/parking-rules/{stored[0]['id']}").status_code == 404
+    assert client.post("/calculate", json=PAYLOAD).json()["raw"] == base
+
+def test_parking_rules_are_seeded_under_stored_ones():
+    base = client.post("/calculate", json=PAYLOAD).json()["raw"]
+    assert base["parking_unknown"] == [] and base["parking_spots"] > 0
+    resp = client.put("/parking-rules", json=[{"city": "gdl", "delegacion": "zapopan", "comercial": 20.0}]).json()
+    assert resp["changed"] == ["gdl/zapopan/"]
+
+    # One unrelated rule leaves every other calculation as it was
+    assert client.post("/calculate", json=PAYLOAD).json()["raw"] == base
+    rules = client.get("/parking-rules").json()["rules"]
+    assert {(r["city"], r["delegacion"]) for r in rules} >= {("", "centro"), ("", "sur"), ("gdl", "zapopan")}
+    gdl = next(r for r in rules if r["city"] == "gdl")
+    assert client.delete(f"/parking-rules/{gdl['id']}").status_code == 200
+
+def test_normativa_lookup_and_autofill():
+    square = [[-99.20, 19.40], [-99.10, 19.40], [-99.10, 19.50], [-99.20, 19.50], [-99.20, 19.40]]
+    geojson = {"type": "FeatureCollection", "features": [{
+        "type": "Feature",
+        "properties": {"zona": "HM", "cos": 0.7, "cus": 2.5, "cas": 0.2},
+        "geometry": {"type": "Polygon", "coordinates": [square]},
+    }]}
+    bad = {"type": "FeatureCollection", "features": [dict(geojson["features"][0], properties={"zona": "X"})]}
+    assert client.put("/normativa/test", json=bad).status_code == 400
+    resp = client.put("/normativa/test", json=geojson).json()
+    assert resp["zones"] == 1
+    assert client.get("/normativa").json()["sources"] == [{"source": "test", "zones": 1}]
+
+    zone = client.get("/normativa/lookup?lat=19.45&lng=-99.15").json()
+    assert (zone["zona"], zone["COS"], zone["CUS"], zone["CAS"]) == ("HM", 0.7, 2.5, 0.2)
+    assert client.get("/normativa/lookup?lat=0&lng=0").status_code == 404
+    rows = client.post("/normativa/lookup", json={"points": [[19.45, -99.15], [20.0, -99.15]]}).json()
+    assert rows[0]["zona"] == "HM" and rows[1] is None
+    lot = {"type": "Polygon", "coordinates": [[[-99.15, 19.45], [-99.149, 19.45], [-99.149, 19.451], [-99.15, 19.45]]]}
+    assert client.post("/normativa/lookup", json={"polygon": lot}).json()["zone"]["zona"] == "HM"
+
+    # COS/CUS/CAS left out: taken from the zone at lat/lng
+    located = {k: v for k, v in PAYLOAD.items() if k not in ("COS", "CUS", "CAS")}
+    filled = client.post("/calculate", json=dict(located, lat=19.45, lng=-99.15)).json()
+    assert filled["raw"] == client.post("/calculate", json=PAYLOAD).json()["raw"]
+    assert client.post("/calculate", json=located).status_code == 422
+
+    assert client.delete("/normativa/test").status_code == 200
+    assert client.delete("/normativa/test").status_code == 404
+    assert client.post("/calculate", json=dict(located, lat=19.45, lng=-99.15)).status_code == 422
+
+def test_normativa_autofill_uses_the_injected_index():
+    import normativa
+
+    square = [(-99.20, 19.40), (-99.10, 19.40), (-99.10, 19.50), (-99.20, 19.50), (-99.20, 19.40)]
+    zoning = normativa.ZoningIndex([(normativa.Zone(1, "override", "HM", 0.7, 2.5, 0.2), [square])])
+    main.app.dependency_overrides[main.get_zoning_index] = lambda: zoning
+    try:
+        located = dict({k: v for k, v in PAYLOAD.items() if k not in ("COS", "CUS", "CAS")}, lat=19.45, lng=-99.15)
+        assert client.post("/calculate", json=located).json()["raw"] == client.post("/calculate", json=PAYLOAD).json()["raw"]
+        sens = client.post("/sensitivity", json={"inputs": located, "steps": 1}).json()
+        assert sens["base"]["costo_total"] == client.post("/calculate", json=PAYLOAD).json()["raw"]["costo_total"]
+
+        # Batch rows outside every zone fail on their own line
+        lines = client.post("/calculate/batch", json=[located, dict(located, lat=0, lng=0)]).text.splitlines()
+        assert "raw" in json.loads(lines[0]) and "COS/CUS/CAS missing" in json.loads(lines[1])["error"]
+    finally:
+        del main.app.dependency_overrides[main.get_zoning_index]
+    assert client.post("/calculate", json=located).status_code == 422
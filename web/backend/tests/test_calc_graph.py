@@ -0,0 +1,74 @@
+from logic import compute_raw, parse_leaves, MODEL_LEAVES, MODEL_NODES
+from calc_graph import evaluate, update, downstream, graph_spec
+from nona_core import StateCache
+from test_logic import _sample_rows
+
+
+def test_evaluate_matches_compute_raw():
+    for row in _sample_rows():
+        try:
+            expected = compute_raw(row)
+        except (ValueError, TypeError):
+            continue
+        assert evaluate(row).raw == expected
+        assert parse_leaves(row) == {name: parse(row) for name, (_, parse) in MODEL_LEAVES.items()}
+
+
+def test_update_matches_full_evaluation():
+    rows = _sample_rows()
+    state = evaluate(rows[0])
+    for row in rows[1:40]:
+        changed = {k: v for k, v in row.items() if state.data.get(k) != v}
+        state = update(state, changed)
+        assert state.raw == evaluate(state.data).raw
+
+
+def test_update_recomputes_only_downstream_nodes():
+    base = {
+        'area_terreno': 500, 'valor_terreno': 10000, 'COS': 0.7, 'CUS': 2.1,
+        'costoMetroConstruccion': 12000, 'Costo_de_venta_m2': 35000, 'n_viviendas': 10,
+        'estacionamiento': True, 'tipo_estacionamiento': 8000,
+        'delegacion': ['centro'], 'Distrito': [1.0],
+    }
+    state = evaluate(base)
+    new = update(state, {'Costo_de_venta_m2': 40000})
+    assert new.recomputed == ['income', 'indirects', 'iva', 'profit', 'unit_metrics']
+    assert new.recomputed == downstream(['Costo_de_venta_m2'])
+    assert new.raw == compute_raw(dict(base, Costo_de_venta_m2=40000))
+    assert state.raw == compute_raw(base)
+
+    # A change that does not move any leaf recomputes nothing
+    same = update(new, {'Costo_de_venta_m2': 40000.0})
+    assert same.recomputed == [] and same.raw is new.raw
+
+    # Parameter changes only reach the nodes that read them
+    assert update(state, {'parameters': {'PCT_COM': 7.0}}).recomputed == ['indirects', 'iva', 'profit', 'unit_metrics']
+
+
+def test_graph_spec_is_topological():
+    spec = graph_spec()
+    known = {leaf['name'] for leaf in spec['inputs']}
+    for node in spec['nodes']:
+        assert set(node['inputs']) <= known, node['name']
+        known.update(node['outputs'])
+    assert [n['name'] for n in spec['nodes']] == [n.name for n in MODEL_NODES]
+
+
+def test_state_cache_updates_per_key():
+    cache = StateCache(maxsize=2)
+    base = {'area_terreno': 500, 'valor_terreno': 10000, 'CUS': 2.1, 'Costo_de_venta_m2': 35000}
+    assert len(cache.solve('a', base).recomputed) == len(MODEL_NODES)
+
+    state = cache.solve('a', dict(base, Costo_de_venta_m2=40000))
+    assert state.recomputed == downstream(['Costo_de_venta_m2'])
+    assert state.raw == compute_raw(dict(base, Costo_de_venta_m2=40000))
+    assert cache.solve('a', dict(base, Costo_de_venta_m2=40000)).recomputed == []
+
+    # Keys are independent; an unwired input falls back to a full evaluation
+    assert len(cache.solve('b', base).recomputed) == len(MODEL_NODES)
+    partial = {k: v for k, v in base.items() if k != 'CUS'}
+    assert cache.solve('b', partial).raw == compute_raw(partial)
+
+    # Least recently used key is dropped beyond maxsize
+    cache.solve('c', base)
+    assert len(cache.solve('a', base).recomputed) == len(MODEL_NODES)
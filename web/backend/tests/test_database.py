@@ -0,0 +1,76 @@
+import os
+import tempfile
+
+from sqlalchemy import text
+
+import database
+
+
+def _pragma(engine, name):
+    with engine.connect() as conn:
+        return conn.execute(text(f"PRAGMA {name}")).scalar()
+
+
+def test_sqlite_engine_pragmas():
+    engine = database.make_engine("sqlite:///" + os.path.join(tempfile.mkdtemp(), "pragmas.db"))
+    try:
+        assert _pragma(engine, "journal_mode") == "wal"
+        assert _pragma(engine, "synchronous") == 1  # NORMAL
+        assert _pragma(engine, "busy_timeout") == database.SQLITE_PRAGMAS["busy_timeout"]
+        assert _pragma(engine, "mmap_size") == database.SQLITE_PRAGMAS["mmap_size"]
+    finally:
+        engine.dispose()
+
+
+def test_in_memory_sqlite_skips_wal():
+    engine = database.make_engine("sqlite://")
+    try:
+        assert _pragma(engine, "journal_mode") == "memory"
+        assert _pragma(engine, "synchronous") == 1
+    finally:
+        engine.dispose()
+
+
+def test_upgrade_schema_brings_a_baseline_database_up_to_date():
+    import json
+    import sqlite3
+
+    path = os.path.join(tempfile.mkdtemp(), "baseline.db")
+    conn = sqlite3.connect(path)
+    # The scenarios table as the first release created it
+    conn.executescript(
+        "CREATE TABLE customers (id INTEGER PRIMARY KEY, name VARCHAR, created_at DATETIME);"
+        "CREATE TABLE scenarios (id INTEGER PRIMARY KEY, name VARCHAR, customer_id INTEGER REFERENCES customers(id),"
+        " created_at DATETIME, input_data JSON, result_summary JSON);"
+    )
+    inputs = {"area_terreno": 1000, "CUS": 2.5, "n_viviendas": 10, "lat": 19.4, "lng": -99.1}
+    summary = {"utilidad": "20.00%", "costo_total": "$1,234.50", "roi": 20.0}
+    conn.execute("INSERT INTO customers (id, name) VALUES (1, 'Historico')")
+    conn.execute("INSERT INTO scenarios (customer_id, name, input_data, result_summary) VALUES (1, 'ok', ?, ?)",
+                 (json.dumps(inputs), json.dumps(summary)))
+    conn.execute("INSERT INTO scenarios (customer_id, name, input_data, result_summary) VALUES (1, 'fallido', ?, '{}')",
+                 (json.dumps(inputs),))
+    conn.commit()
+    conn.close()
+
+    engine = database.make_engine("sqlite:///" + path)
+    try:
+        database.Base.metadata.create_all(bind=engine)
+        database.upgrade_schema(engine)
+        database.upgrade_schema(engine)  # idempotent
+
+        Session = database.sessionmaker(bind=engine)
+        with Session() as db:
+            ok, failed = db.query(database.Scenario).order_by(database.Scenario.id).all()
+            assert (ok.utilidad, ok.roi, ok.costo_total, ok.cus_area, ok.n_viviendas) == (20.0, 25.0, 1234.5, 2500.0, 10)
+            assert (ok.lat, ok.lng) == (19.4, -99.1)
+            assert failed.utilidad is None and failed.roi is None and failed.lat == 19.4
+            total, page = database.query_scenarios(db, 1, sort="-roi")
+            assert total == 2 and page[0].id == ok.id
+            db.add(database.Scenario(customer_id=1, name="nuevo", input_data=inputs, result_summary=summary, roi=1.0))
+            db.commit()
+        with engine.connect() as conn:
+            indexes = {row[1] for row in conn.execute(text("PRAGMA index_list(scenarios)"))}
+        assert {"ix_scenarios_customer_roi", "ix_scenarios_lat_lng"} <= indexes
+    finally:
+        engine.dispose()
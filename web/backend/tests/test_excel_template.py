@@ -0,0 +1,26 @@
+import io
+import zipfile
+
+from logic import run_calculation, generate_excel_content
+from excel_template import get_template, render_report
+from test_api import PAYLOAD
+
+
+def _parts(content):
+    package = zipfile.ZipFile(io.BytesIO(content))
+    # Document timestamps differ between builds
+    return {name: package.read(name) for name in package.namelist() if name != 'docProps/core.xml'}
+
+
+def test_template_matches_full_generation():
+    for payload in (PAYLOAD, dict(PAYLOAD, usos_mixtos=True, num_locales=3, costo_local_m2=40000),
+                    dict(PAYLOAD, estacionamiento=False, CUS=4.0)):
+        result = run_calculation(dict(payload))
+        assert get_template().render(result) is not None
+        assert _parts(render_report(result)) == _parts(generate_excel_content(result))
+
+
+def test_template_falls_back_for_other_layouts():
+    error = {"error": "Invalid input"}
+    assert get_template().render(error) is None
+    assert _parts(render_report(error)) == _parts(generate_excel_content(error))
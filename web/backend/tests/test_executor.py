@@ -0,0 +1,56 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+import executor
+
+
+def _block(seconds):
+    time.sleep(seconds)
+    return seconds
+
+
+def test_event_loop_keeps_running_during_blocking_work():
+    pool = executor.RouteExecutor('test', 'thread', 1)
+
+    async def scenario():
+        ticks = 0
+
+        async def ticker():
+            nonlocal ticks
+            while True:
+                await asyncio.sleep(0.01)
+                ticks += 1
+
+        task = asyncio.create_task(ticker())
+        result = await pool.run(_block, 0.3)
+        task.cancel()
+        return result, ticks
+
+    try:
+        result, ticks = asyncio.run(scenario())
+    finally:
+        pool.shutdown()
+    assert result == 0.3
+    # Calling _block inline would have frozen the ticker for the whole 0.3 s
+    assert ticks >= 10
+
+
+def test_process_pool_runs_module_functions():
+    pool = executor.RouteExecutor('test', 'process', 1)
+    try:
+        assert asyncio.run(pool.run(_block, 0)) == 0
+    finally:
+        pool.shutdown()
+
+
+def test_inline_runs_on_the_calling_thread():
+    pool = executor.RouteExecutor('test', 'inline')
+    assert asyncio.run(pool.run(threading.get_ident)) == threading.get_ident()
+
+
+def test_unknown_pool_kind():
+    with pytest.raises(ValueError):
+        executor.RouteExecutor('test', 'fiber', 1)
@@ -64,3 +64,107 @@ def test_run_calculation_cost_fix():
     
     direct_cost = result['raw']['costo_directo']
     assert direct_cost == 100000.0, f"Expected 100,000 but got {direct_cost}. Double counting might still be present."
+
+def _sample_rows():
+    import random
+    rng = random.Random(7)
+    rows = []
+    for i in range(200):
+        rows.append({
+            'area_terreno': rng.uniform(100, 5000),
+            'valor_terreno': rng.uniform(1000, 40000),
+            'COS': rng.uniform(0.3, 1.0),
+            'CUS': rng.uniform(0.5, 6.0),
+            'CAS': rng.uniform(0.0, 0.4),
+            'area_retiros': rng.uniform(0, 80),
+            'demolicion': rng.random() < 0.5,
+            'area_demolicion': rng.uniform(0, 500),
+            'n_viviendas': rng.randint(0, 120),
+            'usos_mixtos': rng.random() < 0.5,
+            'num_locales': rng.randint(0, 6),
+            'costo_local_m2': rng.uniform(20000, 60000),
+            'costoMetroConstruccion': rng.uniform(8000, 25000),
+            'Costo_de_venta_m2': rng.uniform(20000, 90000),
+            'areaCirculacionPorcentaje': rng.uniform(0.05, 0.3),
+            'estacionamiento': rng.random() < 0.7,
+            'tipo_estacionamiento': rng.uniform(5000, 12000),
+            'delegacion': rng.choice([['centro'], [' Norte '], ['sur', 'poniente'], ['desconocida']]),
+            'Distrito': rng.choice([[1.0], [0.5], [1.0, 2.0]]),
+            'utilidadDeseada': rng.uniform(5, 40),
+            'correrSimulacion': rng.random() < 0.5,
+            'iva_percent': 0.16,
+        })
+    return rows
+
+def test_run_calculation_batch_matches_scalar():
+    from logic import run_calculation_batch, batch_row, BATCH_INPUTS
+    rows = _sample_rows()
+    rows[3]['area_terreno'] = 'not-a-number'
+
+    keys = [k for k, _, _ in BATCH_INPUTS] + ['delegacion', 'Distrito']
+    columns = {k: [r[k] for r in rows] for k in keys}
+    params = {'PCT_HONORARIOS': 12.0}
+    batch = run_calculation_batch(columns, params)
+
+    assert batch['n'] == len(rows)
+    for i, row in enumerate(rows):
+        expected = run_calculation(dict(row, parameters=params))
+        got = batch_row(batch, i)
+        if "error" in expected:
+            assert batch['mask'][i] == 0
+            assert got == {"error": expected["error"]}
+        else:
+            assert batch['mask'][i] == 1
+            assert got['raw'] == expected['raw']
+
+def test_run_calculation_batch_broadcasts_scalars():
+    from logic import run_calculation_batch
+    batch = run_calculation_batch({'area_terreno': [100.0, 200.0], 'valor_terreno': 1000, 'CUS': 2.0})
+    assert list(batch['raw']['valor_terreno']) == [100000.0, 200000.0]
+    assert list(batch['raw']['cus_area']) == [200.0, 400.0]
+
+    with pytest.raises(ValueError):
+        run_calculation_batch({'area_terreno': [1.0, 2.0], 'CUS': [1.0]})
+
+def test_run_calculation_formatting_modes():
+    from logic import MetricsView, format_metrics
+    data = dict(_sample_rows()[0], parameters={})
+
+    raw_only = run_calculation(data, formatting="none")
+    assert set(raw_only) == {"raw"}
+
+    result = run_calculation(data)
+    assert isinstance(result["metrics"], MetricsView)
+    assert result["raw"] == raw_only["raw"]
+    assert dict(result["metrics"]) == format_metrics(raw_only["raw"])
+    assert result["metrics"]["Text_Area_Terreno"] == f"{data['area_terreno']:.2f} m2"
+
+    with pytest.raises(ValueError):
+        run_calculation(data, formatting="html")
+
+def test_parking_rules_precedence_and_unknown_delegaciones():
+    from logic import run_calculation_batch, batch_row, ParkingRules
+    rules = ParkingRules([
+        ('', 'centro', '', 30.0),
+        ('cdmx', 'Centro', '', 40.0),
+        ('cdmx', 'centro', 'H3', 50.0),
+    ])
+    assert rules.comercial[rules.find('Guadalajara', 'CENTRO ')] == 30.0
+    assert rules.comercial[rules.find('CDMX', 'centro')] == 40.0
+    assert rules.comercial[rules.find('cdmx', 'centro', 'h3')] == 50.0
+    assert rules.find('cdmx', 'atlantis') == -1
+
+    row = {
+        'area_terreno': 1000, 'valor_terreno': 5000, 'COS': 0.7, 'CUS': 2.5,
+        'estacionamiento': True, 'tipo_estacionamiento': 8000, 'n_viviendas': 10,
+        'costoMetroConstruccion': 10000, 'Costo_de_venta_m2': 30000, 'areaCirculacionPorcentaje': 0.15,
+        'delegacion': ['centro', 'atlantis'], 'Distrito': [1.0, 1.0],
+        'ciudad': 'cdmx', 'distrito_zona': ['H3'], 'parking_rules': rules,
+    }
+    raw = run_calculation(row)['raw']
+    assert raw['parking_unknown'] == ['atlantis']
+    # One spot per 50 m2 of commercial area (COS area minus circulation)
+    assert raw['parking_spots_com'] == (700 - 2500 * 0.15) / 50.0
+
+    batch = run_calculation_batch({k: [v] for k, v in row.items() if k != 'parking_rules'}, parking_rules=rules)
+    assert batch_row(batch, 0)['raw'] == raw
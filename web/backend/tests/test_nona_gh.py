@@ -0,0 +1,106 @@
+import os
+import sys
+import types
+
+import pytest
+
+import nona_core
+import run_log
+
+NONA_GH = os.path.join(os.path.dirname(__file__), '..', '..', '..', 'NoNA.py')
+
+INPUTS = {
+    'valor_terreno': 5000, 'COS': 0.7, 'CUS': 2.5,
+    'costoMetroConstruccion': 10000, 'Costo_de_venta_m2': 30000,
+    'estacionamiento': True, 'tipo_estacionamiento': 8000, 'n_viviendas': 10,
+}
+
+
+class Lot:
+    """Lot surface with a known area; area None makes AreaMassProperties fail."""
+
+    def __init__(self, area):
+        self.area = area
+
+
+class Tree:
+    """Grasshopper data tree: one branch per lot."""
+
+    def __init__(self, branches):
+        self.Branches = branches
+
+    def AllData(self):
+        return [item for branch in self.Branches for item in branch]
+
+
+def _compute(surface, *args):
+    return types.SimpleNamespace(Area=surface.area) if surface.area is not None else None
+
+
+@pytest.fixture
+def gh(monkeypatch):
+    """NoNA.py helpers (everything above MAIN EXECUTION) with Rhino stubbed out."""
+    geometry = types.SimpleNamespace(
+        Curve=type('Curve', (), {}), Surface=type('Surface', (), {}), GeometryBase=type('GeometryBase', (), {}),
+        AreaMassProperties=types.SimpleNamespace(Compute=_compute),
+    )
+    monkeypatch.setitem(sys.modules, 'Rhino', types.SimpleNamespace(Geometry=geometry))
+    monkeypatch.setitem(sys.modules, 'Rhino.Geometry', geometry)
+    monkeypatch.setitem(sys.modules, 'scriptcontext', types.SimpleNamespace(sticky={}))
+    with open(NONA_GH, encoding='utf-8') as f:
+        source = f.read().split('# MAIN EXECUTION')[0]
+    namespace = {'__name__': 'NoNA'}
+    exec(compile(source, NONA_GH, 'exec'), namespace)
+    namespace.update(nona_core=nona_core, run_log=run_log)
+    return types.SimpleNamespace(**namespace)
+
+
+def test_build_lot_columns_broadcasts_single_items(gh):
+    inputs = dict(
+        INPUTS, valor_terreno=[5000], Costo_de_venta_m2=Tree([[30000], [32000]]),
+        delegacion=Tree([['centro', 'norte'], ['sur']]), Distrito=Tree([[1.0, 2.0]]),
+    )
+    columns = gh.build_lot_columns(inputs, [1000.0, 800.0])
+
+    # One-item lists are shared by every lot, scalars stay scalars
+    assert columns['valor_terreno'] == [5000, 5000]
+    assert columns['COS'] == 0.7
+    # Other trees are flattened, LIST_INPUTS keep one branch per lot
+    assert columns['Costo_de_venta_m2'] == [30000, 32000]
+    assert columns['delegacion'] == [['centro', 'norte'], ['sur']]
+    assert columns['Distrito'] == [[1.0, 2.0], [1.0, 2.0]]
+    assert columns['area_terreno'] == [1000.0, 800.0]
+    assert 'ciudad' not in columns
+
+
+def test_solve_lots_keeps_failed_lots_in_their_row(gh):
+    inputs = dict(
+        INPUTS, area_terreno=[Lot(1000.0), None, Lot(None), Lot(800.0)],
+        delegacion=Tree([['centro']]), Distrito=Tree([[1.0]]),
+    )
+    lots = gh.solve_lots(inputs)
+
+    assert lots['Errores_lotes'] == [None, "Invalid Surface input", "Could not compute area properties", None]
+    assert lots['Area_de_terreno'][0] == "1000.00 m2" and lots['Area_de_terreno'][3] == "800.00 m2"
+    assert lots['Utilidad_Final'][1] == "Error: Invalid Surface input"
+    assert lots['Utilidad_lotes'][1] is None and lots['solved'][2] is None
+    assert all(len(lots[name]) == 4 for name in gh.OUTPUT_NAMES)
+
+    # Each solved lot matches the single-lot model on the same request
+    request, raw = lots['solved'][3]
+    assert request['area_terreno'] == 800.0 and request['delegacion'] == ['centro']
+    expected = nona_core.compute_raw(request)
+    assert raw['utilidad_optimizada'] == pytest.approx(expected['utilidad_optimizada'])
+    assert lots['Utilidad_lotes'][3] == pytest.approx(expected['utilidad_optimizada'])
+
+    table = gh.lot_summary_rows(lots['Errores_lotes'], lots['solved'])
+    assert table[0][0] == "Lote" and table[0][-1] == "Error"
+    assert [row[0] for row in table[1:]] == [0, 1, 2, 3]
+    assert table[2][-1] == "Invalid Surface input" and set(table[2][1:-1]) == {""}
+    assert table[1][-1] == "" and table[1][1] == pytest.approx(1000.0)
+
+
+def test_solve_lots_rejects_misaligned_columns(gh):
+    inputs = dict(INPUTS, area_terreno=[Lot(1000.0), Lot(900.0), Lot(800.0)], Costo_de_venta_m2=[30000, 32000])
+    with pytest.raises(ValueError, match="Column lengths do not match"):
+        gh.solve_lots(inputs)
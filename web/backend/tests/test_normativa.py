@@ -0,0 +1,100 @@
+import struct
+
+import pytest
+
+import normativa
+
+
+def _square(x0, y0, size):
+    return [(x0, y0), (x0 + size, y0), (x0 + size, y0 + size), (x0, y0 + size), (x0, y0)]
+
+
+def _zone(i, name, cos, cus, cas=None):
+    return normativa.Zone(i, 'test', name, cos, cus, cas)
+
+
+def _index():
+    # A general zone with a hole, an overlay inside it, and a grid of blocks
+    zones = [
+        (_zone(0, 'H', 0.6, 1.2, 0.2), [_square(0, 0, 10), list(reversed(_square(8, 8, 1)))]),
+        (_zone(1, 'HM', 0.7, 2.8), [_square(2, 2, 2)]),
+    ]
+    zones += [(_zone(2 + i, f'B{i}', 0.8, 3.0, 0.1), [_square(20 + i, 0, 1)]) for i in range(50)]
+    return normativa.ZoningIndex(zones, version=3)
+
+
+def test_zoning_index_lookups():
+    index = _index()
+    assert index.version == 3 and len(index) == 52
+    assert index.lookup(5, 5).zona == 'H'
+    # The overlay is smaller than the zone around it, so it wins
+    assert index.lookup(3, 3).zona == 'HM'
+    assert index.lookup(8.5, 8.5) is None  # hole
+    assert index.lookup(0.5, 37.5).zona == 'B17'
+    assert index.lookup(0.5, 100) is None
+    assert [z and z.zona for z in index.lookup_many([(5, 5), (0.5, 20.5), (-1, -1)])] == ['H', 'B0', None]
+
+    # An L-shaped lot whose centroid falls outside it, with a corner in the overlay
+    lot = [(1, 1), (3, 1), (3, 2.5), (1.5, 2.5), (1.5, 6), (1, 6)]
+    zone, touched = index.lookup_polygon(lot)
+    assert zone.zona == 'H'
+    assert sorted(z.zona for z in touched) == ['H', 'HM']
+
+    assert normativa.ZoningIndex().lookup(0, 0) is None
+
+
+def test_zone_values_need_coefficients():
+    values = normativa.zone_values({'ZONA': 'H3', 'Cos': '0.7', 'CUS': 2.1}, [_square(0, 0, 1)])
+    assert (values['zona'], values['cos'], values['cus'], values['cas']) == ('H3', 0.7, 2.1, None)
+    with pytest.raises(ValueError):
+        normativa.zone_values({'zona': 'H3', 'COS': 0.7}, [_square(0, 0, 1)])
+
+
+def _write_shapefile(base, polygons, records):
+    content = []
+    for rings in polygons:
+        points = [p for ring in rings for p in ring]
+        parts, start = [], 0
+        for ring in rings:
+            parts.append(start)
+            start += len(ring)
+        body = struct.pack('<i4d2i', 5, 0, 0, 0, 0, len(rings), len(points))
+        body += struct.pack('<%di' % len(parts), *parts)
+        body += b''.join(struct.pack('<2d', *p) for p in points)
+        content.append(body)
+    data = b''.join(struct.pack('>2i', n + 1, len(body) // 2) + body for n, body in enumerate(content))
+    with open(base + '.shp', 'wb') as f:
+        f.write(struct.pack('>i20xi', 9994, (100 + len(data)) // 2) + struct.pack('<2i8d', 1000, 5, *[0] * 8))
+        f.write(data)
+
+    fields = [('ZONA', 'C', 10), ('COS', 'N', 8), ('CUS', 'N', 8)]
+    header_size = 32 + 32 * len(fields) + 1
+    record_size = 1 + sum(size for _, _, size in fields)
+    with open(base + '.dbf', 'wb') as f:
+        f.write(struct.pack('<B3xIHH20x', 3, len(records), header_size, record_size))
+        for name, kind, size in fields:
+            f.write(struct.pack('<11sc4xB15x', name.encode('ascii'), kind.encode('ascii'), size))
+        f.write(b'\r')
+        for record in records:
+            f.write(b' ' + b''.join(str(v).encode('latin-1').ljust(size)[:size] for v, (_, _, size) in zip(record, fields)))
+
+
+def test_read_shapefile(tmp_path):
+    base = str(tmp_path / 'zonas')
+    _write_shapefile(base, [[_square(0, 0, 1)], [_square(1, 0, 1), _square(1.2, 0.2, 0.5)]],
+                     [('Centro', 0.7, 2.8), ('Periferia', 0.6, 1.2)])
+    features = list(normativa.read_features(base + '.shp'))
+    assert [p['ZONA'] for p, _ in features] == ['Centro', 'Periferia']
+    assert features[1][0]['COS'] == 0.6 and len(features[1][1]) == 2
+
+    index = normativa.ZoningIndex(
+        (normativa.Zone(i, 'shp', p['ZONA'], p['COS'], p['CUS'], None), rings)
+        for i, (p, rings) in enumerate(features)
+    )
+    assert index.lookup(0.5, 1.1).zona == 'Periferia'
+    assert index.lookup(0.5, 1.5) is None  # inside the hole
+
+    with open(base + '.prj', 'w') as f:
+        f.write('PROJCS["WGS_1984_UTM_Zone_14N"]')
+    with pytest.raises(ValueError):
+        list(normativa.read_shapefile(base + '.shp'))
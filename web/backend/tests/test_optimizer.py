@@ -0,0 +1,71 @@
+import pytest
+
+from logic import run_calculation
+from optimizer import optimize_massing, pareto_front
+
+LOT = {
+    'area_terreno': 1000,
+    'valor_terreno': 6000,
+    'COS': 0.7,
+    'CUS': 3.0,
+    'CAS': 0.2,
+    'costoMetroConstruccion': 14000,
+    'Costo_de_venta_m2': 50000,
+    'costo_local_m2': 45000,
+    'areaCirculacionPorcentaje': 0.15,
+    'estacionamiento': True,
+    'tipo_estacionamiento': 8000,
+    'delegacion': ['centro'],
+    'Distrito': [1.0],
+}
+
+def test_pareto_front():
+    pts = [
+        {'utilidad': 10, 'costo_total': 5, 'n_viviendas': 10},
+        {'utilidad': 8, 'costo_total': 6, 'n_viviendas': 9},   # dominated by the first
+        {'utilidad': 8, 'costo_total': 3, 'n_viviendas': 9},   # cheaper
+        {'utilidad': 5, 'costo_total': 9, 'n_viviendas': 20},  # more units
+    ]
+    front = pareto_front(pts)
+    assert pts[1] not in front
+    assert len(front) == 3
+
+def test_optimize_massing_prunes_and_matches_model():
+    res = optimize_massing(
+        LOT, {}, range(1, 121), num_locales_options=(0, 2), parking_options=(True, False),
+        min_unit_area=50
+    )
+    assert res['pruned'] > 0
+    assert res['evaluated'] + res['pruned'] == res['candidates']
+    best = res['best']
+    assert best is not None and best == res['pareto'][0]
+    assert best['area_promedio_vivienda'] >= 50
+    assert best['CUS'] <= LOT['CUS'] and best['COS'] <= LOT['COS']
+
+    raw = run_calculation(dict(
+        LOT, n_viviendas=best['n_viviendas'], COS=best['COS'], CUS=best['CUS'],
+        num_locales=best['num_locales'], usos_mixtos=best['usos_mixtos'],
+        estacionamiento=best['estacionamiento'], parameters={}
+    ))['raw']
+    assert raw['utilidad_monto'] == best['utilidad']
+
+    # No feasible scheme beats the best on profit
+    assert all(p['utilidad'] <= best['utilidad'] for p in res['pareto'])
+
+def test_optimize_massing_rejects_bad_levels():
+    with pytest.raises(ValueError):
+        optimize_massing(LOT, {}, range(1, 10), cus_levels=(1.5,))
+
+def test_optimize_massing_keys_parking_rules_by_city(monkeypatch):
+    import nona_core
+    rules = nona_core.ParkingRules([('', 'centro', '', 35.0), ('gdl', 'centro', '', 5.0)])
+    monkeypatch.setattr(nona_core, '_parking_rules', rules)
+    data = dict(LOT, ciudad='gdl')
+    best = optimize_massing(data, {}, range(10, 41, 10), min_unit_area=50)['best']
+
+    scheme = dict(
+        n_viviendas=best['n_viviendas'], COS=best['COS'], CUS=best['CUS'], num_locales=best['num_locales'],
+        usos_mixtos=best['usos_mixtos'], estacionamiento=best['estacionamiento'], parameters={}
+    )
+    assert run_calculation(dict(data, **scheme))['raw']['utilidad_monto'] == best['utilidad']
+    assert run_calculation(dict(LOT, **scheme))['raw']['utilidad_monto'] != best['utilidad']
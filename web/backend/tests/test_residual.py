@@ -0,0 +1,61 @@
+import math
+
+import pytest
+
+import residual
+from logic import run_calculation
+from residual import brentq, solve_residual_land_value, solve_residual_land_value_batch
+
+BASE = {
+    'area_terreno': 1000,
+    'valor_terreno': 5000,
+    'COS': 0.7,
+    'CUS': 2.5,
+    'CAS': 0.2,
+    'demolicion': True,
+    'area_demolicion': 100,
+    'n_viviendas': 30,
+    'usos_mixtos': True,
+    'num_locales': 3,
+    'costo_local_m2': 40000,
+    'costoMetroConstruccion': 12000,
+    'Costo_de_venta_m2': 60000,
+    'areaCirculacionPorcentaje': 0.15,
+    'estacionamiento': True,
+    'tipo_estacionamiento': 8000,
+    'delegacion': ['centro'],
+    'Distrito': [1.0],
+    'utilidadDeseada': 20.0,
+    'parameters': {},
+}
+
+def test_brentq():
+    root = brentq(lambda x: x * x - 2.0, 0.0, 2.0)
+    assert root == pytest.approx(math.sqrt(2.0), abs=1e-9)
+    with pytest.raises(ValueError):
+        brentq(lambda x: x * x + 1.0, 0.0, 2.0)
+
+def test_residual_closed_form_hits_target_margin():
+    res = solve_residual_land_value(BASE)
+    assert res['method'] == 'closed_form'
+    assert res['feasible']
+    check = run_calculation(dict(BASE, valor_terreno=res['valor_terreno_m2']))['raw']
+    assert check['utilidad_inicial'] == pytest.approx(20.0, abs=1e-6)
+
+def test_residual_brent_fallback(monkeypatch):
+    # Force the verification to fail so the bracketed search is exercised
+    monkeypatch.setattr(residual, 'MARGIN_TOLERANCE', -1.0)
+    res = solve_residual_land_value(BASE)
+    assert res['method'] == 'brent'
+    assert res['utilidad'] == pytest.approx(20.0, abs=1e-6)
+
+def test_residual_batch_matches_scalar():
+    rows = [BASE, dict(BASE, utilidadDeseada=35.0), dict(BASE, Costo_de_venta_m2=10000), dict(BASE, area_terreno='x')]
+    keys = [k for k in BASE if k != 'parameters']
+    columns = {k: [r[k] for r in rows] for k in keys}
+    results = solve_residual_land_value_batch(columns, {})
+
+    for row, res in zip(rows[:3], results):
+        assert res == solve_residual_land_value(row)
+    assert results[2]['feasible'] is False
+    assert 'error' in results[3]
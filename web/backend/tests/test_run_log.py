@@ -0,0 +1,92 @@
+import csv
+import os
+
+import nona_core
+import run_log
+
+REQUEST = {
+    'area_terreno': 1000, 'valor_terreno': 5000, 'COS': 0.7, 'CUS': 2.5,
+    'costoMetroConstruccion': 10000, 'Costo_de_venta_m2': 30000,
+    'estacionamiento': True, 'tipo_estacionamiento': 8000, 'n_viviendas': 10,
+    'delegacion': ['centro'], 'Distrito': [1.0],
+}
+
+
+def _row(request):
+    return run_log.input_hash(request), run_log.run_values(request, nona_core.compute_raw(request))
+
+
+def test_run_log_appends_buffered_rows_and_replays_sidecar(tmp_path):
+    log = run_log.RunLog(str(tmp_path), delay=60)
+    requests = [dict(REQUEST, Costo_de_venta_m2=30000 + i) for i in range(3)]
+    report = str(tmp_path / 'resultados_noNa.csv')
+    for request in requests:
+        assert log.append([_row(request)], (report, [['Variable', 'Value'], ['x', request['Costo_de_venta_m2']]]))
+    # The same inputs again are not logged twice
+    assert not log.append([_row(requests[-1])])
+    assert not os.path.exists(log.csv_path) and log.pending == 3
+
+    assert log.flush() == 3
+    log.append([_row(dict(REQUEST, Costo_de_venta_m2=40000))])
+    assert log.flush() == 1
+
+    with open(log.csv_path, newline='', encoding='utf-8') as f:
+        rows = list(csv.DictReader(f))
+    assert [float(r['Costo_de_venta_m2']) for r in rows] == [30000, 30001, 30002, 40000]
+    assert rows[0]['input_hash'] == run_log.input_hash(requests[0])
+    assert rows[0]['delegacion'] == 'centro'
+    with open(report, newline='', encoding='utf-8') as f:
+        assert list(csv.reader(f))[1] == ['x', '30002']
+
+    replay = run_log.read_sidecar(log.sidecar_path)
+    assert replay['input_hash'] == [r['input_hash'] for r in rows]
+    assert list(replay['utilidad_optimizada']) == [float(r['utilidad_optimizada']) for r in rows]
+    assert replay['costo_total'][0] == nona_core.compute_raw(requests[0])['costo_total']
+    assert not [name for name in os.listdir(tmp_path) if name.endswith('.tmp')]
+
+
+def test_run_log_keeps_rows_when_a_file_cannot_be_replaced(tmp_path, monkeypatch):
+    log = run_log.RunLog(str(tmp_path), delay=60)
+    write_csv = log._write_csv
+
+    def locked(rows):
+        # What opening the CSV raises on Windows while Excel holds it open
+        raise PermissionError(13, 'Permission denied', log.csv_path)
+
+    monkeypatch.setattr(log, '_write_csv', locked)
+    log.append([_row(REQUEST)])
+    assert log.flush() == 0
+    assert log.pending == 1 and log.last_error
+
+    # The sidecar went through; the CSV gets the row once it can be written
+    assert len(run_log.read_sidecar(log.sidecar_path)['input_hash']) == 1
+    monkeypatch.setattr(log, '_write_csv', write_csv)
+    assert log.flush() == 1
+    assert log.pending == 0 and log.last_error is None
+    assert len(run_log.read_sidecar(log.sidecar_path)['input_hash']) == 1
+
+
+def test_run_log_appends_in_place_and_trims_a_torn_tail(tmp_path):
+    log = run_log.RunLog(str(tmp_path), delay=60)
+    log.append([_row(REQUEST)])
+    log.flush()
+    inodes = os.stat(log.csv_path).st_ino, os.stat(log.sidecar_path).st_ino
+    log.append([_row(dict(REQUEST, Costo_de_venta_m2=31000))])
+    log.flush()
+    assert (os.stat(log.csv_path).st_ino, os.stat(log.sidecar_path).st_ino) == inodes
+
+    # A crash mid-append leaves half a record in each file
+    with open(log.sidecar_path, 'ab') as f:
+        f.write(b'\x01' * 11)
+    with open(log.csv_path, 'ab') as f:
+        f.write(b'0123abcd,1700000000.0,10')
+
+    reopened = run_log.RunLog(str(tmp_path), delay=60)
+    reopened.append([_row(dict(REQUEST, Costo_de_venta_m2=32000))])
+    assert reopened.flush() == 1
+    with open(log.csv_path, newline='', encoding='utf-8') as f:
+        rows = list(csv.DictReader(f))
+    assert [float(r['Costo_de_venta_m2']) for r in rows] == [30000, 31000, 32000]
+    replay = run_log.read_sidecar(log.sidecar_path)
+    assert replay['input_hash'] == [r['input_hash'] for r in rows]
+    assert list(replay['Costo_de_venta_m2']) == [30000, 31000, 32000]
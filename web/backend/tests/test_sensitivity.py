@@ -0,0 +1,62 @@
+import pytest
+
+from logic import run_calculation
+from sensitivity import run_sensitivity, perturbation_grid
+
+BASE = {
+    'area_terreno': 800,
+    'valor_terreno': 9000,
+    'COS': 0.7,
+    'CUS': 3.0,
+    'CAS': 0.2,
+    'n_viviendas': 20,
+    'costoMetroConstruccion': 14000,
+    'Costo_de_venta_m2': 45000,
+    'areaCirculacionPorcentaje': 0.15,
+    'estacionamiento': True,
+    'tipo_estacionamiento': 8000,
+    'delegacion': ['centro'],
+    'Distrito': [1.0],
+    'correrSimulacion': True,
+}
+
+def test_perturbation_grid():
+    assert perturbation_grid(20, 2) == [-20.0, -10.0, 0.0, 10.0, 20.0]
+    with pytest.raises(ValueError):
+        perturbation_grid(20, 0)
+
+def test_sensitivity_matches_single_calculations():
+    params = {'PCT_COM': 5.0}
+    res = run_sensitivity(BASE, params, range_pct=10, steps=2)
+
+    base = run_calculation(dict(BASE, correrSimulacion=False, parameters=params))['raw']
+    assert res['base']['costo_total'] == base['costo_total']
+
+    # +10% sale price, evaluated on its own
+    up = run_calculation(dict(BASE, correrSimulacion=False, Costo_de_venta_m2=45000 * 1.1, parameters=params))['raw']
+    assert res['spider']['Costo_de_venta_m2']['utilidad'][-1] == up['utilidad_monto']
+
+    # Parameter perturbation
+    com = run_calculation(dict(BASE, correrSimulacion=False, parameters={'PCT_COM': 5.0 * 0.9}))['raw']
+    assert res['spider']['PCT_COM']['costo_total'][0] == com['costo_total']
+
+    # Tornado bars are sorted by swing and the zero-delta point equals the base
+    swings = [b['swing'] for b in res['tornado']['utilidad']]
+    assert swings == sorted(swings, reverse=True)
+    assert res['spider']['CUS']['roi'][2] == res['base']['roi']
+
+def test_sensitivity_rejects_unknown_variables():
+    with pytest.raises(ValueError):
+        run_sensitivity(BASE, {}, variables=['n_viviendas'])
+
+def test_sensitivity_keys_parking_rules_by_city(monkeypatch):
+    import nona_core
+    rules = nona_core.ParkingRules([('', 'centro', '', 35.0), ('gdl', 'centro', '', 5.0)])
+    monkeypatch.setattr(nona_core, '_parking_rules', rules)
+    data = dict(BASE, ciudad='gdl')
+    res = run_sensitivity(data, {}, range_pct=10, steps=1)
+
+    gdl = run_calculation(dict(data, correrSimulacion=False, parameters={}))['raw']
+    anywhere = run_calculation(dict(BASE, correrSimulacion=False, parameters={}))['raw']
+    assert gdl['costo_total'] != anywhere['costo_total']
+    assert res['base']['costo_total'] == gdl['costo_total']
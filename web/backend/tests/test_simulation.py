@@ -0,0 +1,96 @@
+import pytest
+
+from logic import run_calculation
+from simulation import run_montecarlo, percentile, histogram
+
+BASE = {
+    'area_terreno': 800,
+    'valor_terreno': 9000,
+    'COS': 0.7,
+    'CUS': 3.0,
+    'n_viviendas': 20,
+    'costoMetroConstruccion': 14000,
+    'Costo_de_venta_m2': 45000,
+    'areaCirculacionPorcentaje': 0.15,
+    'estacionamiento': True,
+    'tipo_estacionamiento': 8000,
+    'delegacion': ['centro'],
+    'Distrito': [1.0],
+}
+
+DISTRIBUTIONS = {
+    'costoMetroConstruccion': {'dist': 'triangular', 'low': 12000, 'mode': 14000, 'high': 18000},
+    'Costo_de_venta_m2': {'dist': 'normal', 'mean': 45000, 'std': 4000},
+    'absorcion': {'dist': 'uniform', 'low': 0.8, 'high': 1.0},
+}
+
+def test_percentile_and_histogram():
+    values = [0.0, 1.0, 2.0, 3.0, 4.0]
+    assert percentile(values, 0.5) == 2.0
+    assert percentile(values, 0.1) == pytest.approx(0.4)
+    hist = histogram(values, 2)
+    assert hist['edges'] == [0.0, 2.0, 4.0]
+    assert hist['counts'] == [2, 3]
+
+def test_montecarlo_is_deterministic_across_workers():
+    from executor import RouteExecutor
+    serial = list(run_montecarlo(BASE, {}, DISTRIBUTIONS, n=3000, seed=42, chunk_size=1000))
+    pool = RouteExecutor('test-simulation', 'process', 2)
+    try:
+        pooled = list(run_montecarlo(BASE, {}, DISTRIBUTIONS, n=3000, seed=42, chunk_size=1000, executor=pool))
+    finally:
+        pool.shutdown()
+    assert [e['type'] for e in serial] == ['progress', 'progress', 'result']
+    assert serial[-1] == pooled[-1]
+
+    # Interim events: exact counts and extremes, sampled percentiles
+    progress = serial[1]
+    assert progress['samples'] == 2000
+    assert progress['utilidad']['min'] >= serial[-1]['utilidad']['min']
+    assert progress['utilidad']['p10'] <= progress['utilidad']['p50'] <= progress['utilidad']['p90']
+
+    result = serial[-1]
+    assert result['samples'] == 3000
+    u = result['utilidad']
+    assert u['p10'] <= u['p50'] <= u['p90']
+    assert 0.0 <= result['prob_loss'] <= 1.0
+    assert sum(result['histograms']['roi']['counts']) == 3000
+
+def test_montecarlo_degenerate_distribution_matches_single_calculation():
+    fixed = {'valor_terreno': {'dist': 'uniform', 'low': 9000, 'high': 9000}}
+    result = list(run_montecarlo(BASE, {}, fixed, n=10))[-1]
+    expected = run_calculation(dict(BASE, parameters={}))['raw']
+    assert result['utilidad']['p50'] == expected['utilidad_monto']
+    assert result['roi']['p90'] == expected['roi']
+
+def test_montecarlo_validates_eagerly():
+    with pytest.raises(ValueError):
+        run_montecarlo(BASE, {}, {'CUS': {'dist': 'uniform', 'low': 1, 'high': 2}})
+    with pytest.raises(ValueError):
+        run_montecarlo(BASE, {}, {'absorcion': {'dist': 'triangular', 'low': 1, 'mode': 3, 'high': 2}})
+
+def test_montecarlo_keys_parking_rules_by_city(monkeypatch):
+    import nona_core
+    rules = nona_core.ParkingRules([('', 'centro', '', 35.0), ('gdl', 'centro', '', 5.0)])
+    monkeypatch.setattr(nona_core, '_parking_rules', rules)
+    data = dict(BASE, ciudad='gdl')
+    fixed = {'valor_terreno': {'dist': 'uniform', 'low': 9000, 'high': 9000}}
+    result = list(run_montecarlo(data, {}, fixed, n=10))[-1]
+    assert result['utilidad']['p50'] == run_calculation(dict(data, parameters={}))['raw']['utilidad_monto']
+    assert result['utilidad']['p50'] != run_calculation(dict(BASE, parameters={}))['raw']['utilidad_monto']
+
+def test_montecarlo_pool_workers_use_the_callers_parking_rules(monkeypatch):
+    import nona_core
+    from executor import RouteExecutor
+    fixed = {'valor_terreno': {'dist': 'uniform', 'low': 9000, 'high': 9000}}
+    data = dict(BASE, ciudad='gdl')
+    pool = RouteExecutor('test-simulation', 'process', 1)
+    try:
+        # Start the worker before the rules change, so it holds the old ones
+        list(run_montecarlo(data, {}, fixed, n=10, executor=pool))
+        rules = nona_core.ParkingRules([('', 'centro', '', 35.0), ('gdl', 'centro', '', 5.0)])
+        monkeypatch.setattr(nona_core, '_parking_rules', rules)
+        pooled = list(run_montecarlo(data, {}, fixed, n=10, executor=pool))[-1]
+    finally:
+        pool.shutdown()
+    assert pooled['utilidad']['p50'] == run_calculation(dict(data, parameters={}))['raw']['utilidad_monto']
@@ -18,6 +18,7 @@ import {
   createCustomer,
   createScenario,
   getScenarios,
+  getScenario,
   exportCSV,
   Customer,
   Scenario
@@ -706,10 +707,15 @@ export default function Home() {
                       </div>
                       <div className="flex gap-2">
                         <button
-                          onClick={() => {
-                            setData(s.input_data);
-                            setShowLoadPanel(false);
-                            showToast(`Loaded: ${s.name}`);
+                          onClick={async () => {
+                            try {
+                              const full = await getScenario(s.id);
+                              setData(full.input_data!);
+                              setShowLoadPanel(false);
+                              showToast(`Loaded: ${s.name}`);
+                            } catch (e) {
+                              showToast("Failed to load scenario", "error");
+                            }
                           }}
                           className="flex-1 bg-zinc-800 text-xs py-1.5 rounded hover:bg-zinc-700 text-zinc-300 transition-colors"
                         >
@@ -54,14 +54,26 @@ export type Scenario = {
     id: number;
     name: string;
     customer_id: number;
-    input_data: CalculationRequest;
+    input_data?: CalculationRequest; // listings only include it when requested
     result_summary: any;
 };
 
+// Follows the X-Next-Cursor header of the keyset-paginated listing endpoints
+async function fetchAllPages<T>(url: string, errorMessage: string): Promise<T[]> {
+    const items: T[] = [];
+    let cursor: string | null = null;
+    do {
+        const sep = url.includes('?') ? '&' : '?';
+        const res = await fetch(cursor ? `${url}${sep}after=${cursor}` : url);
+        if (!res.ok) throw new Error(errorMessage);
+        items.push(...(await res.json()));
+        cursor = res.headers.get('X-Next-Cursor');
+    } while (cursor);
+    return items;
+}
+
 export async function getCustomers(): Promise<Customer[]> {
-    const res = await fetch(`${API_URL}/customers`);
-    if (!res.ok) throw new Error('Failed to fetch customers');
-    return res.json();
+    return fetchAllPages<Customer>(`${API_URL}/customers?limit=1000`, 'Failed to fetch customers');
 }
 
 export async function createCustomer(name: string): Promise<Customer> {
@@ -85,8 +97,12 @@ export async function createScenario(customerId: number, name: string, data: Cal
 }
 
 export async function getScenarios(customerId: number): Promise<Scenario[]> {
-    const res = await fetch(`${API_URL}/customers/${customerId}/scenarios`);
-    if (!res.ok) throw new Error('Failed to fetch scenarios');
+    return fetchAllPages<Scenario>(`${API_URL}/customers/${customerId}/scenarios?limit=1000`, 'Failed to fetch scenarios');
+}
+
+export async function getScenario(scenarioId: number): Promise<Scenario> {
+    const res = await fetch(`${API_URL}/scenarios/${scenarioId}`);
+    if (!res.ok) throw new Error('Failed to fetch scenario');
     return res.json();
 }
 